@@ -13,11 +13,20 @@ from PySide6.QtWidgets import *
 import pyautogui
 
 from gaze_event_type import GazeEventType, TriggerEvent
-from eye_tracking_provider import EyeTrackingData
+from eye_tracking_provider import REGISTRY
 
 registered_actions = []
 
 
+def injection_timer(kind):
+    """Times injecting an input event of the given kind into the OS."""
+    return REGISTRY.histogram(
+        "gaze_control_input_injection_seconds",
+        "Time to inject input events into the OS, the count is the number of events.",
+        type=kind,
+    ).time()
+
+
 class Action(QObject):
     changed = Signal()
 
@@ -87,7 +96,6 @@ class EdgeActionConfig(QObject):
         self._action = None
 
         self.polygon = None
-        self.has_gaze = False
 
     @property
     def screen_edge(self) -> ScreenEdge:
@@ -118,6 +126,9 @@ class EdgeActionConfig(QObject):
             self._action.changed.connect(self.changed.emit)
         self.changed.emit()
 
+    def __str__(self):
+        return f"{self._action.friendly_name} on {self._event.name} at {self._edge}"
+
 
 class Direction(Enum):
     UP = auto()
@@ -185,13 +196,14 @@ class ScrollAction(Action):
         if self._direction in [Direction.LEFT, Direction.DOWN]:
             magnitude *= -1
 
-        if self._direction in [Direction.LEFT, Direction.RIGHT]:
-            pyautogui.hscroll(magnitude)
-        else:
-            if sys.platform == "win32":
-                self._windows_scroll(magnitude)
+        with injection_timer("scroll"):
+            if self._direction in [Direction.LEFT, Direction.RIGHT]:
+                pyautogui.hscroll(magnitude)
             else:
-                pyautogui.scroll(magnitude)
+                if sys.platform == "win32":
+                    self._windows_scroll(magnitude)
+                else:
+                    pyautogui.scroll(magnitude)
 
     def _windows_scroll(self, clicks):
         if clicks > 0:
@@ -259,44 +271,45 @@ class KeyPressAction(Action):
 
 
 class EdgeActionHandler:
-    def __init__(self, screen, action_configs):
-        self.screen = screen
-        self.action_configs = action_configs
+    """Executes the actions of screen edges on the gaze events of the edges.
 
-    def update_data(self, eye_tracking_data: EyeTrackingData):
-        if eye_tracking_data is not None and eye_tracking_data.gaze is not None:
-            for action_config in self.action_configs:
-                if None in [
-                    action_config.screen_edge,
-                    action_config.event,
-                    action_config.action,
-                ]:
-                    return
-
-                trigger_event = TriggerEvent(action_config, eye_tracking_data)
-
-                if action_config.polygon is None:
-                    action_config.polygon = action_config.screen_edge.get_polygon(
-                        self.screen
-                    )
-
-                if action_config.polygon.containsPoint(
-                    QPointF(*eye_tracking_data.gaze), Qt.OddEvenFill
-                ):
-                    if not action_config.has_gaze:
-                        action_config.has_gaze = True
-                        if action_config.event == GazeEventType.GAZE_ENTER:
-                            action_config.action.execute(trigger_event)
-
-                    if action_config.event == GazeEventType.GAZE_UPON:
-                        action_config.action.execute(trigger_event)
-
-                    if action_config.event == GazeEventType.FIXATE:
-                        if eye_tracking_data.dwell_process == 1.0:
-                            action_config.action.execute(trigger_event)
+    Each edge is a region of the app's `GazeEventRouter`. Edge actions of a
+    widget, e.g. a mode, are only active while the `owner` widget is visible.
+    Triggered actions are handed to the app's `on_edge_action`, which executes
+    them.
+    """
 
-                else:
-                    if action_config.has_gaze:
-                        action_config.has_gaze = False
-                        if action_config.event == GazeEventType.GAZE_EXIT:
-                            action_config.action.execute(trigger_event)
+    def __init__(self, screen, action_configs, owner=None):
+        self.screen = screen
+        self.action_configs = action_configs
+        self.router = QApplication.instance().gaze_event_router
+
+        for action_config in action_configs:
+            region = self.router.add_region(
+                None,
+                lambda event, config=action_config: self._on_gaze_event(config, event),
+                owner=owner,
+            )
+            action_config.changed.connect(
+                lambda config=action_config, region=region: self._update_region(
+                    config, region
+                )
+            )
+            self._update_region(action_config, region)
+
+    def _update_region(self, action_config, region):
+        action_config.polygon = None
+        if None not in [
+            action_config.screen_edge,
+            action_config.event,
+            action_config.action,
+        ]:
+            action_config.polygon = action_config.screen_edge.get_polygon(self.screen)
+
+        region.polygon = action_config.polygon
+        self.router.invalidate()
+
+    def _on_gaze_event(self, action_config, event):
+        if event.type == action_config.event:
+            trigger_event = TriggerEvent(action_config, event.eye_tracking_data)
+            QApplication.instance().on_edge_action(action_config, trigger_event)
@@ -0,0 +1,527 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+
+DEFAULT_SCREEN_SIZE = (1920, 1080)
+DEFAULT_THRESHOLD = 0.1
+DEFAULT_SESSION_SAMPLES = 500
+# Assumed age of a sample when it is painted, for benchmarks without a device
+DISPLAY_LATENCY = 0.05
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Registers a benchmark.
+
+    The function gets the run context and returns a dict of results, see
+    `measure`, which are stored as `<name>.<key>`.
+    """
+
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+
+    return register
+
+
+def measure(fn, inputs, repeats=5, setup=None):
+    """Times calls of `fn` on each of `inputs`, in microseconds per call.
+
+    `setup` is called before each repeat and not timed, e.g. to reset state.
+    """
+    times = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for value in inputs:
+            fn(value)
+        times.append((time.perf_counter() - start) / len(inputs) * 1e6)
+
+    return {
+        "unit": "us",
+        "median": float(np.median(times)),
+        "min": float(np.min(times)),
+        "max": float(np.max(times)),
+        "n_calls": len(inputs),
+        "repeats": repeats,
+    }
+
+
+class _Context:
+    def __init__(self, args):
+        self.args = args
+        self.screen_size = DEFAULT_SCREEN_SIZE
+        self._app = None
+
+    @property
+    def app(self):
+        """The headless app, created on first use since there can only be one."""
+        if self._app is None:
+            from headless import HeadlessApp
+
+            self._app = HeadlessApp(
+                replay_directory=self.args.recording,
+                render_scene=self.args.recording is None,
+                screen_size=None if self.args.recording else self.screen_size,
+                seed=0,
+            )
+            size = self._app.primaryScreen().size()
+            self.screen_size = (size.width(), size.height())
+        return self._app
+
+    def close(self):
+        if self._app is not None:
+            self._app.close()
+
+
+def _synthetic_samples(screen_size, n_samples, seed=0, rate=200.0):
+    from eye_tracking_provider import SyntheticGaze
+
+    generator = SyntheticGaze(screen_size, rate=rate, seed=seed)
+    samples = []
+    for _ in range(n_samples):
+        timestamp, x, y, valid = generator.next()
+        samples.append(((x, y) if valid else None, timestamp))
+    return samples
+
+
+def _eye_tracking_data(gaze, timestamp, dwell_process=0.0):
+    from eye_tracking_provider import EyeTrackingData
+
+    return EyeTrackingData(
+        timestamp, gaze, [], dwell_process, None, None, [], None, gaze
+    )
+
+
+def _calibration_data(screen_size, samples_per_target=30, seed=0):
+    """Gaze with a smooth, plausible error pattern for the calibration targets."""
+    from eye_tracking_provider import grid_targets
+
+    rng = np.random.default_rng(seed)
+    width, height = screen_size
+    targets = grid_targets(width, height)
+    target_indices = np.repeat(np.arange(len(targets)), samples_per_target)
+    points = targets[target_indices]
+
+    u = points[:, 0] / width - 0.5
+    v = points[:, 1] / height - 0.5
+    gaze = np.stack(
+        [
+            points[:, 0] + 40 * u + 25 * u * v + 30,
+            points[:, 1] - 30 * v**2 * height / width + 20 * u - 15,
+        ],
+        axis=1,
+    )
+    gaze += rng.normal(0, 8, gaze.shape)
+    return gaze, targets[target_indices], target_indices
+
+
+@benchmark("dwell")
+def _dwell_detection(context):
+    from eye_tracking_provider import DwellDetector
+
+    samples = _synthetic_samples(context.screen_size, 20000)
+    detector = DwellDetector()
+
+    def reset():
+        nonlocal detector
+        detector = DwellDetector()
+
+    return {
+        "add_point": measure(
+            lambda sample: detector.addPoint(*sample), samples, setup=reset
+        )
+    }
+
+
+@benchmark("predictor")
+def _predictors(context):
+    from eye_tracking_provider import CalibrationFitter, CorrectionGrid
+
+    gaze, targets, target_indices = _calibration_data(context.screen_size)
+    results = {}
+
+    fitters = {
+        "polynomial": [("polynomial", {"degree": 3, "alpha": 1e-4})],
+        "thin_plate_spline": [("thin_plate_spline", {"smoothing": 1e-3})],
+    }
+    predictors = {}
+    for kind, candidates in fitters.items():
+        fitter = CalibrationFitter(context.screen_size, candidates, max_workers=0)
+        predictors[kind] = fitter.fit(gaze, targets, target_indices)
+
+        results[f"fit_{kind}"] = measure(
+            lambda _: fitter.fit(gaze, targets, target_indices), [None], repeats=3
+        )
+        results[f"{kind}_cv_error_px"] = {
+            "unit": "px",
+            "median": predictors[kind].fit_stats["cv_error_px"],
+        }
+    grid = CorrectionGrid(predictors["thin_plate_spline"], context.screen_size)
+    predictors["correction_grid"] = grid
+    report = grid.report(predictors["thin_plate_spline"])
+    results["correction_grid_memory"] = {
+        "unit": "KiB",
+        "median": report["memory_bytes"] / 1024,
+    }
+    for key in ["mean_error_px", "max_error_px"]:
+        results[f"correction_grid_{key}"] = {"unit": "px", "median": report[key]}
+
+    rng = np.random.default_rng(0)
+    points = [tuple(p) for p in rng.uniform((0, 0), context.screen_size, (5000, 2))]
+    for kind, predictor in predictors.items():
+        results[f"predict_point_{kind}"] = measure(predictor.predict_point, points)
+
+    return results
+
+
+@benchmark("projection")
+def _projection(context):
+    from eye_tracking_provider import (
+        EyeTrackingProvider,
+        SceneRenderer,
+        corner_marker_verts,
+    )
+
+    renderer = SceneRenderer(
+        context.screen_size, corner_marker_verts(context.screen_size)
+    )
+    width, height = context.screen_size
+    K = renderer.camera_matrix
+    # Distortion coefficients of the order of a Neon scene camera
+    D = np.array([-0.13, 0.11, 0.0, 0.0, 0.0, 0.17, 0.03, 0.02])
+    camera = SimpleNamespace(K=K, K_inv=np.linalg.inv(K), D=D)
+    transform = renderer.homography @ np.diag([width, height, 1.0])
+
+    rng = np.random.default_rng(0)
+    surface_points = rng.uniform(0, 1, (5000, 2))
+    scene_points = [
+        renderer.screen_to_scene(x * width, y * height) for x, y in surface_points
+    ]
+
+    return {
+        "distort_point": measure(
+            lambda p: EyeTrackingProvider.distort_point(camera, p), scene_points
+        ),
+        "map_surface_to_scene_video": measure(
+            lambda p: EyeTrackingProvider.map_surface_to_scene_video(
+                camera, p, transform
+            ),
+            surface_points,
+        ),
+    }
+
+
+def _pursuit_samples(screen_size, rate, duration=40.0, noise=2.0, seed=0):
+    """Gaze following a moving target, with noise like after the gaze filter."""
+    from eye_tracking_provider import PursuitPath
+
+    rng = np.random.default_rng(seed)
+    timestamps = np.arange(0, duration, 1 / rate)
+    points = PursuitPath(*screen_size, duration=duration).position(timestamps)
+    return timestamps, points + rng.normal(0, noise, points.shape)
+
+
+def _perceived_latency(timestamps, points, shown, max_delay=0.2):
+    """How old the shown gaze looks when it is painted.
+
+    Sample i is painted at `timestamps[i] + DISPLAY_LATENCY`. Returns the delay
+    at which the painted positions match the gaze best, and their median
+    distance to the gaze at the time they are painted.
+    """
+    valid = np.isfinite(points).all(axis=1) & np.isfinite(shown).all(axis=1)
+    times = timestamps[valid]
+    points = points[valid]
+    shown = shown[valid]
+    paint_times = times + DISPLAY_LATENCY
+    # Only samples painted before the recorded gaze ends can be compared
+    compared = paint_times <= times[-1]
+
+    def error(delay):
+        x = np.interp(paint_times - delay, times, points[:, 0])
+        y = np.interp(paint_times - delay, times, points[:, 1])
+        distances = np.hypot(shown[:, 0] - x, shown[:, 1] - y)
+        return float(np.median(distances[compared]))
+
+    delays = np.arange(0.0, max_delay, 0.001)
+    errors = [error(delay) for delay in delays]
+    return float(delays[np.argmin(errors)]), error(0.0)
+
+
+@benchmark("extrapolation")
+def _extrapolation(context):
+    from eye_tracking_provider import GazeExtrapolator, SCENE_FRAME_RATE
+
+    datasets = {}
+    if context.args.recording is not None:
+        from eye_tracking_provider import load_recording
+
+        recording = load_recording(context.args.recording)
+        datasets["recording"] = recording["timestamp"], recording["gaze"]
+    else:
+        datasets["pursuit"] = _pursuit_samples(context.screen_size, SCENE_FRAME_RATE)
+        samples = _synthetic_samples(context.screen_size, 1200, rate=SCENE_FRAME_RATE)
+        datasets["saccades"] = (
+            np.array([timestamp for _, timestamp in samples]),
+            np.array(
+                [(np.nan, np.nan) if gaze is None else gaze for gaze, _ in samples]
+            ),
+        )
+
+    extrapolator = GazeExtrapolator(default_latency=DISPLAY_LATENCY)
+    results = {}
+    for name, (timestamps, points) in datasets.items():
+        gaze = [None if np.isnan(p).any() else tuple(p) for p in points.tolist()]
+        extrapolator.reset()
+        predicted = np.array(
+            [
+                (np.nan, np.nan) if p is None else p
+                for p in map(extrapolator.add, gaze, timestamps.tolist())
+            ],
+            dtype=np.float64,
+        )
+
+        for kind, shown in [("shown", points), ("predicted", predicted)]:
+            latency, error = _perceived_latency(timestamps, points, shown)
+            results[f"{name}_{kind}_latency_ms"] = {
+                "unit": "ms",
+                "median": latency * 1000,
+            }
+            results[f"{name}_{kind}_error_px"] = {"unit": "px", "median": error}
+
+        results[f"{name}_add"] = measure(
+            lambda sample: extrapolator.add(*sample),
+            list(zip(gaze, timestamps.tolist())),
+            setup=extrapolator.reset,
+        )
+
+    return results
+
+
+@benchmark("hit_testing")
+def _hit_testing(context):
+    app = context.app
+    app.set_mode("Keyboard")
+
+    rng = np.random.default_rng(0)
+    width, height = context.screen_size
+    samples = [
+        _eye_tracking_data((x, y), i / 200)
+        for i, (x, y) in enumerate(
+            rng.uniform((0, height * 0.35), (width, height), (2000, 2)).tolist()
+        )
+    ]
+
+    gaze = [
+        _eye_tracking_data(gaze, timestamp)
+        for gaze, timestamp in _synthetic_samples(context.screen_size, 2000)
+    ]
+
+    # Resolves the key under the gaze among all targets of the app. Random
+    # samples change the key under the gaze every time, generated gaze mostly
+    # stays on a key.
+    results = {
+        "keyboard": measure(
+            app.gaze_event_router.dispatch, samples, setup=app.processEvents
+        ),
+        "keyboard_gaze": measure(
+            app.gaze_event_router.dispatch, gaze, setup=app.processEvents
+        ),
+    }
+    app.processEvents()
+    return results
+
+
+@benchmark("main_window")
+def _main_window_update_data(context):
+    app = context.app
+    samples = [
+        _eye_tracking_data(gaze, timestamp)
+        for gaze, timestamp in _synthetic_samples(context.screen_size, 2000)
+    ]
+
+    results = {}
+    for mode in ["View", "Click", "Keyboard"]:
+        app.set_mode(mode)
+        results[f"update_data_{mode.lower()}"] = measure(
+            app.main_window.update_data, samples, setup=app.processEvents
+        )
+    app.processEvents()
+    app.set_mode("View")
+    return results
+
+
+@benchmark("session")
+def _session(context):
+    app = context.app
+    app.set_mode("View")
+    max_samples = context.args.samples
+    if max_samples is None and context.args.recording is None:
+        max_samples = DEFAULT_SESSION_SAMPLES
+    summary = app.run(max_samples=max_samples)
+    us_per_sample = summary["duration_s"] / max(summary["n_samples"], 1) * 1e6
+
+    latency = summary["latency"]
+    median_index = latency["percentiles"].index(50)
+    results = {
+        "per_sample": {
+            "unit": "us",
+            "median": us_per_sample,
+            "min": us_per_sample,
+            "max": us_per_sample,
+            "n_calls": summary["n_samples"],
+            "repeats": 1,
+        }
+    }
+    for stage, values in latency["stages"].items():
+        results[f"latency_{stage}"] = {"unit": "ms", "median": values[median_index]}
+    return results
+
+
+def _environment():
+    import PySide6
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "pyside": PySide6.__version__,
+        "timestamp": time.time(),
+    }
+
+
+def run_benchmarks(args):
+    names = args.only or list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    context = _Context(args)
+    if any(name in ["hit_testing", "main_window", "session"] for name in names):
+        # The screen size of a recording decides the size of everything else
+        context.app
+
+    results = {}
+    for name in names:
+        print(f"Running {name}...", file=sys.stderr)
+        for key, result in BENCHMARKS[name](context).items():
+            results[f"{name}.{key}"] = result
+    context.close()
+
+    return {
+        "environment": _environment(),
+        "screen_size": list(context.screen_size),
+        "recording": args.recording,
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Compares the medians of two benchmark runs.
+
+    Timings that are slower than the baseline by more than `threshold` (as a
+    fraction) are regressions. Other metrics, e.g. errors, are only listed.
+    Returns a row per benchmark and whether there was a regression.
+    """
+    rows = []
+    regression = False
+    for name in sorted(set(baseline["results"]) | set(current["results"])):
+        old = baseline["results"].get(name)
+        new = current["results"].get(name)
+        if old is None or new is None:
+            rows.append((name, old, new, None, "missing" if new is None else "new"))
+            continue
+
+        change = new["median"] / old["median"] - 1 if old["median"] else 0.0
+        status = ""
+        if new["unit"] == "us" and change > threshold:
+            status = "REGRESSION"
+            regression = True
+        elif new["unit"] == "us" and change < -threshold:
+            status = "improved"
+        rows.append((name, old, new, change, status))
+
+    return rows, regression
+
+
+def _print_comparison(rows):
+    print(f"{'benchmark':<48} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, old, new, change, status in rows:
+        old_text = "-" if old is None else f"{old['median']:.2f} {old['unit']}"
+        new_text = "-" if new is None else f"{new['median']:.2f} {new['unit']}"
+        change_text = "" if change is None else f"{change:+.1%}"
+        print(f"{name:<48} {old_text:>12} {new_text:>12} {change_text:>8} {status}")
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Gaze Control benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument(
+        "-o", "--output", help="Write the results to this JSON file"
+    )
+    run_parser.add_argument(
+        "--recording",
+        help="Replay this recording for the session benchmark instead of "
+        "generated gaze on rendered scene frames",
+    )
+    run_parser.add_argument(
+        "--samples",
+        type=int,
+        help="Samples of the session benchmark (default: the whole recording, "
+        f"or {DEFAULT_SESSION_SAMPLES} generated samples)",
+    )
+    run_parser.add_argument(
+        "--only", nargs="+", metavar="NAME", help=f"One of {', '.join(BENCHMARKS)}"
+    )
+
+    compare_parser = commands.add_parser(
+        "compare", help="Compare results against a baseline"
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("results")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Slowdown that counts as a regression (default: %(default)s)",
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run_benchmarks(args)
+        text = json.dumps(report, indent=4)
+        if args.output is None:
+            print(text)
+        else:
+            with open(args.output, "w") as f:
+                f.write(text)
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.results) as f:
+        current = json.load(f)
+    rows, regression = compare(baseline, current, args.threshold)
+    _print_comparison(rows)
+    if regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run()
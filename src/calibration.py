@@ -1,7 +1,6 @@
+import json
+
 import numpy as np
-from sklearn.preprocessing import PolynomialFeatures
-from sklearn.linear_model import LinearRegression
-from sklearn.pipeline import Pipeline
 
 from PySide6.QtCore import *
 from PySide6.QtGui import *
@@ -11,8 +10,13 @@ from calibration_ui import MainWindow
 
 from widgets.debug_window import DebugWindow
 from eye_tracking_provider import EyeTrackingProvider as EyeTrackingProvider
+from eye_tracking_provider import (
+    CalibrationCollector,
+    CalibrationFitter,
+    PREDICTOR_FILE,
+    grid_targets,
+)
 import time
-import joblib
 
 
 class CalibrationApp(QApplication):
@@ -24,8 +28,6 @@ class CalibrationApp(QApplication):
         self.main_window.marker_overlay.surface_changed.connect(self.on_surface_changed)
         self.main_window.key_pressed.connect(self.on_key_pressed)
 
-        self.debug_window = DebugWindow()
-
         screen_size = (screen_size.width(), screen_size.height())
         self.eye_tracking_provider = EyeTrackingProvider(
             markers=self.main_window.marker_overlay.markers,
@@ -33,10 +35,18 @@ class CalibrationApp(QApplication):
             use_calibrated_gaze=False,
         )
 
+        self.debug_window = DebugWindow(
+            self.eye_tracking_provider.distort_point,
+            self.eye_tracking_provider.map_surface_to_scene_video,
+            latency=self.eye_tracking_provider.latency,
+        )
+
         self.setApplicationDisplayName("Gaze Control - Calibration")
 
+        # Poll faster than the scene camera rate so no matched gaze sample is
+        # skipped. Duplicates are dropped by the collector.
         self.pollTimer = QTimer()
-        self.pollTimer.setInterval(1000 / 30)
+        self.pollTimer.setInterval(1000 / 60)
         self.pollTimer.timeout.connect(self.poll)
         self.pollTimer.start()
 
@@ -48,43 +58,12 @@ class CalibrationApp(QApplication):
         self.target_acquisition_time = 0.75
         self.calibration_idx = 0
 
-        self.training_data = []
-        self.training_labels = []
+        self.collector = CalibrationCollector()
+        self.fitter = CalibrationFitter(screen_size)
+        self.fitter.start()
 
     def _generate_targets(self):
-        width = self.main_window.width()
-        height = self.main_window.height()
-
-        hor_padd = width * 0.11
-        ver_padd = height * 0.015
-        hor_targets = np.linspace(hor_padd, width - hor_padd, 6)
-        ver_targets = np.linspace(ver_padd, height * 0.15, 3)
-        top_targets = np.meshgrid(hor_targets, ver_targets)
-        top_targets = [
-            QPoint(*t) for t in zip(top_targets[0].flatten(), top_targets[1].flatten())
-        ]
-
-        hor_padd = width * 0.11
-        ver_padd = height * 0.015
-        hor_targets = np.linspace(hor_padd, width - hor_padd, 6)
-        ver_targets = np.linspace(height - height * 0.15, height - ver_padd, 3)
-        bot_targets = np.meshgrid(hor_targets, ver_targets)
-        bot_targets = [
-            QPoint(*t) for t in zip(bot_targets[0].flatten(), bot_targets[1].flatten())
-        ]
-
-        hor_padd = width * 0.015
-        hor_targets = np.linspace(hor_padd, width - hor_padd, 8)
-        ver_padd = height * 0.2
-        ver_targets = np.linspace(ver_padd, height - ver_padd, 6)
-        center_targets = np.meshgrid(hor_targets, ver_targets)
-        center_targets = [
-            QPoint(*t)
-            for t in zip(center_targets[0].flatten(), center_targets[1].flatten())
-        ]
-
-        targets = np.concatenate([top_targets, center_targets, bot_targets])
-        return targets
+        return grid_targets(self.main_window.width(), self.main_window.height())
 
     def on_surface_changed(self):
         self.eye_tracking_provider.update_surface()
@@ -103,11 +82,16 @@ class CalibrationApp(QApplication):
         self.debug_window.update_data(eye_tracking_data)
 
         if (
-            self.target_start is not None
+            eye_tracking_data is not None
+            and self.target_start is not None
             and self.target_duration > self.target_acquisition_time
         ):
-            self.training_data.append(eye_tracking_data.gaze)
-            self.training_labels.append(self.targets[self.calibration_idx])
+            self.collector.add_sample(
+                eye_tracking_data.gaze,
+                eye_tracking_data.timestamp,
+                self.calibration_idx,
+                self.targets[self.calibration_idx],
+            )
 
     def _calc_target(self):
         if self.target_start is None:
@@ -125,12 +109,9 @@ class CalibrationApp(QApplication):
                 self.target_start = None
                 self.target_duration = None
 
-                np.save("training_data.npy", np.array(self.training_data))
-                np.save("training_labels.npy", np.array(self.training_labels))
-
                 self._calc_calibration()
             else:
-                target_location = self.targets[self.calibration_idx]
+                target_location = QPoint(*self.targets[self.calibration_idx])
 
             if self.target_duration > self.target_acquisition_time:
                 target_color = QColor(Qt.green)
@@ -140,21 +121,23 @@ class CalibrationApp(QApplication):
         return target_location, target_color
 
     def _calc_calibration(self):
-        training_data = np.load("training_data.npy", allow_pickle=True)
-        training_labels = np.load("training_labels.npy", allow_pickle=True)
-        training_labels = np.array(
-            [(lambda p: (p.x(), p.y()))(p) for p in training_labels]
-        )
+        training_data, training_labels, target_indices = self.collector.training_data()
 
-        predictor = Pipeline(
-            [
-                ("poly", PolynomialFeatures(degree=3, include_bias=True)),
-                ("linear", LinearRegression()),
-            ]
+        predictor = self.fitter.fit(
+            training_data,
+            training_labels,
+            target_indices,
+            device_serial=self.eye_tracking_provider.device_serial,
         )
+        predictor.fit_stats.update(self.collector.summary())
+        predictor.save(PREDICTOR_FILE)
 
-        predictor.fit(training_data, training_labels)
-        joblib.dump(predictor, "predictor.pkl")
+        print(
+            f"Selected {predictor.fit_stats['model']} {predictor.fit_stats['params']} "
+            f"with a cross-validated error of {predictor.fit_stats['cv_error_px']:.1f} px "
+            f"in {predictor.fit_stats['fit_duration_s']:.2f} s"
+        )
+        print(json.dumps(predictor.fit_stats["regions"], indent=4))
 
         # Close down application
         self.main_window.close()
@@ -166,6 +149,7 @@ class CalibrationApp(QApplication):
         self.debug_window.show()
         super().exec()
         self.eye_tracking_provider.close()
+        self.fitter.close()
 
 
 def run():
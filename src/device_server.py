@@ -0,0 +1,743 @@
+import argparse
+import asyncio
+import random
+import socket
+import struct
+import threading
+import time
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from urllib.parse import parse_qs, urlparse
+
+import av
+import cv2
+import numpy as np
+from aiohttp import web, WSMsgType
+from pupil_labs.neon_recording.calib import Calibration
+from zeroconf import ServiceInfo, Zeroconf
+
+from eye_tracking_provider import (
+    SyntheticDataReceiver,
+    ReplayDataReceiver,
+    ReplayPacing,
+    load_recording,
+)
+
+
+RTP_CLOCK_RATE = 90000
+RTP_MTU = 1400
+NTP_EPOCH_OFFSET = 2208988800
+SENDER_REPORT_INTERVAL = 1.0
+
+GAZE_PAYLOAD_TYPE = 99
+VIDEO_PAYLOAD_TYPE = 96
+
+EYES_FRAME_SIZE = (384, 192)
+
+
+class _Client:
+    """An RTSP session that receives one stream over UDP."""
+
+    def __init__(self, host, rtp_port, rtcp_port):
+        self.rtp_address = (host, rtp_port)
+        self.rtcp_address = (host, rtcp_port)
+        self.ssrc = random.getrandbits(32)
+        self.sequence = random.getrandbits(16)
+        self.n_packets = 0
+        self.n_octets = 0
+        self.playing = False
+        self.needs_key_frame = True
+
+
+class _Stream:
+    """Packetizes one stream for all clients that play it.
+
+    Timestamps are RTP timestamps of a 90 kHz clock that started at
+    `clock_start` (unix time), sender reports tell clients how they map to
+    unix time, like the device does.
+    """
+
+    def __init__(self, server, name, media, payload_type, encoding):
+        self.server = server
+        self.name = name
+        self.media = media
+        self.payload_type = payload_type
+        self.encoding = encoding
+        self.clients = {}
+        self.clock_start = time.time()
+        self.fmtp = None
+
+    def rtp_timestamp(self, unix_time):
+        return int((unix_time - self.clock_start) * RTP_CLOCK_RATE) & 0xFFFFFFFF
+
+    def sdp(self, address):
+        lines = [
+            "v=0",
+            f"o=- 0 0 IN IP4 {address}",
+            f"s={self.name}",
+            "t=0 0",
+            f"m={self.media} 0 RTP/AVP {self.payload_type}",
+            f"a=rtpmap:{self.payload_type} {self.encoding}/{RTP_CLOCK_RATE}",
+        ]
+        if self.fmtp is not None:
+            lines.append(f"a=fmtp:{self.payload_type} {self.fmtp}")
+        return "\r\n".join(lines) + "\r\n"
+
+    def send_payloads(self, payloads, unix_time):
+        """Sends the RTP payloads of one access unit to every playing client."""
+        timestamp = self.rtp_timestamp(unix_time)
+        for client in list(self.clients.values()):
+            if not client.playing:
+                continue
+
+            for i, payload in enumerate(payloads):
+                marker = 0x80 if i == len(payloads) - 1 else 0
+                header = struct.pack(
+                    "!BBHII",
+                    0x80,
+                    marker | self.payload_type,
+                    client.sequence,
+                    timestamp,
+                    client.ssrc,
+                )
+                client.sequence = (client.sequence + 1) & 0xFFFF
+                client.n_packets += 1
+                client.n_octets += len(payload)
+                self.server.send_datagram("rtp", header + payload, client.rtp_address)
+
+    def send_sender_report(self, client):
+        now = time.time()
+        ntp = now + NTP_EPOCH_OFFSET
+        ntp_seconds = int(ntp)
+        ntp_fraction = int((ntp - ntp_seconds) * 2**32) & 0xFFFFFFFF
+        report = struct.pack(
+            "!BBHIIIIII",
+            0x80,
+            200,
+            6,
+            client.ssrc,
+            ntp_seconds,
+            ntp_fraction,
+            self.rtp_timestamp(now),
+            client.n_packets & 0xFFFFFFFF,
+            client.n_octets & 0xFFFFFFFF,
+        )
+        # Reports are not subject to the simulated jitter and loss, without
+        # them no packet can be timestamped
+        self.server.send_datagram("rtcp", report, client.rtcp_address, reliable=True)
+
+
+class _VideoStream(_Stream):
+    """Encodes frames with H.264 and sends them as RTP (RFC 6184).
+
+    Frames are encoded on a worker thread. When a frame arrives while the
+    previous one is still being encoded it is dropped, like a device under
+    load would. Clients that start playing get a key frame.
+    """
+
+    def __init__(self, server, name, frame_size, fps):
+        super().__init__(server, name, "video", VIDEO_PAYLOAD_TYPE, "H264")
+        self.frame_size = frame_size
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.encoding_frame = False
+        self.n_encoded = 0
+        self.n_dropped = 0
+
+        width, height = frame_size
+        self.codec = av.CodecContext.create("libx264", "w")
+        self.codec.width = width
+        self.codec.height = height
+        self.codec.pix_fmt = "yuv420p"
+        self.codec.time_base = Fraction(1, RTP_CLOCK_RATE)
+        self.codec.framerate = Fraction(round(fps))
+        self.codec.options = {
+            "preset": "ultrafast",
+            "tune": "zerolatency",
+            "x264-params": f"keyint={round(fps)}:scenecut=0",
+        }
+
+        # The parameter sets go into the session description, so clients can
+        # set up their decoder before the first frame
+        nal_units = self._encode(np.zeros((height, width, 3), dtype=np.uint8), 0, True)
+        parameter_sets = [nal for nal in nal_units if nal[0] & 0x1F in (7, 8)]
+        self.fmtp = "packetization-mode=1;sprop-parameter-sets=" + ",".join(
+            b64encode(nal).decode() for nal in parameter_sets
+        )
+
+    def _encode(self, bgr_pixels, pts, key_frame):
+        frame = av.VideoFrame.from_ndarray(bgr_pixels, format="bgr24")
+        frame.pts = pts
+        if key_frame:
+            frame.pict_type = av.video.frame.PictureType.I
+
+        data = b"".join(bytes(packet) for packet in self.codec.encode(frame))
+        return _split_nal_units(data)
+
+    def send_frame(self, bgr_pixels, unix_time):
+        if self.encoding_frame:
+            self.n_dropped += 1
+            return
+        if not any(client.playing for client in self.clients.values()):
+            return
+
+        height, width = bgr_pixels.shape[:2]
+        if (width, height) != self.frame_size:
+            bgr_pixels = cv2.resize(bgr_pixels, self.frame_size)
+
+        key_frame = any(client.needs_key_frame for client in self.clients.values())
+        for client in self.clients.values():
+            client.needs_key_frame = False
+
+        self.encoding_frame = True
+        future = asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            self._encode,
+            np.ascontiguousarray(bgr_pixels).copy(),
+            self.rtp_timestamp(unix_time),
+            key_frame,
+        )
+        future.add_done_callback(lambda f: self._on_encoded(f, unix_time))
+
+    def _on_encoded(self, future, unix_time):
+        self.encoding_frame = False
+        self.n_encoded += 1
+        payloads = []
+        for nal in future.result():
+            payloads.extend(_packetize_nal_unit(nal))
+        self.send_payloads(payloads, unix_time)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def _split_nal_units(data):
+    """Splits an Annex B byte stream into NAL units without start codes."""
+    units = []
+    start = data.find(b"\x00\x00\x01")
+    while start >= 0:
+        start += 3
+        end = data.find(b"\x00\x00\x01", start)
+        unit = data[start:] if end < 0 else data[start:end]
+        # A four byte start code leaves a zero at the end of the previous unit
+        units.append(unit.rstrip(b"\x00") if end >= 0 else unit)
+        start = end
+    return [unit for unit in units if unit]
+
+
+def _packetize_nal_unit(nal):
+    if len(nal) <= RTP_MTU:
+        return [nal]
+
+    # Fragmentation units (FU-A)
+    indicator = (nal[0] & 0xE0) | 28
+    nal_type = nal[0] & 0x1F
+    payload = nal[1:]
+    packets = []
+    for offset in range(0, len(payload), RTP_MTU - 2):
+        header = nal_type
+        if offset == 0:
+            header |= 0x80
+        if offset + RTP_MTU - 2 >= len(payload):
+            header |= 0x40
+        chunk = payload[offset : offset + RTP_MTU - 2]
+        packets.append(bytes((indicator, header)) + chunk)
+    return packets
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    # Receiver reports of clients are ignored
+    def datagram_received(self, data, addr):
+        pass
+
+
+class DeviceServer:
+    """A local stand-in for a Neon Companion device.
+
+    Speaks enough of the realtime API for the app and `discover_devices`: it
+    is announced via mDNS, serves the status (also as websocket updates) and
+    the scene camera calibration over HTTP, and streams gaze, scene and eye
+    video over RTSP, with H.264 encoded video and RTCP sender reports for the
+    timestamps. Data comes from a `SyntheticDataReceiver` or a
+    `ReplayDataReceiver` and is sent in real time at the rate of the source,
+    timestamped with the current time like a device with a synced clock.
+
+    `jitter` (seconds, standard deviation) delays and reorders RTP packets,
+    `packet_loss` drops a fraction of them and `drop_connections` closes all
+    client connections, to benchmark how the receiver handles bad networks
+    and reconnects.
+    """
+
+    def __init__(
+        self,
+        source,
+        address="127.0.0.1",
+        http_port=8080,
+        rtsp_port=8086,
+        name="Stand-in",
+        scene_fps=30,
+        jitter=0.0,
+        packet_loss=0.0,
+        advertise=True,
+    ):
+        self.source = source
+        self.address = address
+        self.http_port = http_port
+        self.rtsp_port = rtsp_port
+        self.name = name
+        self.device_id = "".join(random.choices("0123456789abcdef", k=16))
+        self.scene_fps = scene_fps
+        self.jitter = jitter
+        self.packet_loss = packet_loss
+        self.advertise = advertise
+
+        self.n_samples = 0
+        self.streams = {}
+        self._sockets = {}
+        self._websockets = set()
+        self._rtsp_writers = set()
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._stopped = None
+        self._zeroconf = None
+        self._service_info = None
+
+    @property
+    def serial(self):
+        return self.source.device_serial or "000000"
+
+    def start(self):
+        """Starts serving on a background thread."""
+        self._thread = threading.Thread(
+            target=lambda: asyncio.run(self._serve()), name="DeviceServer", daemon=True
+        )
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def drop_connections(self):
+        """Closes all client connections, clients have to reconnect."""
+        self._loop.call_soon_threadsafe(self._drop_connections)
+
+    def stats(self):
+        return {
+            "n_samples": self.n_samples,
+            "clients": {
+                name: sum(client.playing for client in stream.clients.values())
+                for name, stream in self.streams.items()
+            },
+            "frames_encoded": {
+                name: stream.n_encoded
+                for name, stream in self.streams.items()
+                if isinstance(stream, _VideoStream)
+            },
+            "frames_dropped": {
+                name: stream.n_dropped
+                for name, stream in self.streams.items()
+                if isinstance(stream, _VideoStream)
+            },
+        }
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+
+        self.streams = {
+            "gaze": _Stream(
+                self, "gaze", "application", GAZE_PAYLOAD_TYPE, "com.pupillabs.gaze1"
+            ),
+            "world": _VideoStream(self, "world", (1600, 1200), self.scene_fps),
+            "eyes": _VideoStream(self, "eyes", EYES_FRAME_SIZE, self.scene_fps),
+        }
+
+        for name in ["rtp", "rtcp"]:
+            transport, _ = await self._loop.create_datagram_endpoint(
+                _DatagramProtocol, local_addr=(self.address, 0)
+            )
+            self._sockets[name] = transport
+
+        app = web.Application()
+        app.router.add_get("/api/status", self._handle_status)
+        app.router.add_get("/calibration.bin", self._handle_calibration)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, self.address, self.http_port).start()
+
+        rtsp_server = await asyncio.start_server(
+            self._handle_rtsp, self.address, self.rtsp_port
+        )
+
+        if self.advertise:
+            await self._loop.run_in_executor(None, self._register_service)
+
+        streaming = asyncio.create_task(self._stream())
+        reporting = asyncio.create_task(self._send_sender_reports())
+        print(
+            f"Serving {self.name} ({self.serial}) at "
+            f"{self.address}:{self.http_port}, RTSP on port {self.rtsp_port}"
+        )
+        self._ready.set()
+
+        await self._stopped.wait()
+
+        streaming.cancel()
+        reporting.cancel()
+        self._drop_connections()
+        rtsp_server.close()
+        await runner.cleanup()
+        for transport in self._sockets.values():
+            transport.close()
+        for stream in self.streams.values():
+            if isinstance(stream, _VideoStream):
+                stream.close()
+        if self._zeroconf is not None:
+            await self._loop.run_in_executor(None, self._unregister_service)
+
+    def _register_service(self):
+        try:
+            self._zeroconf = Zeroconf()
+            self._service_info = ServiceInfo(
+                "_http._tcp.local.",
+                f"PI monitor:{self.name}:{self.device_id}._http._tcp.local.",
+                addresses=[socket.inet_aton(self.address)],
+                port=self.http_port,
+                server=f"{self.name.lower()}-{self.device_id[:6]}.local.",
+            )
+            self._zeroconf.register_service(self._service_info)
+        except Exception as exc:
+            print(f"Could not announce the device via mDNS: {exc}")
+            self._zeroconf = None
+
+    def _unregister_service(self):
+        self._zeroconf.unregister_service(self._service_info)
+        self._zeroconf.close()
+
+    def _drop_connections(self):
+        for writer in list(self._rtsp_writers):
+            writer.close()
+        for websocket in list(self._websockets):
+            asyncio.ensure_future(websocket.close())
+        for stream in self.streams.values():
+            stream.clients.clear()
+
+    def send_datagram(self, kind, data, address, reliable=False):
+        transport = self._sockets[kind]
+        if not reliable:
+            if self.packet_loss > 0 and random.random() < self.packet_loss:
+                return
+            if self.jitter > 0:
+                delay = abs(random.gauss(0, self.jitter))
+                self._loop.call_later(delay, transport.sendto, data, address)
+                return
+        transport.sendto(data, address)
+
+    # Source
+
+    async def _stream(self):
+        """Sends the samples of the source in real time.
+
+        Pacing starts over when the timestamps of the source go back, e.g. when
+        a replayed recording loops.
+        """
+        first_timestamp = None
+        last_timestamp = None
+        clock_start = None
+        next_frame_time = None
+        frame_interval = 1 / self.scene_fps
+        eyes_frame = np.full((EYES_FRAME_SIZE[1], EYES_FRAME_SIZE[0], 3), 80, np.uint8)
+
+        while True:
+            data = self.source.receive()
+            if data is None:
+                if getattr(self.source, "finished", False):
+                    print("Source finished")
+                    return
+                await asyncio.sleep(0.001)
+                continue
+
+            # Looping sources start over with earlier timestamps
+            if first_timestamp is None or data.timestamp < last_timestamp:
+                first_timestamp = data.timestamp
+                clock_start = time.monotonic()
+                next_frame_time = data.timestamp
+            last_timestamp = data.timestamp
+
+            delay = clock_start + (data.timestamp - first_timestamp) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            now = time.time()
+            gaze = data.raw_gaze
+            # Blinks of synthetic gaze have no gaze point
+            if gaze.x == gaze.x:
+                self.streams["gaze"].send_payloads([_gaze_payload(gaze)], now)
+            self.n_samples += 1
+
+            if data.timestamp >= next_frame_time:
+                self.streams["world"].send_frame(data.scene.bgr_pixels, now)
+                self.streams["eyes"].send_frame(eyes_frame, now)
+                next_frame_time = max(
+                    next_frame_time + frame_interval, data.timestamp - frame_interval
+                )
+
+    async def _send_sender_reports(self):
+        while True:
+            for stream in self.streams.values():
+                for client in list(stream.clients.values()):
+                    if client.playing:
+                        stream.send_sender_report(client)
+            await asyncio.sleep(SENDER_REPORT_INTERVAL)
+
+    # HTTP
+
+    def _components(self):
+        phone = {
+            "battery_level": 100,
+            "battery_state": "OK",
+            "device_id": self.device_id,
+            "device_name": self.name,
+            "ip": self.address,
+            "memory": 64 * 1024**3,
+            "memory_state": "OK",
+        }
+        hardware = {
+            "version": "2.0",
+            "glasses_serial": "-1",
+            "world_camera_serial": "-1",
+            "module_serial": self.serial,
+        }
+        components = [
+            {"model": "Phone", "data": phone},
+            {"model": "Hardware", "data": hardware},
+        ]
+        for sensor in ["gaze", "world", "eyes", "imu", "eye_events"]:
+            connected = sensor in self.streams
+            components.append(
+                {
+                    "model": "Sensor",
+                    "data": {
+                        "sensor": sensor,
+                        "conn_type": "DIRECT",
+                        "connected": connected,
+                        "ip": self.address if connected else None,
+                        "port": self.rtsp_port if connected else None,
+                        "params": f"camera={sensor}" if connected else None,
+                        "protocol": "rtsp",
+                        "stream_error": False,
+                    },
+                }
+            )
+        return components
+
+    async def _handle_status(self, request):
+        if request.headers.get("Upgrade", "").lower() != "websocket":
+            return web.json_response(
+                {"message": "Success", "result": self._components()}
+            )
+
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        self._websockets.add(websocket)
+        try:
+            for component in self._components():
+                await websocket.send_json(component)
+            async for message in websocket:
+                if message.type == WSMsgType.ERROR:
+                    break
+        finally:
+            self._websockets.discard(websocket)
+        return websocket
+
+    async def _handle_calibration(self, request):
+        return web.Response(
+            body=_calibration_bytes(self.source.scene_calibration, self.serial),
+            content_type="application/octet-stream",
+        )
+
+    # RTSP
+
+    async def _handle_rtsp(self, reader, writer):
+        self._rtsp_writers.add(writer)
+        client_host = writer.get_extra_info("peername")[0]
+        session_id = f"{random.getrandbits(32):08x}"
+        stream = None
+
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                lines = request.decode().split("\r\n")
+                method, url, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+                if "content-length" in headers:
+                    await reader.readexactly(int(headers["content-length"]))
+
+                camera = parse_qs(urlparse(url).query).get("camera", [None])[0]
+                response_headers = {}
+                body = b""
+                status = "200 OK"
+
+                if method == "OPTIONS":
+                    response_headers["Public"] = (
+                        "OPTIONS, DESCRIBE, SETUP, PLAY, TEARDOWN, GET_PARAMETER"
+                    )
+                elif method in ["DESCRIBE", "SETUP"] and camera not in self.streams:
+                    status = "404 Not Found"
+                elif method == "DESCRIBE":
+                    body = self.streams[camera].sdp(self.address).encode()
+                    response_headers["Content-Type"] = "application/sdp"
+                elif method == "SETUP":
+                    stream = self.streams[camera]
+                    transport = headers.get("transport", "")
+                    fields = dict(
+                        field.split("=", 1)
+                        for field in transport.split(";")
+                        if "=" in field
+                    )
+                    if "client_port" not in fields:
+                        status = "461 Unsupported Transport"
+                    else:
+                        rtp_port, rtcp_port = map(int, fields["client_port"].split("-"))
+                        stream.clients[session_id] = _Client(
+                            client_host, rtp_port, rtcp_port
+                        )
+                        server_rtp, server_rtcp = (
+                            self._sockets[kind].get_extra_info("sockname")[1]
+                            for kind in ["rtp", "rtcp"]
+                        )
+                        response_headers["Transport"] = (
+                            f"RTP/AVP;unicast;client_port={rtp_port}-{rtcp_port};"
+                            f"server_port={server_rtp}-{server_rtcp}"
+                        )
+                        response_headers["Session"] = f"{session_id};timeout=60"
+                elif method == "PLAY":
+                    client = None if stream is None else stream.clients.get(session_id)
+                    if client is None:
+                        status = "454 Session Not Found"
+                    else:
+                        # The report comes first, packets before it can't be
+                        # timestamped by the client
+                        stream.send_sender_report(client)
+                        client.playing = True
+                        response_headers["Session"] = session_id
+                elif method == "TEARDOWN":
+                    if stream is not None:
+                        stream.clients.pop(session_id, None)
+                elif method != "GET_PARAMETER":
+                    status = "501 Not Implemented"
+
+                response = [f"RTSP/1.0 {status}", f"CSeq: {headers.get('cseq', '0')}"]
+                response += [f"{k}: {v}" for k, v in response_headers.items()]
+                response.append(f"Content-Length: {len(body)}")
+                writer.write(("\r\n".join(response) + "\r\n\r\n").encode() + body)
+                await writer.drain()
+
+                if method == "TEARDOWN":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if stream is not None:
+                stream.clients.pop(session_id, None)
+            self._rtsp_writers.discard(writer)
+            writer.close()
+
+
+def _gaze_payload(gaze):
+    # Gaze with eye state (65 bytes): pupil diameter, eyeball center and
+    # optical axis of the left and the right eye
+    return struct.pack(
+        "!ffBffffffffffffff",
+        gaze.x,
+        gaze.y,
+        255 if gaze.worn else 0,
+        3.5, -30.0, 10.0, -35.0, 0.0, 0.0, 1.0,
+        3.5, 30.0, 10.0, -35.0, 0.0, 0.0, 1.0,
+    )
+
+
+def _calibration_bytes(scene_calibration, serial):
+    """The calibration in the binary layout the device serves."""
+    source = np.asarray(scene_calibration).reshape(-1)[:1]
+    calibration = np.zeros(1, dtype=Calibration.dtype)
+    calibration["version"] = 1
+    calibration["serial"] = serial[:6].encode()
+    for name in source.dtype.names:
+        if name in calibration.dtype.names and name != "serial":
+            calibration[name] = source[name]
+    return calibration.tobytes()
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Local stand-in Neon device")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
+        "--synthetic",
+        metavar="RATE",
+        type=float,
+        help="Stream generated gaze at RATE Hz (30-1000) with rendered scene frames",
+    )
+    source.add_argument(
+        "--replay", metavar="RECORDING", help="Stream a recorded session in a loop"
+    )
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--rtsp-port", type=int, default=8086)
+    parser.add_argument("--width", type=int, default=1920, help="Screen width")
+    parser.add_argument("--height", type=int, default=1080, help="Screen height")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="Packet delay jitter in seconds"
+    )
+    parser.add_argument(
+        "--packet-loss", type=float, default=0.0, help="Fraction of dropped packets"
+    )
+    parser.add_argument("--no-discovery", action="store_true")
+    args = parser.parse_args()
+
+    if args.synthetic is not None:
+        receiver = SyntheticDataReceiver()
+        receiver.configure(
+            (args.width, args.height),
+            rate=args.synthetic,
+            render_scene=True,
+            pacing=ReplayPacing.AS_FAST_AS_POSSIBLE,
+            seed=args.seed,
+        )
+    else:
+        receiver = ReplayDataReceiver()
+        receiver.open(
+            load_recording(args.replay), ReplayPacing.AS_FAST_AS_POSSIBLE, loop=True
+        )
+    receiver.connect()
+
+    server = DeviceServer(
+        receiver,
+        address=args.address,
+        http_port=args.port,
+        rtsp_port=args.rtsp_port,
+        jitter=args.jitter,
+        packet_loss=args.packet_loss,
+        advertise=not args.no_discovery,
+    )
+    server.start()
+    try:
+        while True:
+            time.sleep(5)
+            print(server.stats())
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    run()
@@ -1,15 +1,64 @@
 from collections import namedtuple
 import numpy as np
 import cv2
-import joblib
 import os
+import time
 
 from pupil_labs.real_time_screen_gaze.gaze_mapper import GazeMapper
 from pupil_labs.realtime_api import GazeData
 
-from .raw_data_receiver import RawDataReceiver
+from .raw_data_receiver import RawDataReceiver, SCENE_FRAME_RATE
+from .replay_data_receiver import ReplayDataReceiver, ReplayPacing
+from .synthetic_data_receiver import (
+    SyntheticDataReceiver,
+    SyntheticGaze,
+    SceneRenderer,
+    corner_marker_verts,
+)
 from .marker import Marker
 from .dwell_detector import DwellDetector
+from .drift_correction import DriftCorrector
+from .latency import LatencyMonitor, STAGES
+from .metrics import REGISTRY, MetricsRegistry
+from .connection_supervisor import ConnectionSupervisor, ConnectionState, StreamHealth
+from .device_cache import DeviceCache, DEVICE_CACHE_FILE, SCENE_CALIBRATION_DTYPE
+from .gaze_extrapolation import GazeExtrapolator
+from .imu_fusion import SurfacePosePredictor, IMU_TO_SCENE_ROTATION
+from .gaze_filter import (
+    GazeFilter,
+    GazeFilterChain,
+    GazeFilterSettings,
+    GazeFilterType,
+    KalmanFilter,
+    MedianFilter,
+    ModeGazeFilterType,
+    MovingAverageFilter,
+    OneEuroFilter,
+    SaccadeAwareFilter,
+)
+from .recorder import SessionRecorder, load_recording, RECORDINGS_DIR, METADATA_FILE
+from .predictor import (
+    Predictor,
+    PolynomialPredictor,
+    ThinPlateSplinePredictor,
+    CorrectionGrid,
+    load_predictor,
+    PREDICTOR_FILE,
+)
+from .calibration_data import CalibrationCollector
+from .calibration_fitting import CalibrationFitter
+from .calibration_targets import (
+    grid_targets,
+    validation_targets,
+    AdaptiveTargetPlanner,
+    PursuitPath,
+)
+from .calibration_validation import (
+    CalibrationValidator,
+    save_validation_report,
+    load_validation_report,
+    VALIDATION_FILE,
+)
 
 
 EyeTrackingData = namedtuple(
@@ -23,12 +72,22 @@ EyeTrackingData = namedtuple(
         "raw_gaze",
         "markers",
         "surf_to_img_trans",
+        "uncorrected_gaze",
+        "predicted_gaze",
     ],
+    # Gaze where it is predicted to be when it is shown, see GazeExtrapolator
+    defaults=[None],
 )
 
 
 class EyeTrackingProvider(RawDataReceiver):
-    def __init__(self, markers, screen_size, use_calibrated_gaze=True):
+    def __init__(
+        self,
+        markers,
+        screen_size,
+        use_calibrated_gaze=True,
+        correction_grid_resolution=None,
+    ):
         super().__init__()
         self.markers = markers
         self.screen_size = screen_size
@@ -36,15 +95,49 @@ class EyeTrackingProvider(RawDataReceiver):
         self.K_inv = None
         self.D = None
 
+        self.surface = None
+        self.gazeMapper = None
+        self.dwell_detector = DwellDetector()
+        self.drift_corrector = DriftCorrector(screen_size)
+        self.gaze_extrapolator = GazeExtrapolator(self.latency)
+        self.recorder = SessionRecorder()
+
+        self._gaze_mapped = REGISTRY.counter(
+            "gaze_control_gaze_mapped_total", "Samples mapped onto the screen."
+        )
+        self._gaze_unmapped = REGISTRY.counter(
+            "gaze_control_gaze_unmapped_total",
+            "Samples that could not be mapped, e.g. because no markers were found.",
+        )
+        self._mapping_time = REGISTRY.histogram(
+            "gaze_control_mapping_seconds",
+            "Time for marker detection and gaze mapping per sample.",
+        )
+
+        self.correction_grid_resolution = correction_grid_resolution
         self.predictor = None
-        if use_calibrated_gaze and os.path.exists("predictor.pkl"):
-            self.predictor = joblib.load("predictor.pkl")
+        if use_calibrated_gaze and os.path.exists(PREDICTOR_FILE):
+            self.set_predictor(load_predictor(PREDICTOR_FILE))
+        elif use_calibrated_gaze and os.path.exists("predictor.pkl"):
+            print(
+                "Found legacy predictor.pkl. Convert it with "
+                "`python src/migrate_predictor.py`. Providing uncorrected gaze."
+            )
         else:
             print("No predictor found. Providing uncorrected gaze.")
 
-        self.surface = None
-        self.gazeMapper = None
-        self.dwell_detector = DwellDetector()
+    def set_predictor(self, predictor):
+        # The accuracy and cost of the grid are measured by `benchmark.py`, not
+        # here on the GUI thread
+        if predictor is not None and self.correction_grid_resolution is not None:
+            predictor = CorrectionGrid(
+                predictor, self.screen_size, self.correction_grid_resolution
+            )
+
+        # Swapped with a single assignment, receive() either uses the old or
+        # the new predictor. Drift estimated for the old one no longer applies.
+        self.predictor = predictor
+        self.drift_corrector.reset()
 
     def connect(self, auto_discover=False, ip=None, port=None):
         result = super().connect(auto_discover, ip, port)
@@ -52,37 +145,64 @@ class EyeTrackingProvider(RawDataReceiver):
         if result is None:
             return None
         else:
-            self.K = self.scene_calibration["scene_camera_matrix"][0]
-            self.K_inv = np.linalg.inv(self.K)
-            self.D = self.scene_calibration["scene_distortion_coefficients"][0]
-            self.gazeMapper = GazeMapper(self.scene_calibration)
-            self.update_surface()
+            self._set_scene_calibration(self.scene_calibration)
             return result
 
+    def _set_scene_calibration(self, calibration):
+        super()._set_scene_calibration(calibration)
+        self.K = calibration["scene_camera_matrix"][0]
+        self.K_inv = np.linalg.inv(self.K)
+        self.D = calibration["scene_distortion_coefficients"][0]
+        self.surface_pose_predictor.camera_matrix = self.K
+        self.gazeMapper = GazeMapper(calibration)
+        self.update_surface()
+
     def update_surface(self):
         if self.gazeMapper is None:
             return
 
         self.gazeMapper.clear_surfaces()
         verts = {
-            i: self.markers[i].get_marker_verts() for i in range(len(self.markers))
+            i: [tuple(v) for v in verts] for i, verts in enumerate(self.marker_verts())
         }
         self.surface = self.gazeMapper.add_surface(verts, self.screen_size)
 
+    def marker_verts(self):
+        """Vertices of the markers that define the screen surface."""
+        return [marker.get_marker_verts() for marker in self.markers]
+
     def receive(self) -> EyeTrackingData:
         raw_data = super().receive()
 
         if raw_data is None:
             return None
 
-        mapped_gaze, detected_markers, surf_to_img_trans = self._map_gaze(
-            raw_data.scene, raw_data.raw_gaze
-        )
+        with self._mapping_time.time():
+            mapped_gaze, detected_markers, surf_to_img_trans = self._map_gaze(
+                raw_data.scene, raw_data.raw_gaze
+            )
+            if self.surface_pose_predictor.has_imu:
+                mapped_gaze = self._map_with_predicted_surface(
+                    raw_data, mapped_gaze, surf_to_img_trans
+                )
+        self.latency.mark("map")
+
+        if mapped_gaze is None:
+            self._gaze_unmapped.inc()
+        else:
+            self._gaze_mapped.inc()
 
+        uncorrected_gaze = mapped_gaze
         if self.predictor is not None and mapped_gaze is not None:
-            mapped_gaze = self.predictor.predict([mapped_gaze])[0]
+            mapped_gaze = self.predictor.predict_point(mapped_gaze)
+
+        mapped_gaze = self.drift_corrector.apply(mapped_gaze)
+        self.latency.mark("predict")
 
         dwell_process = self.dwell_detector.addPoint(mapped_gaze, raw_data.timestamp)
+        self.latency.mark("dwell")
+
+        predicted_gaze = self.gaze_extrapolator.add(mapped_gaze, raw_data.timestamp)
 
         eye_tracking_data = EyeTrackingData(
             raw_data.timestamp,
@@ -93,10 +213,38 @@ class EyeTrackingProvider(RawDataReceiver):
             raw_data.raw_gaze,
             detected_markers,
             surf_to_img_trans,
+            uncorrected_gaze,
+            predicted_gaze,
         )
+        self.recorder.add_sample(eye_tracking_data)
 
         return eye_tracking_data
 
+    def start_recording(self, directory=None):
+        """Starts recording the session, see `SessionRecorder`."""
+        metadata = {
+            "screen_size": list(self.screen_size),
+            "device_serial": self.device_serial,
+            "marker_verts": self.marker_verts(),
+        }
+        scene_calibration = None if self.device is None else self.scene_calibration
+        return self.recorder.start(directory, metadata, scene_calibration)
+
+    def stop_recording(self):
+        self.recorder.stop()
+
+    def close(self):
+        self.recorder.stop()
+        super().close()
+
+    def add_confirmed_target(self, target):
+        """Uses the last completed dwell as a labelled sample for drift correction.
+
+        To be called when a dwell selected something with a known center, e.g. a
+        gaze button. `target` is the center in global screen coordinates.
+        """
+        self.drift_corrector.add_sample(self.dwell_detector.last_dwell_center, target)
+
     def _map_gaze(self, frame, gaze):
         assert self.surface is not None
 
@@ -120,6 +268,32 @@ class EyeTrackingProvider(RawDataReceiver):
 
         return gaze, result.markers, surf_to_img_trans
 
+    def _map_with_predicted_surface(self, raw_data, mapped_gaze, surf_to_img_trans):
+        """Maps gaze that is newer than its scene frame, or whose frame had no
+        detected surface, with the surface predicted from the IMU.
+        """
+        scene_timestamp = raw_data.scene.timestamp_unix_seconds
+        self.surface_pose_predictor.add_frame(scene_timestamp, surf_to_img_trans)
+
+        gaze = raw_data.raw_gaze
+        if surf_to_img_trans is not None and (
+            mapped_gaze is None or gaze.timestamp_unix_seconds <= scene_timestamp
+        ):
+            return mapped_gaze
+
+        transform = self.surface_pose_predictor.predict(gaze.timestamp_unix_seconds)
+        if transform is None:
+            return mapped_gaze
+
+        point = cv2.undistortPoints(
+            np.array([[[gaze.x, gaze.y]]], dtype=np.float64), self.K, self.D, P=self.K
+        ).reshape(2)
+        u, v, w = np.linalg.solve(transform, [point[0], point[1], 1.0])
+        return (
+            float(u / w * self.screen_size[0]),
+            float((1 - v / w) * self.screen_size[1]),
+        )
+
     def distort_point(self, p):
         p_hom = np.array([p[0], p[1], 1])
         p_3d = self.K_inv @ p_hom
@@ -140,30 +314,135 @@ class EyeTrackingProvider(RawDataReceiver):
         return g_scene_dist_2d
 
 
+class ReplayEyeTrackingProvider(EyeTrackingProvider, ReplayDataReceiver):
+    """Runs the gaze pipeline on a recorded session instead of a device.
+
+    The surface is defined by the marker positions stored in the recording and
+    gaze is mapped to the screen size of the recording, so samples are mapped
+    like they were during the session regardless of the current window layout.
+    Call `connect()` to start, like for a device.
+    """
+
+    def __init__(
+        self,
+        directory,
+        markers=None,
+        pacing=ReplayPacing.REAL_TIME,
+        loop=False,
+        use_calibrated_gaze=True,
+        correction_grid_resolution=None,
+    ):
+        recording = load_recording(directory)
+        super().__init__(
+            markers=markers or [],
+            screen_size=tuple(recording["metadata"]["screen_size"]),
+            use_calibrated_gaze=use_calibrated_gaze,
+            correction_grid_resolution=correction_grid_resolution,
+        )
+        self.open(recording, pacing, loop)
+
+    def marker_verts(self):
+        return self.recording["metadata"].get("marker_verts") or super().marker_verts()
+
+
+class SyntheticEyeTrackingProvider(EyeTrackingProvider, SyntheticDataReceiver):
+    """Runs the gaze pipeline on generated gaze instead of a device.
+
+    See `SyntheticGaze` for the options of the generated gaze. With
+    `render_scene` the gaze goes through marker detection and mapping on
+    rendered scene frames, `renderer.set_screen_pose` moves the screen in
+    them. Otherwise the generated screen gaze is used as the mapped gaze.
+    Call `connect()` to start, like for a device.
+    """
+
+    def __init__(
+        self,
+        screen_size,
+        rate=200.0,
+        render_scene=False,
+        marker_verts=None,
+        pacing=ReplayPacing.AS_FAST_AS_POSSIBLE,
+        seed=None,
+        use_calibrated_gaze=False,
+        correction_grid_resolution=None,
+        **gaze_options,
+    ):
+        super().__init__(
+            markers=[],
+            screen_size=screen_size,
+            use_calibrated_gaze=use_calibrated_gaze,
+            correction_grid_resolution=correction_grid_resolution,
+        )
+        self._marker_verts = marker_verts or corner_marker_verts(screen_size)
+        self.configure(
+            screen_size,
+            rate,
+            render_scene,
+            self._marker_verts,
+            pacing,
+            seed,
+            **gaze_options,
+        )
+
+    def marker_verts(self):
+        return self._marker_verts
+
+    def _map_gaze(self, frame, gaze):
+        # Blinks
+        if gaze.x != gaze.x:
+            return None, [], None
+
+        if self.renderer is None:
+            return self.screen_gaze, [], None
+
+        return super()._map_gaze(frame, gaze)
+
+
 class DummyEyeTrackingProvider:
     def __init__(self, markers, screen_size, use_calibrated_gaze):
+        import pyautogui
+
+        self._pyautogui = pyautogui
         self.dwell_detector = DwellDetector()
+        self.drift_corrector = DriftCorrector(screen_size)
+        self.latency = LatencyMonitor()
+        self.gaze_extrapolator = GazeExtrapolator(self.latency)
+        self.surface_pose_predictor = SurfacePosePredictor()
+        self.recorder = SessionRecorder()
+        self.screen_size = screen_size
         self.device = "dummy_device"
 
-    def receive(self) -> EyeTrackingData:
-        import time
-        import pyautogui
+        # Allocated once, receive() is called for every poll
+        scene_img = np.zeros((1200, 1600, 3), dtype=np.uint8)
+        self._scene = type("", (object,), {"bgr_pixels": scene_img})()
 
+    def receive(self) -> EyeTrackingData:
         ts = time.time()
+        self.latency.start_sample()
 
-        p = pyautogui.position()
+        p = self._pyautogui.position()
         p = p[0] - 200, p[1]
+        self.latency.mark("receive")
 
         dwell_process = self.dwell_detector.addPoint(p, ts)
+        self.latency.mark("dwell")
 
-        scene_img = np.zeros((1600, 1200, 3), dtype=np.uint8)
-        scene = type("", (object,), {"bgr_pixels": scene_img})()
-
+        scene = self._scene
         raw_gaze = GazeData(500, 500, True, ts)
 
         eye_tracking_data = EyeTrackingData(
-            ts, p, [], dwell_process, scene, raw_gaze, [], None
+            ts,
+            p,
+            [],
+            dwell_process,
+            scene,
+            raw_gaze,
+            [],
+            None,
+            p,
+            self.gaze_extrapolator.add(p, ts),
         )
+        self.recorder.add_sample(eye_tracking_data)
 
         return eye_tracking_data
 
@@ -173,11 +452,27 @@ class DummyEyeTrackingProvider:
     def update_surface(self):
         pass
 
+    def set_predictor(self, predictor):
+        pass
+
+    def set_gaze_filter(self, gaze_filter):
+        pass
+
+    def add_confirmed_target(self, target):
+        pass
+
     def distort_point(self, p):
         pass
 
     def map_surface_to_scene_video(self, surface_point, transform):
         pass
 
+    def start_recording(self, directory=None):
+        metadata = {"screen_size": list(self.screen_size), "device_serial": None}
+        return self.recorder.start(directory, metadata)
+
+    def stop_recording(self):
+        self.recorder.stop()
+
     def close(self):
-        pass
+        self.recorder.stop()
@@ -0,0 +1,105 @@
+import numpy as np
+
+
+class CalibrationCollector:
+    """Collects calibration samples into preallocated arrays.
+
+    Every accepted sample is stored with its device timestamp, the index of the
+    target shown at that time and the target location. Samples without a valid
+    gaze or with a repeated timestamp are rejected on arrival, outliers are
+    rejected per target using the median absolute deviation (MAD) once the data
+    is requested.
+    """
+
+    def __init__(self, capacity=4096, mad_threshold=3.5):
+        self.mad_threshold = mad_threshold
+        self._allocate(capacity)
+        self.clear()
+
+    def _allocate(self, capacity):
+        self.gaze = np.empty((capacity, 2), dtype=np.float64)
+        self.targets = np.empty((capacity, 2), dtype=np.float64)
+        self.timestamps = np.empty(capacity, dtype=np.float64)
+        self.target_indices = np.empty(capacity, dtype=np.int64)
+
+    def _grow(self):
+        n = self.n_samples
+        old = self.gaze, self.targets, self.timestamps, self.target_indices
+        self._allocate(len(self.timestamps) * 2)
+        self.gaze[:n] = old[0][:n]
+        self.targets[:n] = old[1][:n]
+        self.timestamps[:n] = old[2][:n]
+        self.target_indices[:n] = old[3][:n]
+
+    def clear(self):
+        self.n_samples = 0
+        self.n_invalid = 0
+        self._last_timestamp = None
+
+    def add_sample(self, gaze, timestamp, target_idx, target):
+        if timestamp == self._last_timestamp:
+            return False
+        self._last_timestamp = timestamp
+
+        if gaze is None or not np.isfinite(gaze[0]) or not np.isfinite(gaze[1]):
+            self.n_invalid += 1
+            return False
+
+        if self.n_samples == len(self.timestamps):
+            self._grow()
+
+        idx = self.n_samples
+        self.gaze[idx] = gaze
+        self.targets[idx] = target
+        self.timestamps[idx] = timestamp
+        self.target_indices[idx] = target_idx
+        self.n_samples += 1
+
+        return True
+
+    def samples(self):
+        """All accepted samples, without outlier rejection."""
+        n = self.n_samples
+        return self.gaze[:n], self.timestamps[:n], self.target_indices[:n]
+
+    def inlier_mask(self):
+        n = self.n_samples
+        gaze = self.gaze[:n]
+        target_indices = self.target_indices[:n]
+        mask = np.ones(n, dtype=bool)
+
+        for target_idx in np.unique(target_indices):
+            selection = np.flatnonzero(target_indices == target_idx)
+            if len(selection) < 3:
+                continue
+
+            points = gaze[selection]
+            distances = np.linalg.norm(points - np.median(points, axis=0), axis=1)
+            median_distance = np.median(distances)
+            mad = np.median(np.abs(distances - median_distance))
+            if mad == 0:
+                continue
+
+            # 0.6745 scales the MAD to the standard deviation of a normal distribution
+            robust_z = 0.6745 * (distances - median_distance) / mad
+            mask[selection[robust_z > self.mad_threshold]] = False
+
+        return mask
+
+    def training_data(self):
+        n = self.n_samples
+        mask = self.inlier_mask()
+        return (
+            self.gaze[:n][mask],
+            self.targets[:n][mask],
+            self.target_indices[:n][mask],
+        )
+
+    def summary(self):
+        n_inliers = int(np.count_nonzero(self.inlier_mask()))
+        return {
+            "n_samples": self.n_samples,
+            "n_inliers": n_inliers,
+            "n_outliers": self.n_samples - n_inliers,
+            "n_invalid": self.n_invalid,
+        }
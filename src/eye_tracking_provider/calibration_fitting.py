@@ -0,0 +1,267 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .predictor import (
+    PolynomialPredictor,
+    ThinPlateSplinePredictor,
+    thin_plate_kernel,
+)
+
+
+DEFAULT_CANDIDATES = [
+    *(
+        ("polynomial", {"degree": degree, "alpha": alpha})
+        for degree in [2, 3, 4]
+        for alpha in [1e-6, 1e-4, 1e-2]
+    ),
+    *(("thin_plate_spline", {"smoothing": s}) for s in [1e-4, 1e-3, 1e-2]),
+]
+
+REGION_NAMES = [
+    [f"{row}-{col}" for col in ["left", "center", "right"]]
+    for row in ["top", "middle", "bottom"]
+]
+
+
+def polynomial_powers(degree):
+    return np.array(
+        [(i - j, j) for i in range(degree + 1) for j in range(i + 1)], dtype=np.int64
+    )
+
+
+def _fit_polynomial(x, y, degree, alpha):
+    powers = polynomial_powers(degree)
+    features = np.prod(x[:, None, :] ** powers[None, :, :], axis=2)
+
+    # Ridge regression, the constant term is not penalized
+    penalty = alpha * len(x) * np.eye(len(powers))
+    penalty[0, 0] = 0.0
+    coefficients = np.linalg.solve(features.T @ features + penalty, features.T @ y)
+
+    return {"powers": powers, "coefficients": coefficients}
+
+
+def _predict_polynomial(model, x):
+    features = np.prod(x[:, None, :] ** model["powers"][None, :, :], axis=2)
+    return features @ model["coefficients"]
+
+
+def _spline_centers(x, groups):
+    # One center per target keeps the system small regardless of sample count
+    unique_groups, inverse = np.unique(groups, return_inverse=True)
+    centers = np.zeros((len(unique_groups), 2))
+    np.add.at(centers, inverse, x)
+    return centers / np.bincount(inverse)[:, None]
+
+
+def _fit_thin_plate_spline(x, y, groups, smoothing):
+    centers = _spline_centers(x, groups)
+    kernel = thin_plate_kernel(x, centers)
+    design = np.hstack([kernel, np.ones((len(x), 1)), x])
+
+    n_centers = len(centers)
+    penalty = np.zeros((design.shape[1], design.shape[1]))
+    penalty[:n_centers, :n_centers] = smoothing * len(x) * np.eye(n_centers)
+    params = np.linalg.solve(design.T @ design + penalty, design.T @ y)
+
+    return {
+        "centers": centers,
+        "weights": params[:n_centers],
+        "affine": params[n_centers:],
+    }
+
+
+def _predict_thin_plate_spline(model, x):
+    kernel = thin_plate_kernel(x, model["centers"])
+    return kernel @ model["weights"] + x @ model["affine"][1:] + model["affine"][0]
+
+
+def _fit_model(kind, params, x, y, groups):
+    if kind == "polynomial":
+        return _fit_polynomial(x, y, **params)
+    elif kind == "thin_plate_spline":
+        return _fit_thin_plate_spline(x, y, groups, **params)
+
+    raise ValueError(f"Unknown model type '{kind}'")
+
+
+def _predict_model(kind, model, x):
+    if kind == "polynomial":
+        return _predict_polynomial(model, x)
+    return _predict_thin_plate_spline(model, x)
+
+
+def _cross_validate(kind, params, x, y, groups, folds):
+    """Returns held-out predictions for every sample."""
+    predictions = np.empty_like(y)
+    for fold in np.unique(folds):
+        test = folds == fold
+        model = _fit_model(kind, params, x[~test], y[~test], groups[~test])
+        predictions[test] = _predict_model(kind, model, x[test])
+
+    return predictions
+
+
+def held_out_predictions(kind, params, gaze, targets, target_indices, screen_size):
+    """Leave-one-target-out predictions for every sample, in pixels."""
+    scale = np.asarray(screen_size, dtype=np.float64)
+    groups = np.asarray(target_indices)
+    x = np.asarray(gaze, dtype=np.float64) / scale
+    y = np.asarray(targets, dtype=np.float64) / scale
+    return _cross_validate(kind, params, x, y, groups, groups) * scale
+
+
+def _assign_folds(groups, n_folds, seed=0):
+    # Whole targets are held out, so the error reflects unseen screen positions
+    unique_groups = np.unique(groups)
+    rng = np.random.default_rng(seed)
+    group_folds = rng.permutation(len(unique_groups)) % n_folds
+    return group_folds[np.searchsorted(unique_groups, groups)]
+
+
+def region_ids(points, screen_size):
+    """Index of the 3x3 screen region of every point, row by row."""
+    cells = np.floor(np.asarray(points) / np.asarray(screen_size) * 3)
+    cells = np.clip(cells, 0, 2).astype(np.int64)
+    return cells[:, 1] * 3 + cells[:, 0]
+
+
+def region_statistics(predictions, targets, target_indices, screen_size):
+    """Accuracy and precision per screen region, in pixels.
+
+    Accuracy is the length of the mean offset between predictions and targets
+    of a target index, precision the RMS of sample-to-sample differences of
+    that offset (samples are expected in time order). Both work for static and
+    moving targets and are averaged over the target indices of a region, which
+    are assigned to a 3x3 grid over the screen by their mean location.
+    """
+    unique_targets, inverse = np.unique(target_indices, return_inverse=True)
+    n_targets = len(unique_targets)
+    counts = np.bincount(inverse, minlength=n_targets)
+    offsets = predictions - targets
+
+    mean_offset = np.zeros((n_targets, 2))
+    np.add.at(mean_offset, inverse, offsets)
+    mean_offset /= counts[:, None]
+    accuracy = np.linalg.norm(mean_offset, axis=1)
+
+    step = np.sum(np.diff(offsets, axis=0) ** 2, axis=1)
+    same_target = inverse[1:] == inverse[:-1]
+    s2s_sum = np.bincount(inverse[1:][same_target], step[same_target], n_targets)
+    s2s_count = np.bincount(inverse[1:][same_target], minlength=n_targets)
+    precision = np.sqrt(s2s_sum / np.maximum(s2s_count, 1))
+
+    target_locations = np.zeros((n_targets, 2))
+    np.add.at(target_locations, inverse, targets)
+    target_locations /= counts[:, None]
+
+    target_regions = region_ids(target_locations, screen_size)
+
+    regions = {}
+    for region_id in np.unique(target_regions):
+        selection = target_regions == region_id
+        regions[REGION_NAMES[region_id // 3][region_id % 3]] = {
+            "accuracy_px": float(accuracy[selection].mean()),
+            "precision_px": float(precision[selection].mean()),
+            "n_targets": int(np.count_nonzero(selection)),
+            "n_samples": int(counts[selection].sum()),
+        }
+
+    return regions
+
+
+class CalibrationFitter:
+    """Selects and fits the calibration model.
+
+    Every candidate model is evaluated with k-fold cross-validation, where the
+    folds hold out whole targets. Candidates are evaluated in parallel worker
+    processes, call `start()` early (e.g. when calibration begins) so the
+    workers are already running when the data is ready.
+    """
+
+    def __init__(
+        self, screen_size, candidates=DEFAULT_CANDIDATES, n_folds=5, max_workers=None
+    ):
+        self.screen_size = screen_size
+        self.candidates = list(candidates)
+        self.n_folds = n_folds
+        self.max_workers = max_workers
+        self.n_workers = 0
+        self._executor = None
+
+    def start(self):
+        if self._executor is None and self.max_workers != 0:
+            self.n_workers = self.max_workers or os.cpu_count() or 1
+            self._executor = ProcessPoolExecutor(self.n_workers)
+            # Spawn the workers now instead of on the first real job
+            for _ in range(self.n_workers):
+                self._executor.submit(time.sleep, 0)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self.n_workers = 0
+
+    def fit(self, gaze, targets, target_indices, device_serial=None):
+        start_time = time.perf_counter()
+
+        scale = np.asarray(self.screen_size, dtype=np.float64)
+        targets = np.asarray(targets, dtype=np.float64)
+        x = np.asarray(gaze, dtype=np.float64) / scale
+        y = targets / scale
+        groups = np.asarray(target_indices)
+        folds = _assign_folds(groups, min(self.n_folds, len(np.unique(groups))))
+
+        jobs = [(kind, params, x, y, groups, folds) for kind, params in self.candidates]
+        if self._executor is not None:
+            futures = [self._executor.submit(_cross_validate, *job) for job in jobs]
+            held_out = [future.result() * scale for future in futures]
+        else:
+            held_out = [_cross_validate(*job) * scale for job in jobs]
+
+        errors = [
+            float(np.mean(np.linalg.norm(p - targets, axis=1))) for p in held_out
+        ]
+        best = int(np.argmin(errors))
+        kind, params = self.candidates[best]
+
+        model = _fit_model(kind, params, x, y, groups)
+        fit_stats = {
+            "model": kind,
+            "params": params,
+            "n_samples": len(x),
+            "n_targets": int(len(np.unique(groups))),
+            "cv_error_px": float(errors[best]),
+            "candidates": [
+                {"model": k, "params": p, "cv_error_px": e}
+                for (k, p), e in zip(self.candidates, errors)
+            ],
+            "regions": region_statistics(
+                held_out[best], targets, target_indices, self.screen_size
+            ),
+        }
+
+        predictor = self._create_predictor(kind, model, scale)
+        predictor.screen_size = tuple(self.screen_size)
+        predictor.device_serial = device_serial
+        fit_stats["fit_duration_s"] = time.perf_counter() - start_time
+        predictor.fit_stats = fit_stats
+
+        return predictor
+
+    def _create_predictor(self, kind, model, scale):
+        if kind == "polynomial":
+            powers = model["powers"]
+            # Fold the input and output scaling into the coefficients so the
+            # predictor works on pixel coordinates directly
+            input_scale = np.prod(scale[None, :] ** powers, axis=1)
+            coefficients = (model["coefficients"] / input_scale[:, None]) * scale
+            return PolynomialPredictor(powers, coefficients.T, np.zeros(2))
+
+        return ThinPlateSplinePredictor(
+            model["centers"], model["weights"], model["affine"], scale
+        )
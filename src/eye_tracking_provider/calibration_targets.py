@@ -0,0 +1,204 @@
+import numpy as np
+
+from .calibration_fitting import held_out_predictions
+
+
+def grid_targets(width, height):
+    """The static calibration target grid, as (x, y) screen coordinates.
+
+    Targets are denser in the top and bottom bands, where the keyboard and the
+    mode menus are, than in the center of the screen.
+    """
+    hor_padd = width * 0.11
+    ver_padd = height * 0.015
+    hor_targets = np.linspace(hor_padd, width - hor_padd, 6)
+    ver_targets = np.linspace(ver_padd, height * 0.15, 3)
+    top_targets = np.meshgrid(hor_targets, ver_targets)
+
+    ver_targets = np.linspace(height - height * 0.15, height - ver_padd, 3)
+    bot_targets = np.meshgrid(hor_targets, ver_targets)
+
+    hor_padd = width * 0.015
+    hor_targets = np.linspace(hor_padd, width - hor_padd, 8)
+    ver_padd = height * 0.2
+    ver_targets = np.linspace(ver_padd, height - ver_padd, 6)
+    center_targets = np.meshgrid(hor_targets, ver_targets)
+
+    return np.concatenate(
+        [
+            np.stack([xs.flatten(), ys.flatten()], axis=1)
+            for xs, ys in [top_targets, center_targets, bot_targets]
+        ]
+    )
+
+
+def validation_targets(width, height):
+    """Targets for validating a calibration, as (x, y) screen coordinates.
+
+    A 4x3 grid covering every screen region, placed between the positions of
+    the calibration grid so the calibration is tested on unseen locations.
+    """
+    xs = np.array([1, 3, 5, 7]) / 8 * width
+    ys = np.array([1, 3, 5]) / 6 * height
+    grid_x, grid_y = np.meshgrid(xs, ys)
+    return np.stack([grid_x.ravel(), grid_y.ravel()], axis=1)
+
+
+class PursuitPath:
+    """A smoothly moving calibration target for smooth-pursuit calibration.
+
+    The target follows a Lissajous curve over the screen, `cycles` sets the
+    number of horizontal and vertical oscillations within `duration` seconds.
+    """
+
+    def __init__(self, width, height, duration=40.0, padding=0.03, cycles=(5, 4)):
+        self.duration = duration
+        self.center = np.array([width, height]) / 2
+        self.amplitude = np.array([width, height]) * (0.5 - padding)
+        self.frequency = np.array(cycles) / duration
+
+    def position(self, t):
+        t = np.clip(np.asarray(t, dtype=np.float64), 0.0, self.duration)
+        # Starting at phase -pi/2 puts the target into the top left corner at t=0
+        phase = 2 * np.pi * np.multiply.outer(t, self.frequency) - np.pi / 2
+        return self.center + self.amplitude * np.sin(phase)
+
+    def align(self, gaze, times, max_lag=0.5, lag_step=1 / 120, mad_threshold=3.5):
+        """Aligns gaze samples with the target trajectory.
+
+        The gaze lags behind the target by the pursuit latency of the eye plus
+        the latency of the pipeline. For each candidate lag an affine map from
+        gaze to target is fitted, the lag with the smallest residual is used.
+        Samples whose residual is an outlier (catch-up saccades, blinks) are
+        masked out.
+
+        Returns the target location for every sample, the lag and the inlier mask.
+        """
+        gaze = np.asarray(gaze, dtype=np.float64)
+        design = np.hstack([gaze, np.ones((len(gaze), 1))])
+
+        best = None
+        for lag in np.arange(0.0, max_lag, lag_step):
+            labels = self.position(times - lag)
+            params, *_ = np.linalg.lstsq(design, labels, rcond=None)
+            residuals = np.linalg.norm(design @ params - labels, axis=1)
+            error = np.median(residuals)
+            if best is None or error < best[0]:
+                best = error, lag, labels, residuals
+
+        _, lag, labels, residuals = best
+        median = np.median(residuals)
+        mad = np.median(np.abs(residuals - median))
+        mask = np.ones(len(gaze), dtype=bool)
+        if mad > 0:
+            mask = 0.6745 * (residuals - median) / mad <= mad_threshold
+
+        return labels, float(lag), mask
+
+
+class AdaptiveTargetPlanner:
+    """Places calibration targets where the provisional model is worst.
+
+    Starts with a coarse 3x3 grid. After every batch provisional models are
+    fitted and the leave-one-target-out error of the best one is computed per
+    target. Candidate locations are scored by the error of nearby targets
+    (inverse distance weighted), scaled down close to existing targets, and
+    the next batch takes the best scoring candidates. Planning stops once the
+    median held-out error is below `accuracy_goal` or `max_targets` is
+    reached. Held-out errors overestimate the error of the final model, which
+    is fitted on all targets.
+    """
+
+    def __init__(
+        self,
+        width,
+        height,
+        accuracy_goal=5.0,
+        batch_size=4,
+        min_targets=13,
+        max_targets=40,
+        padding=0.03,
+    ):
+        self.screen_size = (width, height)
+        self.accuracy_goal = accuracy_goal
+        self.batch_size = batch_size
+        self.min_targets = min_targets
+        self.max_targets = max_targets
+        self.last_error = None
+
+        def grid(n_cols, n_rows):
+            xs = np.linspace(width * padding, width * (1 - padding), n_cols)
+            ys = np.linspace(height * padding, height * (1 - padding), n_rows)
+            grid_x, grid_y = np.meshgrid(xs, ys)
+            return np.stack([grid_x.ravel(), grid_y.ravel()], axis=1)
+
+        self.initial_targets = grid(3, 3)
+        self.candidates = grid(16, 9)
+
+    def next_targets(self, gaze, targets, target_indices, n_targets):
+        """Returns the next batch of new targets, or None when calibration is
+        done.
+        """
+        if n_targets >= self.max_targets:
+            return None
+
+        unique_targets, inverse = np.unique(target_indices, return_inverse=True)
+        if len(unique_targets) < 6:
+            # Too few targets with data for a provisional model, show the
+            # initial targets again that got none
+            distances = np.linalg.norm(
+                self.initial_targets[:, None] - np.reshape(targets, (1, -1, 2)), axis=2
+            )
+            has_data = (distances < 1.0).any(axis=1)
+            if has_data.all():
+                return None
+            return self.initial_targets[~has_data]
+
+        counts = np.bincount(inverse)
+        locations = np.zeros((len(unique_targets), 2))
+        locations[inverse] = targets
+
+        def target_errors(kind, params):
+            predictions = held_out_predictions(
+                kind, params, gaze, targets, target_indices, self.screen_size
+            )
+            # Norm of the mean offset, so gaze noise averages out
+            mean_offset = np.zeros((len(unique_targets), 2))
+            np.add.at(mean_offset, inverse, predictions - targets)
+            return np.linalg.norm(mean_offset / counts[:, None], axis=1)
+
+        degree = 2 if len(unique_targets) < 16 else 3
+        errors = min(
+            [
+                target_errors("polynomial", {"degree": degree, "alpha": 1e-4}),
+                target_errors("thin_plate_spline", {"smoothing": 1e-3}),
+            ],
+            key=np.median,
+        )
+
+        # Held-out errors of corner targets are extrapolation errors and stay
+        # high however many targets there are, the median is not affected
+        self.last_error = float(np.median(errors))
+
+        if self.last_error <= self.accuracy_goal and n_targets >= self.min_targets:
+            return None
+
+        distances = np.linalg.norm(
+            self.candidates[:, None, :] - locations[None, :, :], axis=2
+        )
+        weights = 1.0 / np.maximum(distances, 1.0) ** 2
+        expected_error = (weights @ errors) / weights.sum(axis=1)
+
+        nearest = distances.min(axis=1)
+        spacing = np.linalg.norm(self.screen_size) / np.sqrt(n_targets)
+
+        chosen = []
+        for _ in range(min(self.batch_size, self.max_targets - n_targets)):
+            score = expected_error * np.minimum(nearest / spacing, 1.0)
+            best = int(np.argmax(score))
+            chosen.append(self.candidates[best])
+            nearest = np.minimum(
+                nearest, np.linalg.norm(self.candidates - self.candidates[best], axis=1)
+            )
+
+        return np.array(chosen)
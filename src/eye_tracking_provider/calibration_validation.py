@@ -0,0 +1,111 @@
+import json
+import time
+
+import numpy as np
+
+from .calibration_fitting import REGION_NAMES, region_ids, region_statistics
+
+
+VALIDATION_FILE = "predictor_validation.json"
+
+
+class CalibrationValidator:
+    """Collects gaze on validation targets and computes the accuracy report.
+
+    Unlike calibration samples, samples where gaze could not be mapped to the
+    screen are kept (as NaN), so the report can tell how often mapping failed.
+    """
+
+    def __init__(self, screen_size, capacity=2048):
+        self.screen_size = screen_size
+        self.gaze = np.empty((capacity, 2), dtype=np.float64)
+        self.targets = np.empty((capacity, 2), dtype=np.float64)
+        self.target_indices = np.empty(capacity, dtype=np.int64)
+        self.clear()
+
+    def clear(self):
+        self.n_samples = 0
+        self._last_timestamp = None
+
+    def _grow(self):
+        n = self.n_samples
+        self.gaze = np.concatenate([self.gaze[:n], np.empty_like(self.gaze)])
+        self.targets = np.concatenate([self.targets[:n], np.empty_like(self.targets)])
+        self.target_indices = np.concatenate(
+            [self.target_indices[:n], np.empty_like(self.target_indices)]
+        )
+
+    def add_sample(self, gaze, timestamp, target_idx, target):
+        if timestamp == self._last_timestamp:
+            return
+        self._last_timestamp = timestamp
+
+        if self.n_samples == len(self.target_indices):
+            self._grow()
+
+        idx = self.n_samples
+        self.gaze[idx] = gaze if gaze is not None else (np.nan, np.nan)
+        self.targets[idx] = target
+        self.target_indices[idx] = target_idx
+        self.n_samples += 1
+
+    def report(self):
+        n = self.n_samples
+        if n == 0:
+            raise ValueError("no validation samples were recorded")
+
+        gaze = self.gaze[:n]
+        targets = self.targets[:n]
+        target_indices = self.target_indices[:n]
+        valid = np.isfinite(gaze).all(axis=1)
+
+        regions = {}
+        if valid.any():
+            regions = region_statistics(
+                gaze[valid], targets[valid], target_indices[valid], self.screen_size
+            )
+
+        sample_regions = region_ids(targets, self.screen_size)
+        n_failed = np.bincount(sample_regions, ~valid, minlength=9)
+        n_total = np.bincount(sample_regions, minlength=9)
+        for region_id in np.flatnonzero(n_total):
+            name = REGION_NAMES[region_id // 3][region_id % 3]
+            region = regions.setdefault(name, {"n_targets": 0, "n_samples": 0})
+            region["failure_fraction"] = float(n_failed[region_id] / n_total[region_id])
+
+        # Overall values are averages over targets, like the regional values
+        measured = [r for r in regions.values() if r["n_targets"] > 0]
+        weights = [r["n_targets"] for r in measured]
+
+        def overall(key):
+            if not measured:
+                return None
+            return float(np.average([r[key] for r in measured], weights=weights))
+
+        return {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "n_targets": int(len(np.unique(target_indices))),
+            "n_samples": n,
+            "failure_fraction": float(1.0 - valid.mean()),
+            "accuracy_px": overall("accuracy_px"),
+            "precision_px": overall("precision_px"),
+            "regions": regions,
+        }
+
+
+def _rounded(value):
+    if isinstance(value, float):
+        return round(value, 2)
+    if isinstance(value, dict):
+        return {k: _rounded(v) for k, v in value.items()}
+    return value
+
+
+def save_validation_report(report, path=VALIDATION_FILE):
+    with open(path, "w") as f:
+        json.dump(_rounded(report), f, separators=(",", ":"))
+
+
+def load_validation_report(path=VALIDATION_FILE):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,316 @@
+import asyncio
+import sys
+import threading
+import time
+from enum import Enum
+
+import numpy as np
+from PySide6.QtCore import *
+
+from .device_cache import is_reachable
+from .latency import RollingBuffer
+from .metrics import REGISTRY
+
+
+INITIAL_RECONNECT_INTERVAL = 0.5
+DISCOVERY_DURATION = 2.0
+FRAME_RATE_WINDOW = 2.0
+
+
+class ConnectionState(Enum):
+    DISCONNECTED = "Disconnected"
+    CONNECTED = "Connected"
+    RECONNECTING = "Reconnecting"
+
+
+class StreamHealth:
+    """Arrival statistics of the scene frames received from the device."""
+
+    def __init__(self, capacity=128):
+        self.arrival_times = RollingBuffer(capacity)
+        self.intervals = RollingBuffer(capacity)
+        self.last_frame_time = None
+        self.start_time = None
+
+    def reset(self):
+        """Starts over, e.g. after connecting, counting from now."""
+        self.arrival_times.n_values = 0
+        self.intervals.n_values = 0
+        self.last_frame_time = time.monotonic()
+        self.start_time = self.last_frame_time
+
+    def add_frame(self):
+        now = time.monotonic()
+        if self.last_frame_time is not None and self.arrival_times.n_values > 0:
+            self.intervals.add(now - self.last_frame_time)
+        self.arrival_times.add(now)
+        self.last_frame_time = now
+
+    def time_since_last_frame(self, now=None):
+        if self.last_frame_time is None:
+            return float("inf")
+        if now is None:
+            now = time.monotonic()
+        return now - self.last_frame_time
+
+    def frame_rate(self, now=None, window=FRAME_RATE_WINDOW):
+        """Frames per second received in the last `window` seconds."""
+        if now is None:
+            now = time.monotonic()
+        times = self.arrival_times.filled()
+        return float(np.count_nonzero(times > now - window) / window)
+
+    def jitter(self):
+        """Standard deviation of the time between frames, in seconds."""
+        intervals = self.intervals.filled()
+        if len(intervals) < 2:
+            return 0.0
+        return float(np.std(intervals))
+
+    def observed_for(self, now=None):
+        """Time since the last reset."""
+        if self.start_time is None:
+            return 0.0
+        if now is None:
+            now = time.monotonic()
+        return now - self.start_time
+
+
+def _discover_address(phone_id, search_duration):
+    """Address of the device with `phone_id` if it is announced on the network."""
+    from pupil_labs.realtime_api.discovery import Network
+
+    async def discover():
+        async with Network() as network:
+            await asyncio.sleep(search_duration)
+            return network.devices
+
+    for device in asyncio.run(discover()):
+        # Names follow 'PI monitor:<phone name>:<phone id>._http._tcp.local.'
+        if device.name.split(".")[0].endswith(f":{phone_id}") and device.addresses:
+            return device.addresses[0], device.port
+
+    return None
+
+
+class ConnectionSupervisor(QObject):
+    """Watches the stream of the connected device and reconnects when it breaks.
+
+    The stream counts as broken when no scene frame arrived for
+    `stall_timeout` seconds, or when fewer than `min_frame_rate` frames per
+    second arrived. The device is then released and reconnected with
+    exponentially increasing intervals between attempts, up to
+    `max_reconnect_interval`. Whether the device is back is checked on a
+    background thread, first at its last address and then with discovery in
+    case it got a new one, so the app keeps running while it is away.
+    Reconnecting uses the cached scene camera calibration.
+    """
+
+    changed = Signal()
+    state_changed = Signal(object)
+    _search_finished = Signal(object)
+
+    def __init__(self, receiver, check_interval=0.25):
+        super().__init__()
+        self.receiver = receiver
+
+        self._stall_timeout = 2.0
+        self._min_frame_rate = 5.0
+        self._max_reconnect_interval = 30.0
+
+        self.state = ConnectionState.DISCONNECTED
+        self.address = None
+        self.phone_id = None
+        self._reconnect_interval = INITIAL_RECONNECT_INTERVAL
+        self._next_attempt = 0.0
+        self._searching = False
+        self._lost_time = None
+
+        self._search_finished.connect(self._on_search_finished)
+
+        self.timer = QTimer()
+        self.timer.setInterval(check_interval * 1000)
+        self.timer.timeout.connect(self._check)
+
+        self._reconnects = REGISTRY.counter(
+            "gaze_control_reconnects_total",
+            "Times the device was reconnected after the stream broke.",
+        )
+        self._recovery_time = REGISTRY.histogram(
+            "gaze_control_recovery_seconds",
+            "Time from losing the stream until the device was reconnected.",
+            buckets=[1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0],
+        )
+        self._frame_rate = REGISTRY.gauge(
+            "gaze_control_scene_frame_rate_hz",
+            "Scene frames per second received from the device.",
+        )
+        self._jitter = REGISTRY.gauge(
+            "gaze_control_scene_frame_jitter_seconds",
+            "Standard deviation of the time between received scene frames.",
+        )
+        self._since_last_frame = REGISTRY.gauge(
+            "gaze_control_seconds_since_last_frame",
+            "Time since the last scene frame was received.",
+        )
+
+    @property
+    def stall_timeout(self) -> float:
+        """
+        Reconnect when no scene frame was received for this long.
+
+        :label Reconnect After (seconds)
+        :min 0.5
+        :max 30.0
+        :step 0.5
+        :decimals 1
+        """
+        return self._stall_timeout
+
+    @stall_timeout.setter
+    def stall_timeout(self, value):
+        self._stall_timeout = value
+        self.changed.emit()
+
+    @property
+    def min_frame_rate(self) -> float:
+        """
+        Reconnect when fewer scene frames per second are received, 0 to disable.
+
+        :label Minimum Frame Rate (Hz)
+        :min 0.0
+        :max 30.0
+        :decimals 1
+        """
+        return self._min_frame_rate
+
+    @min_frame_rate.setter
+    def min_frame_rate(self, value):
+        self._min_frame_rate = value
+        self.changed.emit()
+
+    @property
+    def max_reconnect_interval(self) -> float:
+        """
+        :label Max. Time Between Reconnects (seconds)
+        :min 1.0
+        :max 300.0
+        :decimals 1
+        """
+        return self._max_reconnect_interval
+
+    @max_reconnect_interval.setter
+    def max_reconnect_interval(self, value):
+        self._max_reconnect_interval = value
+        self.changed.emit()
+
+    def health(self):
+        """The current stream statistics, times in seconds."""
+        health = self.receiver.health
+        return {
+            "state": self.state.value,
+            "since_last_frame": health.time_since_last_frame(),
+            "frame_rate": health.frame_rate(),
+            "jitter": health.jitter(),
+        }
+
+    def on_connected(self, address):
+        """Starts supervising after the device at `address` was connected."""
+        self.address = tuple(address)
+        self.phone_id = self.receiver.device.phone_id
+        self._set_state(ConnectionState.CONNECTED)
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+        self._set_state(ConnectionState.DISCONNECTED)
+
+    def _set_state(self, state):
+        if state == ConnectionState.CONNECTED:
+            self.receiver.health.reset()
+
+        if state != self.state:
+            self.state = state
+            self.state_changed.emit(state)
+
+    def _check(self):
+        now = time.monotonic()
+
+        if self.state == ConnectionState.CONNECTED:
+            health = self.receiver.health
+            since_last_frame = health.time_since_last_frame(now)
+            frame_rate = health.frame_rate(now)
+            self._since_last_frame.set(since_last_frame)
+            self._frame_rate.set(frame_rate)
+            self._jitter.set(health.jitter())
+
+            reason = None
+            if since_last_frame > self._stall_timeout:
+                reason = f"no scene frame for {since_last_frame:.1f} s"
+            elif (
+                self._min_frame_rate > 0
+                and health.observed_for(now) > FRAME_RATE_WINDOW
+                and frame_rate < self._min_frame_rate
+            ):
+                reason = f"scene frame rate dropped to {frame_rate:.1f} Hz"
+
+            if reason is not None:
+                print(f"Connection to the device lost ({reason}), reconnecting")
+                self._lost_time = now - min(since_last_frame, FRAME_RATE_WINDOW)
+                self._reconnect_interval = INITIAL_RECONNECT_INTERVAL
+                self._next_attempt = now
+                self._set_state(ConnectionState.RECONNECTING)
+
+        if (
+            self.state == ConnectionState.RECONNECTING
+            and not self._searching
+            and now >= self._next_attempt
+        ):
+            self._searching = True
+            # Closing the old device can block on its network threads too
+            device = self.receiver.detach_device()
+            threading.Thread(
+                target=self._search,
+                args=(device, self.address, self.phone_id),
+                name="DeviceSearch",
+                daemon=True,
+            ).start()
+
+    def _search(self, device, address, phone_id):
+        if device is not None:
+            try:
+                device.close()
+            except Exception as exc:
+                print(exc, file=sys.stderr)
+
+        found = None
+        try:
+            if address is not None and is_reachable(*address):
+                found = address
+            elif phone_id is not None:
+                found = _discover_address(phone_id, DISCOVERY_DURATION)
+        except Exception as exc:
+            print(exc, file=sys.stderr)
+
+        self._search_finished.emit(found)
+
+    def _on_search_finished(self, address):
+        self._searching = False
+        if self.state != ConnectionState.RECONNECTING:
+            return
+
+        now = time.monotonic()
+        if address is not None:
+            ip, port = address
+            if self.receiver.connect(ip=ip, port=port) is not None:
+                self.address = tuple(address)
+                self._reconnects.inc()
+                self._recovery_time.observe(now - self._lost_time)
+                print(f"Reconnected to the device after {now - self._lost_time:.1f} s")
+                self._set_state(ConnectionState.CONNECTED)
+                return
+
+        self._next_attempt = now + self._reconnect_interval
+        self._reconnect_interval = min(
+            self._reconnect_interval * 2, self._max_reconnect_interval
+        )
@@ -0,0 +1,124 @@
+import json
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+
+
+DEVICE_CACHE_FILE = "device_cache.json"
+
+# The part of the device calibration that gaze mapping needs
+SCENE_CALIBRATION_DTYPE = np.dtype(
+    [
+        ("serial", "6S"),
+        ("scene_camera_matrix", "(3,3)d"),
+        ("scene_distortion_coefficients", "8d"),
+    ]
+)
+
+
+def scene_calibration_from_arrays(serial, camera_matrix, distortion_coefficients):
+    calibration = np.zeros(1, dtype=SCENE_CALIBRATION_DTYPE)
+    calibration["serial"] = (serial or "").encode()[:6]
+    calibration["scene_camera_matrix"] = camera_matrix
+    calibration["scene_distortion_coefficients"] = distortion_coefficients
+    return calibration
+
+
+def same_scene_calibration(a, b):
+    return np.allclose(
+        a["scene_camera_matrix"], b["scene_camera_matrix"]
+    ) and np.allclose(
+        a["scene_distortion_coefficients"], b["scene_distortion_coefficients"]
+    )
+
+
+def is_reachable(ip, port, timeout=0.5):
+    """Whether a TCP connection to the address can be opened within `timeout`."""
+    try:
+        with socket.create_connection((ip, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+class DeviceCache:
+    """Device metadata that is slow to fetch, stored on disk by module serial.
+
+    Holds the scene camera calibration and the last address a device was
+    reached at, so connecting does not have to wait for the calibration
+    download and reconnecting does not have to wait for discovery. Cached
+    entries can be outdated, e.g. after a module was recalibrated, callers
+    validate them against the device in the background.
+    """
+
+    def __init__(self, path=DEVICE_CACHE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._devices = {}
+        self._last_serial = None
+
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            self._devices = data.get("devices", {})
+            self._last_serial = data.get("last_serial")
+        except FileNotFoundError:
+            pass
+        except (ValueError, AttributeError) as exc:
+            print(f"Ignoring invalid device cache {path}: {exc}")
+
+    def scene_calibration(self, serial):
+        entry = self._devices.get(serial)
+        if entry is None or "scene_camera_matrix" not in entry:
+            return None
+
+        return scene_calibration_from_arrays(
+            serial,
+            entry["scene_camera_matrix"],
+            entry["scene_distortion_coefficients"],
+        )
+
+    def address(self, serial):
+        entry = self._devices.get(serial)
+        if entry is None or "address" not in entry:
+            return None
+
+        return tuple(entry["address"])
+
+    def last_address(self):
+        """Address of the device that was connected most recently."""
+        return self.address(self._last_serial)
+
+    def update(self, serial, scene_calibration=None, address=None):
+        if not serial or serial == "default":
+            return
+
+        with self._lock:
+            entry = self._devices.setdefault(serial, {})
+            if scene_calibration is not None:
+                entry["scene_camera_matrix"] = scene_calibration[
+                    "scene_camera_matrix"
+                ][0].tolist()
+                entry["scene_distortion_coefficients"] = scene_calibration[
+                    "scene_distortion_coefficients"
+                ][0].tolist()
+            if address is not None:
+                entry["address"] = list(address)
+                self._last_serial = serial
+            entry["updated"] = time.time()
+            self._save()
+
+    def _save(self):
+        # Written to a temporary file first so a crash never leaves a
+        # truncated cache behind
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(
+                {"last_serial": self._last_serial, "devices": self._devices},
+                f,
+                indent=4,
+            )
+        os.replace(temp_path, self.path)
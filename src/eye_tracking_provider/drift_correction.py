@@ -0,0 +1,130 @@
+import numpy as np
+from PySide6.QtCore import *
+
+
+class DriftCorrector(QObject):
+    """Online correction of slow calibration drift, e.g. from headset slippage.
+
+    Confirmed selections of targets with a known center (gaze buttons, keyboard
+    keys) are used as labelled samples. The residual between the dwell center
+    and the target center is modelled as an affine function of the screen
+    position and updated with recursive least squares with exponential
+    forgetting, so each update is O(1) and no samples are stored.
+    """
+
+    changed = Signal()
+
+    def __init__(self, screen_size):
+        super().__init__()
+        self.screen_size = np.asarray(screen_size, dtype=np.float64)
+
+        self._enabled = True
+        self._max_residual = 100
+        self._forgetting_factor = 0.95
+        self.max_correction = 150.0
+        self.max_covariance_trace = 1e3
+
+        self.reset()
+
+    @property
+    def enabled(self) -> bool:
+        """
+        :label Drift Correction
+        """
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value):
+        self._enabled = value
+        self.changed.emit()
+
+    @property
+    def max_residual(self) -> int:
+        """
+        Selections further than this from the target center are ignored.
+
+        :label Drift Correction Max Residual (pixels)
+        :min 10
+        :max 500
+        """
+        return self._max_residual
+
+    @max_residual.setter
+    def max_residual(self, value):
+        self._max_residual = value
+        self.changed.emit()
+
+    @property
+    def forgetting_factor(self) -> float:
+        """
+        Weight of past selections, lower values adapt faster.
+
+        :label Drift Correction Forgetting Factor
+        :min 0.5
+        :max 1.0
+        :step 0.01
+        :decimals 2
+        """
+        return self._forgetting_factor
+
+    @forgetting_factor.setter
+    def forgetting_factor(self, value):
+        self._forgetting_factor = value
+        self.changed.emit()
+
+    def reset(self):
+        self.theta = np.zeros((3, 2))
+        self.covariance = np.eye(3)
+        self.n_updates = 0
+
+    def _features(self, point):
+        x, y = point
+        return np.array([1.0, x / self.screen_size[0], y / self.screen_size[1]])
+
+    def correction(self, point):
+        offset = self._features(point) @ self.theta
+        norm = np.hypot(*offset)
+        if norm > self.max_correction:
+            offset *= self.max_correction / norm
+
+        return offset
+
+    def apply(self, gaze):
+        if not self._enabled or self.n_updates == 0 or gaze is None:
+            return gaze
+
+        dx, dy = self.correction(gaze)
+        return gaze[0] + dx, gaze[1] + dy
+
+    def add_sample(self, corrected_gaze, target):
+        """Updates the model with a confirmed selection.
+
+        `corrected_gaze` is the dwell center as seen by the dwell detector, i.e.
+        after the current correction was applied.
+        """
+        if not self._enabled or corrected_gaze is None:
+            return False
+
+        if np.hypot(target[0] - corrected_gaze[0], target[1] - corrected_gaze[1]) > (
+            self._max_residual
+        ):
+            return False
+
+        # The correction is smooth, so evaluating it at the corrected location
+        # is a good enough estimate of what was added to the uncorrected gaze
+        uncorrected = np.asarray(corrected_gaze) - self.correction(corrected_gaze)
+        residual = np.asarray(target) - uncorrected
+
+        phi = self._features(uncorrected)
+        p_phi = self.covariance @ phi
+        gain = p_phi / (self._forgetting_factor + phi @ p_phi)
+        self.theta += np.outer(gain, residual - phi @ self.theta)
+        self.covariance -= np.outer(gain, p_phi)
+
+        # Only forget while the covariance is bounded, otherwise directions
+        # that are never excited (e.g. only one screen region is used) wind up
+        if np.trace(self.covariance) < self.max_covariance_trace:
+            self.covariance /= self._forgetting_factor
+
+        self.n_updates += 1
+        return True
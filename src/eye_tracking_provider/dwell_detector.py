@@ -2,6 +2,8 @@ import numpy as np
 import math
 from PySide6.QtCore import *
 
+from .metrics import REGISTRY
+
 
 class DwellDetector(QObject):
     changed = Signal()
@@ -19,6 +21,15 @@ class DwellDetector(QObject):
         self.in_dwell = False
         self.dwell_process = 0
         self.last_dwell_timestamp = 0
+        self.last_dwell_center = None
+
+        self._selections = REGISTRY.counter(
+            "gaze_control_dwell_selections_total", "Completed dwells."
+        )
+        self._resets = REGISTRY.counter(
+            "gaze_control_dwell_resets_total",
+            "Dwells that were aborted because gaze left the dwell range.",
+        )
 
     @property
     def dwell_time(self) -> float:
@@ -85,6 +96,7 @@ class DwellDetector(QObject):
         distances = np.sqrt(np.sum(self.points[:, :2] - center, axis=1) ** 2)
         if np.max(distances) > self.range:
             self.points = np.empty(shape=[0, 3])
+            self._resets.inc()
 
         if len(self.points) > 1:
             duration = self.points[-1, 2] - self.points[0, 2]
@@ -94,6 +106,8 @@ class DwellDetector(QObject):
 
         if self.dwell_process >= 1.0:
             self.last_dwell_timestamp = timestamp
+            self.last_dwell_center = tuple(center)
+            self._selections.inc()
             self.points = np.empty(shape=[0, 3])
             return 1.0
         else:
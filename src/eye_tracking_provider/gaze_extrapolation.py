@@ -0,0 +1,187 @@
+import math
+
+from PySide6.QtCore import *
+
+from .metrics import REGISTRY
+
+
+LATENCY_UPDATE_INTERVAL = 30
+MAX_SAMPLE_GAP = 0.2
+
+
+class GazeExtrapolator(QObject):
+    """Predicts where the gaze is by the time a sample is shown on screen.
+
+    A sample is already old when it is painted: it waited for the next scene
+    frame, was sent over the network and went through mapping and the widgets.
+    The extrapolator estimates this latency from the `LatencyMonitor` of the
+    pipeline and moves the gaze ahead along its current velocity.
+
+    This only helps while the gaze moves smoothly, e.g. following a moving
+    object. During fixations, below `min_speed`, the velocity is mostly noise
+    and the gaze is left where it is, with a gradual transition in between. At
+    saccades, above `saccade_threshold`, the landing point cannot be predicted
+    and overshooting it would be worse than lagging, so the gaze is not moved
+    until the velocity of the following samples is known again. The prediction
+    never looks further ahead than `max_horizon`.
+
+    Speeds are in screen pixels per second.
+    """
+
+    changed = Signal()
+
+    def __init__(self, latency_monitor=None, default_latency=0.05):
+        super().__init__()
+        self.latency_monitor = latency_monitor
+        self.default_latency = default_latency
+
+        self._enabled = True
+        self._max_horizon = 0.1
+        self._min_speed = 150.0
+        self._saccade_threshold = 2500.0
+        self.velocity_smoothing = 0.5
+
+        self._horizon = REGISTRY.gauge(
+            "gaze_control_extrapolation_horizon_seconds",
+            "How far ahead the displayed gaze is extrapolated.",
+        )
+
+        self.reset()
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Show the gaze where it is predicted to be when it is painted.
+
+        :label Predict Gaze
+        """
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value):
+        self._enabled = value
+        self.changed.emit()
+
+    @property
+    def max_horizon(self) -> float:
+        """
+        The furthest the gaze is predicted ahead, in seconds.
+
+        :label Max. Prediction (seconds)
+        :min 0.0
+        :max 0.3
+        :step 0.01
+        :decimals 2
+        """
+        return self._max_horizon
+
+    @max_horizon.setter
+    def max_horizon(self, value):
+        self._max_horizon = value
+        self.changed.emit()
+
+    @property
+    def min_speed(self) -> float:
+        """
+        Slower gaze counts as a fixation and is not predicted, in pixels per second.
+
+        :label Min. Speed (px/s)
+        :min 0
+        :max 1000
+        :step 10
+        :decimals 0
+        """
+        return self._min_speed
+
+    @min_speed.setter
+    def min_speed(self, value):
+        self._min_speed = value
+        self.changed.emit()
+
+    @property
+    def saccade_threshold(self) -> float:
+        """
+        Faster gaze counts as a saccade and is not predicted, in pixels per second.
+
+        :label Saccade Threshold (px/s)
+        :min 500
+        :max 10000
+        :step 100
+        :decimals 0
+        """
+        return self._saccade_threshold
+
+    @saccade_threshold.setter
+    def saccade_threshold(self, value):
+        self._saccade_threshold = value
+        self.changed.emit()
+
+    def reset(self):
+        self._last = None
+        self._velocity = None
+        self._n_samples = 0
+        self._latency = self.default_latency
+        self._latency_updated = -LATENCY_UPDATE_INTERVAL
+
+    def latency(self):
+        """The estimated time from a sample's device timestamp until it is
+        painted, in seconds.
+        """
+        if self._n_samples >= self._latency_updated + LATENCY_UPDATE_INTERVAL:
+            self._latency_updated = self._n_samples
+            latency = math.nan
+            if self.latency_monitor is not None:
+                latency = self.latency_monitor.end_to_end()
+            if math.isnan(latency) or latency < 0:
+                latency = self.default_latency
+            self._latency = latency
+        return self._latency
+
+    def add(self, gaze, timestamp):
+        """Adds a gaze sample and returns its predicted position on screen.
+
+        Returns `gaze` itself if nothing can be predicted, or None for None.
+        """
+        if gaze is None:
+            self._last = None
+            self._velocity = None
+            return None
+
+        last = self._last
+        self._last = gaze, timestamp
+        self._n_samples += 1
+        if last is None or not 0 < timestamp - last[1] < MAX_SAMPLE_GAP:
+            self._velocity = None
+            return gaze
+
+        dt = timestamp - last[1]
+        vx = (gaze[0] - last[0][0]) / dt
+        vy = (gaze[1] - last[0][1]) / dt
+        if math.hypot(vx, vy) > self._saccade_threshold:
+            # The velocity during a saccade says nothing about the gaze after it
+            self._velocity = None
+            return gaze
+
+        if self._velocity is None:
+            self._velocity = vx, vy
+            return gaze
+
+        a = self.velocity_smoothing
+        vx = self._velocity[0] + a * (vx - self._velocity[0])
+        vy = self._velocity[1] + a * (vy - self._velocity[1])
+        self._velocity = vx, vy
+
+        if not self._enabled:
+            return gaze
+
+        # Fades in between `min_speed` and twice that, so gaze does not jump
+        # when a pursuit starts
+        speed = math.hypot(vx, vy)
+        if self._min_speed > 0:
+            gain = min(max(speed / self._min_speed - 1, 0.0), 1.0)
+        else:
+            gain = 1.0
+        horizon = gain * min(self.latency(), self._max_horizon)
+        self._horizon.set(horizon)
+
+        return gaze[0] + vx * horizon, gaze[1] + vy * horizon
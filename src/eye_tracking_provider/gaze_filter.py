@@ -0,0 +1,589 @@
+import bisect
+import copy
+import math
+from collections import deque
+from enum import Enum, auto
+
+from PySide6.QtCore import *
+
+from .metrics import REGISTRY
+
+
+class GazeFilter:
+    """A streaming filter for gaze positions.
+
+    `filter` takes one sample and returns the filtered position. It costs
+    constant time per sample, except for `MedianFilter`, which costs
+    O(window_size) per sample. Filters only see valid samples, `reset` is
+    called when the stream is interrupted, e.g. by a blink.
+    """
+
+    def filter(self, x, y, timestamp):
+        raise NotImplementedError
+
+    def reset(self):
+        pass
+
+    def added_latency(self, rate):
+        """How much later the output follows a jump of the gaze, in seconds.
+
+        Measured on a copy of the filter with samples at `rate` Hz, as the time
+        until the output covers half of a jump, e.g. at a saccade.
+        """
+        fresh = copy.deepcopy(self)
+        fresh.reset()
+
+        step = 100.0
+        n_before = int(rate)
+        for i in range(n_before):
+            fresh.filter(0.0, 0.0, i / rate)
+        for i in range(int(rate * 2)):
+            x, _ = fresh.filter(step, step, (n_before + i) / rate)
+            if x >= step / 2:
+                return i / rate
+
+        return math.inf
+
+
+class MovingAverageFilter(GazeFilter):
+    """The mean of the last `window_size` samples, kept as running sums."""
+
+    def __init__(self, window_size=5):
+        self.window_size = window_size
+        self.reset()
+
+    def reset(self):
+        self._xs = [0.0] * self.window_size
+        self._ys = [0.0] * self.window_size
+        self._sum_x = 0.0
+        self._sum_y = 0.0
+        self._n_samples = 0
+
+    def filter(self, x, y, timestamp):
+        i = self._n_samples % self.window_size
+        self._sum_x += x - self._xs[i]
+        self._sum_y += y - self._ys[i]
+        self._xs[i] = x
+        self._ys[i] = y
+        self._n_samples += 1
+
+        # Recomputed once per million samples, so rounding errors of the
+        # running sums cannot add up
+        if self._n_samples % 1_000_000 == 0:
+            self._sum_x = sum(self._xs)
+            self._sum_y = sum(self._ys)
+
+        n = min(self._n_samples, self.window_size)
+        return self._sum_x / n, self._sum_y / n
+
+
+class MedianFilter(GazeFilter):
+    """The median of the last `window_size` samples, per axis.
+
+    Removes single outliers without smearing them into the neighbouring
+    samples. A sorted copy of the window is kept next to the deque of samples.
+    The deque only makes dropping the oldest sample cheap, finding and moving
+    it in the sorted copy still costs O(window_size) per sample. That is cheap
+    for the small windows that are useful here.
+    """
+
+    def __init__(self, window_size=3):
+        self.window_size = window_size
+        self.reset()
+
+    def reset(self):
+        self._xs = deque()
+        self._ys = deque()
+        self._sorted_x = []
+        self._sorted_y = []
+
+    def filter(self, x, y, timestamp):
+        return (
+            self._add(x, self._xs, self._sorted_x),
+            self._add(y, self._ys, self._sorted_y),
+        )
+
+    def _add(self, value, values, sorted_values):
+        if len(values) == self.window_size:
+            del sorted_values[bisect.bisect_left(sorted_values, values.popleft())]
+        values.append(value)
+        bisect.insort(sorted_values, value)
+
+        n = len(sorted_values)
+        if n % 2:
+            return sorted_values[n // 2]
+        return (sorted_values[n // 2 - 1] + sorted_values[n // 2]) / 2
+
+
+class _LowPass:
+    __slots__ = ["value"]
+
+    def __init__(self):
+        self.value = None
+
+    def filter(self, value, alpha):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += alpha * (value - self.value)
+        return self.value
+
+
+class OneEuroFilter(GazeFilter):
+    """The 1€ filter (Casiez et al., 2012), a low-pass filter whose cutoff
+    frequency grows with the speed of the gaze.
+
+    Fixations are smoothed with `min_cutoff` (Hz), fast movements pass with
+    little lag. `beta` sets how fast the cutoff grows with speed.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.01, derivative_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.derivative_cutoff = derivative_cutoff
+        self.reset()
+
+    def reset(self):
+        self._x = _LowPass()
+        self._y = _LowPass()
+        self._dx = _LowPass()
+        self._dy = _LowPass()
+        self._last_x = None
+        self._last_y = None
+        self._last_timestamp = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def filter(self, x, y, timestamp):
+        if self._last_timestamp is None or timestamp <= self._last_timestamp:
+            dx = dy = 0.0
+            dt = None
+        else:
+            dt = timestamp - self._last_timestamp
+            dx = (x - self._last_x) / dt
+            dy = (y - self._last_y) / dt
+        self._last_x = x
+        self._last_y = y
+        self._last_timestamp = timestamp
+
+        if dt is None:
+            return self._x.filter(x, 1.0), self._y.filter(y, 1.0)
+
+        alpha_d = self._alpha(self.derivative_cutoff, dt)
+        speed = math.hypot(
+            self._dx.filter(dx, alpha_d), self._dy.filter(dy, alpha_d)
+        )
+        alpha = self._alpha(self.min_cutoff + self.beta * speed, dt)
+        return self._x.filter(x, alpha), self._y.filter(y, alpha)
+
+
+class _ConstantVelocityKalman:
+    """Kalman filter of position and velocity along one axis."""
+
+    __slots__ = ["position", "velocity", "p00", "p01", "p11"]
+
+    def __init__(self, position, measurement_variance):
+        self.position = position
+        self.velocity = 0.0
+        self.p00 = measurement_variance
+        self.p01 = 0.0
+        self.p11 = 1e6
+
+    def update(self, measurement, dt, acceleration_variance, measurement_variance):
+        # Predict, with white noise acceleration as process noise
+        self.position += self.velocity * dt
+        dt2 = dt * dt
+        q = acceleration_variance
+        p00 = self.p00 + dt * (2 * self.p01 + dt * self.p11) + q * dt2 * dt2 / 4
+        p01 = self.p01 + dt * self.p11 + q * dt2 * dt / 2
+        p11 = self.p11 + q * dt2
+
+        # Correct
+        s = p00 + measurement_variance
+        k0 = p00 / s
+        k1 = p01 / s
+        residual = measurement - self.position
+        self.position += k0 * residual
+        self.velocity += k1 * residual
+        self.p00 = (1 - k0) * p00
+        self.p01 = (1 - k0) * p01
+        self.p11 = p11 - k1 * p01
+
+        return self.position
+
+
+class KalmanFilter(GazeFilter):
+    """A constant velocity Kalman filter, per axis.
+
+    `measurement_noise` is the standard deviation of the gaze noise and
+    `process_noise` the standard deviation of the acceleration of the gaze, in
+    pixels and pixels per second squared. A larger ratio of process to
+    measurement noise follows movements faster and smooths less.
+    """
+
+    def __init__(self, process_noise=2000.0, measurement_noise=10.0):
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.reset()
+
+    def reset(self):
+        self._x = None
+        self._y = None
+        self._last_timestamp = None
+
+    def filter(self, x, y, timestamp):
+        measurement_variance = self.measurement_noise**2
+        if self._x is None:
+            self._x = _ConstantVelocityKalman(x, measurement_variance)
+            self._y = _ConstantVelocityKalman(y, measurement_variance)
+            self._last_timestamp = timestamp
+            return x, y
+
+        dt = max(timestamp - self._last_timestamp, 1e-4)
+        self._last_timestamp = timestamp
+        acceleration_variance = self.process_noise**2
+        return (
+            self._x.update(x, dt, acceleration_variance, measurement_variance),
+            self._y.update(y, dt, acceleration_variance, measurement_variance),
+        )
+
+
+class SaccadeAwareFilter(GazeFilter):
+    """Smooths fixations with `fixation_filter` but lets saccades through.
+
+    A saccade onset is detected when the gaze moves faster than
+    `velocity_threshold` (pixels per second) between two samples. The fixation
+    filter is then reset, so it neither lags behind the saccade nor averages
+    across it, and samples pass unfiltered until the gaze slows down again.
+    The fixation filter can therefore smooth strongly without delaying jumps
+    of the gaze.
+    """
+
+    def __init__(self, fixation_filter=None, velocity_threshold=1200.0):
+        if fixation_filter is None:
+            fixation_filter = MovingAverageFilter(8)
+        self.fixation_filter = fixation_filter
+        self.velocity_threshold = velocity_threshold
+        self.reset()
+
+    def reset(self):
+        self.fixation_filter.reset()
+        self._last = None
+        self.in_saccade = False
+
+    def filter(self, x, y, timestamp):
+        last = self._last
+        self._last = x, y, timestamp
+
+        if last is not None and timestamp > last[2]:
+            speed = math.hypot(x - last[0], y - last[1]) / (timestamp - last[2])
+            self.in_saccade = speed > self.velocity_threshold
+
+        if self.in_saccade:
+            self.fixation_filter.reset()
+            # Restarts the fixation filter at the current position
+            self.fixation_filter.filter(x, y, timestamp)
+            return x, y
+
+        return self.fixation_filter.filter(x, y, timestamp)
+
+
+class GazeFilterChain(GazeFilter):
+    """Applies filters one after another, e.g. a median against outliers
+    followed by a smoothing filter. An empty chain passes gaze unchanged.
+    """
+
+    def __init__(self, filters=()):
+        self.filters = list(filters)
+
+    def reset(self):
+        for gaze_filter in self.filters:
+            gaze_filter.reset()
+
+    def filter(self, x, y, timestamp):
+        for gaze_filter in self.filters:
+            x, y = gaze_filter.filter(x, y, timestamp)
+        return x, y
+
+    def added_latency(self, rate):
+        if not self.filters:
+            return 0.0
+        return super().added_latency(rate)
+
+
+class GazeFilterType(Enum):
+    NONE = auto()
+    MOVING_AVERAGE = auto()
+    MEDIAN = auto()
+    ONE_EURO = auto()
+    KALMAN = auto()
+    ADAPTIVE = auto()
+
+
+class ModeGazeFilterType(Enum):
+    """The gaze filter of an app mode, `DEFAULT` is the filter of all modes."""
+
+    DEFAULT = auto()
+    NONE = auto()
+    MOVING_AVERAGE = auto()
+    MEDIAN = auto()
+    ONE_EURO = auto()
+    KALMAN = auto()
+    ADAPTIVE = auto()
+
+
+def _mode_filter_property(mode):
+    def fget(self) -> ModeGazeFilterType:
+        return self._mode_filters.get(mode, ModeGazeFilterType.DEFAULT)
+
+    def fset(self, value):
+        if isinstance(value, str):
+            value = ModeGazeFilterType[value]
+
+        self._mode_filters[mode] = value
+        self.changed.emit()
+
+    fget.__doc__ = f"""
+        The filter in {mode} mode, "Default" uses the filter selected above.
+
+        :label {mode} Mode Filter
+        """
+    return property(fget, fset)
+
+
+class GazeFilterSettings(QObject):
+    """Which gaze filter is used in which app mode, and the filter parameters.
+
+    `create_chain(mode)` builds the filter for an app mode. The default is the
+    adaptive filter, which smooths fixations more than a 5 sample moving
+    average but passes saccades without lag, see `tune_gaze_filter.py`.
+    """
+
+    changed = Signal()
+
+    MODES = ["View", "Click", "Zoom", "Keyboard", "Speaker", "Calibrate"]
+
+    def __init__(self):
+        super().__init__()
+
+        self._filter = GazeFilterType.ADAPTIVE
+        self._remove_outliers = False
+        self._window_size = 5
+        self._min_cutoff = 1.0
+        self._beta = 0.01
+        self._process_noise = 2000.0
+        self._measurement_noise = 10.0
+        self._fixation_window_size = 8
+        self._saccade_threshold = 1200.0
+        self._mode_filters = {}
+
+        self._latency = {}
+
+    @property
+    def filter(self) -> GazeFilterType:
+        """
+        The filter used in all modes that do not select another one.
+
+        :label Gaze Filter
+        """
+        return self._filter
+
+    @filter.setter
+    def filter(self, value):
+        if isinstance(value, str):
+            value = GazeFilterType[value]
+
+        self._filter = value
+        self.changed.emit()
+
+    @property
+    def remove_outliers(self) -> bool:
+        """
+        Apply a 3 sample median before the filter, against single outliers.
+        """
+        return self._remove_outliers
+
+    @remove_outliers.setter
+    def remove_outliers(self, value):
+        self._remove_outliers = value
+        self.changed.emit()
+
+    @property
+    def window_size(self) -> int:
+        """
+        Samples averaged by the moving average and median filters.
+
+        :label Window Size (samples)
+        :min 1
+        :max 30
+        """
+        return self._window_size
+
+    @window_size.setter
+    def window_size(self, value):
+        self._window_size = int(value)
+        self.changed.emit()
+
+    @property
+    def min_cutoff(self) -> float:
+        """
+        Smoothing of the 1€ filter during fixations, lower is smoother.
+
+        :label 1€ Min. Cutoff (Hz)
+        :min 0.05
+        :max 10.0
+        :decimals 2
+        """
+        return self._min_cutoff
+
+    @min_cutoff.setter
+    def min_cutoff(self, value):
+        self._min_cutoff = value
+        self.changed.emit()
+
+    @property
+    def beta(self) -> float:
+        """
+        How quickly the 1€ filter stops smoothing when gaze moves.
+
+        :label 1€ Beta
+        :min 0.0
+        :max 0.1
+        :step 0.001
+        :decimals 3
+        """
+        return self._beta
+
+    @beta.setter
+    def beta(self, value):
+        self._beta = value
+        self.changed.emit()
+
+    @property
+    def process_noise(self) -> float:
+        """
+        Expected acceleration of the gaze, higher follows movements faster.
+
+        :label Kalman Process Noise (px/s²)
+        :min 10
+        :max 20000
+        :step 10
+        :decimals 0
+        """
+        return self._process_noise
+
+    @process_noise.setter
+    def process_noise(self, value):
+        self._process_noise = value
+        self.changed.emit()
+
+    @property
+    def measurement_noise(self) -> float:
+        """
+        Expected noise of the gaze, higher smooths more.
+
+        :label Kalman Measurement Noise (px)
+        :min 0.5
+        :max 100.0
+        :decimals 1
+        """
+        return self._measurement_noise
+
+    @measurement_noise.setter
+    def measurement_noise(self, value):
+        self._measurement_noise = value
+        self.changed.emit()
+
+    @property
+    def fixation_window_size(self) -> int:
+        """
+        Samples averaged by the adaptive filter during fixations.
+
+        :label Adaptive Fixation Window (samples)
+        :min 1
+        :max 30
+        """
+        return self._fixation_window_size
+
+    @fixation_window_size.setter
+    def fixation_window_size(self, value):
+        self._fixation_window_size = int(value)
+        self.changed.emit()
+
+    @property
+    def saccade_threshold(self) -> float:
+        """
+        Gaze speed at which the adaptive filter stops smoothing, in scene camera
+        pixels per second. Lower reacts to smaller saccades, but also to noise.
+
+        :label Adaptive Saccade Threshold (px/s)
+        :min 200
+        :max 5000
+        :step 50
+        :decimals 0
+        """
+        return self._saccade_threshold
+
+    @saccade_threshold.setter
+    def saccade_threshold(self, value):
+        self._saccade_threshold = value
+        self.changed.emit()
+
+    view_filter = _mode_filter_property("View")
+    click_filter = _mode_filter_property("Click")
+    zoom_filter = _mode_filter_property("Zoom")
+    keyboard_filter = _mode_filter_property("Keyboard")
+    speaker_filter = _mode_filter_property("Speaker")
+    calibrate_filter = _mode_filter_property("Calibrate")
+
+    def filter_type(self, mode=None):
+        """The filter used in `mode`, or in all modes that do not select one."""
+        mode_filter = self._mode_filters.get(mode, ModeGazeFilterType.DEFAULT)
+        if mode_filter == ModeGazeFilterType.DEFAULT:
+            return self._filter
+        return GazeFilterType[mode_filter.name]
+
+    def create_chain(self, mode=None):
+        filter_type = self.filter_type(mode)
+        filters = []
+        if self._remove_outliers and filter_type != GazeFilterType.NONE:
+            filters.append(MedianFilter(3))
+
+        if filter_type == GazeFilterType.MOVING_AVERAGE:
+            filters.append(MovingAverageFilter(self._window_size))
+        elif filter_type == GazeFilterType.MEDIAN:
+            filters.append(MedianFilter(self._window_size))
+        elif filter_type == GazeFilterType.ONE_EURO:
+            filters.append(OneEuroFilter(self._min_cutoff, self._beta))
+        elif filter_type == GazeFilterType.KALMAN:
+            filters.append(KalmanFilter(self._process_noise, self._measurement_noise))
+        elif filter_type == GazeFilterType.ADAPTIVE:
+            filters.append(
+                SaccadeAwareFilter(
+                    MovingAverageFilter(self._fixation_window_size),
+                    self._saccade_threshold,
+                )
+            )
+
+        return GazeFilterChain(filters)
+
+    def latency_report(self, rate):
+        """The latency every mode's filter adds, in milliseconds.
+
+        Also exported as a metric per mode.
+        """
+        report = {}
+        for mode in self.MODES:
+            latency = self.create_chain(mode).added_latency(rate)
+            if mode not in self._latency:
+                self._latency[mode] = REGISTRY.gauge(
+                    "gaze_control_gaze_filter_latency_seconds",
+                    "Latency the gaze filter adds to a jump of the gaze.",
+                    mode=mode,
+                )
+            self._latency[mode].set(latency)
+            report[mode] = latency * 1000
+        return report
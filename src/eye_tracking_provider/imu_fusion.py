@@ -0,0 +1,232 @@
+import math
+
+import cv2
+import numpy as np
+from PySide6.QtCore import *
+
+from .metrics import REGISTRY
+
+
+def _rotation_x(degrees):
+    c = math.cos(math.radians(degrees))
+    s = math.sin(math.radians(degrees))
+    return np.array([[1.0, 0.0, 0.0], [0.0, c, -s], [0.0, s, c]])
+
+
+# Neon's IMU axes point right, forward and up, the scene camera's right, down
+# and forward. The scene camera is tilted down by 12 degrees.
+IMU_TO_SCENE_ROTATION = _rotation_x(102.0)
+
+SURFACE_CORNERS = np.array([[0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]], dtype=float).T
+
+# Predictions are trusted until enough frames were checked to tell whether they
+# are better than the last measured pose
+MIN_CHECKED_FRAMES = 30
+ERROR_SMOOTHING = 0.05
+
+
+class SurfacePosePredictor(QObject):
+    """Predicts the screen surface in the scene camera between scene frames.
+
+    The surface transform is only measured when markers are detected in a
+    scene frame, but the head keeps turning in between. Gyroscope readings of
+    the IMU tell how far the scene camera rotated since the last frame, which
+    moves the surface in the image by the homography K R^T K^-1 for a rotation
+    R of the camera. Translation of the head is ignored, it moves the screen
+    much less than rotation does.
+
+    `predict` returns the surface-to-image transform (undistorted image) at a
+    given time. The rotation rate is interpolated between gyro readings and
+    the last reading is held until the next one arrives.
+    Every new frame checks the prediction of the previous frame against the
+    measured transform. If predicting does not beat using the last measured
+    transform, e.g. because the IMU orientation does not match, predictions
+    are switched off until it does again.
+    """
+
+    changed = Signal()
+
+    def __init__(self, imu_to_scene_rotation=IMU_TO_SCENE_ROTATION, capacity=128):
+        super().__init__()
+        self.imu_to_scene_rotation = imu_to_scene_rotation
+        self.camera_matrix = None
+
+        self._enabled = True
+        self._max_prediction = 0.2
+
+        self._gyro_times = np.zeros(capacity)
+        # In radians per second, in scene camera coordinates
+        self._gyro_rates = np.zeros((capacity, 3))
+        self._n_gyro = 0
+
+        self._prediction_error = REGISTRY.gauge(
+            "gaze_control_surface_prediction_error_px",
+            "Mean error of the surface corners predicted with the IMU at the "
+            "next scene frame.",
+            kind="predicted",
+        )
+        self._static_error = REGISTRY.gauge(
+            "gaze_control_surface_prediction_error_px",
+            "Mean error of the surface corners predicted with the IMU at the "
+            "next scene frame.",
+            kind="static",
+        )
+
+        self.reset()
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Use the IMU to follow head motion between scene frames, and map the
+        newest gaze instead of the gaze of the last scene frame.
+
+        :label Predict Head Motion
+        """
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value):
+        self._enabled = value
+        self.changed.emit()
+
+    @property
+    def max_prediction(self) -> float:
+        """
+        How long after a scene frame the surface is still predicted, e.g. while
+        markers are not detected.
+
+        :label Max. Prediction (seconds)
+        :min 0.0
+        :max 1.0
+        :step 0.05
+        :decimals 2
+        """
+        return self._max_prediction
+
+    @max_prediction.setter
+    def max_prediction(self, value):
+        self._max_prediction = value
+        self.changed.emit()
+
+    def reset(self):
+        self._n_gyro = 0
+        self._last_gyro_time = None
+        self._frame_time = None
+        self._frame_transform = None
+        self.prediction_error = math.nan
+        self.static_error = math.nan
+        self.n_checked_frames = 0
+
+    @property
+    def has_imu(self):
+        return self._n_gyro > 0
+
+    @property
+    def prediction_helps(self):
+        if self.n_checked_frames < MIN_CHECKED_FRAMES:
+            return True
+        return self.prediction_error <= self.static_error
+
+    def add_imu(self, timestamp, gyro):
+        """Adds a gyroscope reading in degrees per second, in IMU axes."""
+        # The same reading is received again when no new one arrived since
+        if self._n_gyro and timestamp <= self._last_gyro_time:
+            return
+
+        i = self._n_gyro % len(self._gyro_times)
+        self._last_gyro_time = timestamp
+        self._gyro_times[i] = timestamp
+        self._gyro_rates[i] = self.imu_to_scene_rotation @ np.radians(gyro)
+        self._n_gyro += 1
+
+    def rotation(self, t0, t1):
+        """Rotation of the scene camera from `t0` to `t1`, in camera coordinates
+        at `t0`.
+        """
+        rotation = np.eye(3)
+        if not self._n_gyro or t1 <= t0:
+            return rotation
+
+        capacity = len(self._gyro_times)
+        n = min(self._n_gyro, capacity)
+        first = self._n_gyro - n
+        indices = [i % capacity for i in range(first, self._n_gyro)]
+        times = self._gyro_times[indices]
+        rates = self._gyro_rates[indices]
+
+        # The IMU is read at the poll rate, so a few readings are skipped
+        # between two kept ones. The rate is interpolated linearly between kept
+        # readings, over their actual interval, and held before the first and
+        # after the last one. It is linear within each step, so the rate at the
+        # middle of a step is its mean.
+        inside = times[(times > t0) & (times < t1)]
+        bounds = np.concatenate([[t0], inside, [t1]])
+        middles = (bounds[:-1] + bounds[1:]) / 2
+        step_rates = np.stack(
+            [np.interp(middles, times, rates[:, axis]) for axis in range(3)], axis=1
+        )
+        for rate, duration in zip(step_rates, np.diff(bounds)):
+            step, _ = cv2.Rodrigues(rate * duration)
+            rotation = rotation @ step
+
+        return rotation
+
+    def _rotate(self, transform, t0, t1):
+        K = self.camera_matrix
+        return K @ self.rotation(t0, t1).T @ np.linalg.inv(K) @ transform
+
+    def add_frame(self, timestamp, transform):
+        """Sets the surface transform measured in the scene frame at `timestamp`."""
+        if transform is None:
+            return
+
+        if (
+            self._frame_transform is not None
+            and self.camera_matrix is not None
+            and self.has_imu
+            and 0 < timestamp - self._frame_time <= self._max_prediction
+        ):
+            predicted = self._rotate(self._frame_transform, self._frame_time, timestamp)
+            self._check(predicted, self._frame_transform, transform)
+
+        self._frame_time = timestamp
+        self._frame_transform = np.asarray(transform, dtype=np.float64)
+
+    def _check(self, predicted, static, measured):
+        def corner_error(transform):
+            corners = transform @ SURFACE_CORNERS
+            corners = corners[:2] / corners[2]
+            truth = measured @ SURFACE_CORNERS
+            truth = truth[:2] / truth[2]
+            return float(np.mean(np.linalg.norm(corners - truth, axis=0)))
+
+        prediction_error = corner_error(predicted)
+        static_error = corner_error(static)
+        if self.n_checked_frames == 0:
+            self.prediction_error = prediction_error
+            self.static_error = static_error
+        else:
+            a = ERROR_SMOOTHING
+            self.prediction_error += a * (prediction_error - self.prediction_error)
+            self.static_error += a * (static_error - self.static_error)
+        self.n_checked_frames += 1
+
+        self._prediction_error.set(self.prediction_error)
+        self._static_error.set(self.static_error)
+
+    def predict(self, timestamp):
+        """The surface-to-image transform at `timestamp`, or None if there is no
+        recent enough measured transform or no IMU data.
+        """
+        if (
+            not self._enabled
+            or self._frame_transform is None
+            or self.camera_matrix is None
+            or not self.has_imu
+            or abs(timestamp - self._frame_time) > self._max_prediction
+        ):
+            return None
+
+        if not self.prediction_helps:
+            return self._frame_transform
+        return self._rotate(self._frame_transform, self._frame_time, timestamp)
@@ -0,0 +1,117 @@
+import time
+
+import numpy as np
+
+
+STAGES = ["device", "receive", "map", "predict", "dwell", "dispatch", "paint"]
+
+
+class RollingBuffer:
+    """The last `capacity` values of a measurement in a preallocated ring."""
+
+    def __init__(self, capacity=512):
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.n_values = 0
+
+    def add(self, value):
+        self.values[self.n_values % len(self.values)] = value
+        self.n_values += 1
+
+    def filled(self):
+        return self.values[: min(self.n_values, len(self.values))]
+
+    def percentiles(self, q):
+        values = self.filled()
+        if len(values) == 0:
+            return [np.nan] * len(q)
+        return np.percentile(values, q).tolist()
+
+
+class LatencyMonitor:
+    """Per-stage timing of the gaze pipeline.
+
+    Every sample passes the stages in `STAGES`. Each stage calls `mark` when
+    it is done, which records the time since the previous mark. "device" is the
+    age of the sample when it arrives, measured against the device timestamp,
+    so it includes the clock offset between the device and this computer.
+    "paint" is the time from dispatching a sample to the UI until the active
+    mode finished painting it.
+
+    Marks only cost a clock read and a buffer write, percentiles are computed
+    when `summary` is called.
+    """
+
+    def __init__(self, capacity=512):
+        self.enabled = True
+        self.buffers = {stage: RollingBuffer(capacity) for stage in STAGES}
+        self.total = RollingBuffer(capacity)
+        self.sample_times = RollingBuffer(capacity)
+
+        self._sample_start = None
+        self._last_mark = None
+        self._awaiting_paint = False
+
+    def start_sample(self):
+        if not self.enabled:
+            return
+
+        self._sample_start = time.perf_counter()
+        # The later stages are only timed once the sample was received
+        self._last_mark = None
+        self._awaiting_paint = False
+
+    def record_device_timestamp(self, timestamp):
+        if self.enabled and self._sample_start is not None:
+            self.buffers["device"].add(time.time() - timestamp)
+
+    def mark(self, stage):
+        if not self.enabled:
+            return
+
+        if stage == "receive":
+            self._last_mark = self._sample_start
+        if self._last_mark is None:
+            return
+
+        now = time.perf_counter()
+        self.buffers[stage].add(now - self._last_mark)
+        self._last_mark = now
+
+        if stage == "dispatch":
+            self.sample_times.add(now)
+            self._awaiting_paint = True
+        elif stage == "paint":
+            self.total.add(now - self._sample_start)
+            self._last_mark = None
+
+    def mark_paint(self):
+        # Widgets repaint for other reasons too, only the first paint after a
+        # dispatch shows the sample
+        if self._awaiting_paint:
+            self._awaiting_paint = False
+            self.mark("paint")
+
+    def rate(self):
+        times = self.sample_times.filled()
+        if len(times) < 2:
+            return 0.0
+        return (len(times) - 1) / (times.max() - times.min())
+
+    def end_to_end(self):
+        """Median age of a sample when it is painted, from its device timestamp,
+        in seconds. NaN until samples were painted.
+        """
+        device = self.buffers["device"].filled()
+        total = self.total.filled()
+        if len(device) == 0 or len(total) == 0:
+            return np.nan
+        return float(np.median(device) + np.median(total))
+
+    def summary(self, q=(50, 95, 99)):
+        """Percentiles of every stage and the whole pipeline in milliseconds."""
+        stages = {
+            stage: [v * 1000 for v in buffer.percentiles(q)]
+            for stage, buffer in self.buffers.items()
+        }
+        stages["total"] = [v * 1000 for v in self.total.percentiles(q)]
+        return {"percentiles": list(q), "stages": stages, "rate_hz": self.rate()}
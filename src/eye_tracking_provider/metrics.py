@@ -0,0 +1,133 @@
+import bisect
+import math
+import os
+import time
+from contextlib import contextmanager
+
+
+class Counter:
+    __slots__ = ["value"]
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Gauge(Counter):
+    __slots__ = []
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    __slots__ = ["buckets", "counts", "sum", "count"]
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + [math.inf], self.counts):
+            cumulative += count
+            le = "+Inf" if bound == math.inf else repr(float(bound))
+            yield f"{name}_bucket", labels + (("le", le),), cumulative
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, self.count
+
+
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0]
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms exported in the Prometheus text format.
+
+    Metrics are created once, usually when the owning object is constructed,
+    and the returned object is kept and updated directly. Updates are a plain
+    attribute increment (a bisect for histograms) without locking, readers of
+    the exposition may see a sample that is updated concurrently.
+    """
+
+    def __init__(self):
+        self._families = {}
+
+    def _get(self, kind, name, help, labels, factory):
+        family = self._families.setdefault(name, (kind, help, {}))
+        if family[0] != kind:
+            raise ValueError(f"Metric '{name}' is already registered as {family[0]}")
+
+        key = tuple(sorted(labels.items()))
+        metrics = family[2]
+        if key not in metrics:
+            metrics[key] = factory()
+        return metrics[key]
+
+    def counter(self, name, help, **labels):
+        return self._get("counter", name, help, labels, Counter)
+
+    def gauge(self, name, help, **labels):
+        return self._get("gauge", name, help, labels, Gauge)
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, **labels):
+        return self._get("histogram", name, help, labels, lambda: Histogram(buckets))
+
+    def exposition(self):
+        lines = []
+        for name, (kind, help, metrics) in sorted(self._families.items()):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in list(metrics.items()):
+                for sample_name, sample_labels, value in metric.samples(name, labels):
+                    sample_labels = _format_labels(sample_labels)
+                    lines.append(f"{sample_name}{sample_labels} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        # Replaced atomically, so collectors never read a partial file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.exposition())
+        os.replace(tmp_path, path)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+REGISTRY = MetricsRegistry()
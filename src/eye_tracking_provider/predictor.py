@@ -0,0 +1,281 @@
+import json
+import time
+
+import numpy as np
+
+
+PREDICTOR_FILE = "predictor.npz"
+FORMAT_VERSION = 1
+
+
+class Predictor:
+    """Base class for calibration models stored in the predictor file.
+
+    Subclasses map uncorrected to corrected screen coordinates and define which
+    arrays describe the model.
+    """
+
+    model_type = None
+
+    def __init__(self, screen_size=None, device_serial=None, fit_stats=None):
+        self.screen_size = screen_size
+        self.device_serial = device_serial
+        self.fit_stats = fit_stats or {}
+
+    def predict(self, points):
+        raise NotImplementedError
+
+    def predict_point(self, point):
+        x, y = self.predict([point])[0]
+        return x, y
+
+    def _model_arrays(self):
+        raise NotImplementedError
+
+    def save(self, path=PREDICTOR_FILE):
+        """Writes the model and its metadata to an uncompressed npz file.
+
+        An npz file is a zip archive, which numpy does not memory-map, so the
+        arrays are read into memory when loaded. They are a few kilobytes even
+        for spline models, and being uncompressed, loading them is a plain read
+        without inflating.
+        """
+        screen_size = self.screen_size if self.screen_size is not None else (0, 0)
+        np.savez(
+            path,
+            format_version=np.array(FORMAT_VERSION),
+            model=np.array(self.model_type),
+            screen_size=np.array(screen_size, dtype=np.int64),
+            device_serial=np.array(self.device_serial or ""),
+            fit_stats=np.array(json.dumps(self.fit_stats)),
+            **self._model_arrays(),
+        )
+
+
+class PolynomialPredictor(Predictor):
+    """Polynomial mapping from uncorrected to corrected screen coordinates.
+
+    Evaluates the same model as sklearn's PolynomialFeatures + LinearRegression
+    pipeline, but only needs numpy, so loading a calibration does not pull in
+    scikit-learn.
+    """
+
+    model_type = "polynomial"
+
+    def __init__(self, powers, coefficients, intercept, **kwargs):
+        super().__init__(**kwargs)
+        self.powers = np.asarray(powers, dtype=np.int64)
+        self.coefficients = np.asarray(coefficients, dtype=np.float64)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+
+    @property
+    def degree(self):
+        return int(self.powers.sum(axis=1).max())
+
+    @classmethod
+    def from_sklearn(cls, pipeline, **kwargs):
+        poly = pipeline.named_steps["poly"]
+        linear = pipeline.named_steps["linear"]
+        return cls(poly.powers_, linear.coef_, linear.intercept_, **kwargs)
+
+    def features(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return np.prod(points[:, None, :] ** self.powers[None, :, :], axis=2)
+
+    def predict(self, points):
+        return self.features(points) @ self.coefficients.T + self.intercept
+
+    def _model_arrays(self):
+        return {
+            "powers": self.powers,
+            "coefficients": self.coefficients,
+            "intercept": self.intercept,
+        }
+
+    @classmethod
+    def _from_arrays(cls, data, **kwargs):
+        return cls(data["powers"], data["coefficients"], data["intercept"], **kwargs)
+
+
+class ThinPlateSplinePredictor(Predictor):
+    """Thin-plate spline with an affine part.
+
+    Inputs are divided by `scale` before evaluating the spline and outputs are
+    multiplied by it, which keeps the kernel well conditioned for pixel
+    coordinates.
+    """
+
+    model_type = "thin_plate_spline"
+
+    def __init__(self, centers, weights, affine, scale, **kwargs):
+        super().__init__(**kwargs)
+        self.centers = np.asarray(centers, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.affine = np.asarray(affine, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+
+    def predict(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2) / self.scale
+        kernel = thin_plate_kernel(points, self.centers)
+        affine = points @ self.affine[1:] + self.affine[0]
+        return (kernel @ self.weights + affine) * self.scale
+
+    def _model_arrays(self):
+        return {
+            "centers": self.centers,
+            "weights": self.weights,
+            "affine": self.affine,
+            "scale": self.scale,
+        }
+
+    @classmethod
+    def _from_arrays(cls, data, **kwargs):
+        return cls(
+            data["centers"], data["weights"], data["affine"], data["scale"], **kwargs
+        )
+
+
+def thin_plate_kernel(points, centers):
+    r2 = np.sum((points[:, None, :] - centers[None, :, :]) ** 2, axis=2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kernel = 0.5 * r2 * np.log(r2)
+    kernel[r2 == 0] = 0.0
+    return kernel
+
+
+_predictor_types = {
+    cls.model_type: cls for cls in [PolynomialPredictor, ThinPlateSplinePredictor]
+}
+
+
+def load_predictor(path=PREDICTOR_FILE):
+    with np.load(path, allow_pickle=False) as data:
+        version = int(data["format_version"])
+        if version > FORMAT_VERSION:
+            raise ValueError(
+                f"{path} has format version {version}, "
+                f"only versions up to {FORMAT_VERSION} are supported"
+            )
+
+        model = str(data["model"])
+        if model not in _predictor_types:
+            raise ValueError(f"{path} contains unknown model type '{model}'")
+
+        screen_size = tuple(int(v) for v in data["screen_size"])
+        return _predictor_types[model]._from_arrays(
+            data,
+            screen_size=screen_size if screen_size != (0, 0) else None,
+            device_serial=str(data["device_serial"]) or None,
+            fit_stats=json.loads(str(data["fit_stats"])),
+        )
+
+
+class CorrectionGrid:
+    """A predictor baked into a dense displacement grid over the screen.
+
+    The correction is sampled at the grid nodes once, after which each sample
+    only costs a bilinear lookup. The grid extends past the screen by `margin`
+    (as a fraction of the screen size) so gaze slightly off-screen, e.g. on the
+    edge menus, is still corrected. Beyond that the border displacement is used.
+    """
+
+    def __init__(self, predictor, screen_size, resolution=(64, 36), margin=0.25):
+        self.resolution = tuple(resolution)
+        n_cols, n_rows = self.resolution
+        width, height = screen_size
+
+        self.origin = np.array([-margin * width, -margin * height])
+        extent = np.array([width, height]) * (1 + 2 * margin)
+        self.cell_size = extent / (np.array([n_cols, n_rows]) - 1)
+
+        xs = self.origin[0] + np.arange(n_cols) * self.cell_size[0]
+        ys = self.origin[1] + np.arange(n_rows) * self.cell_size[1]
+        grid_x, grid_y = np.meshgrid(xs, ys)
+        nodes = np.stack([grid_x.ravel(), grid_y.ravel()], axis=1)
+
+        displacement = predictor.predict(nodes) - nodes
+        self.displacement = displacement.reshape(n_rows, n_cols, 2)
+        self.screen_size = screen_size
+        self.fit_stats = predictor.fit_stats
+
+        # Plain python copies for the per-sample path, indexing numpy arrays
+        # with scalars is slower than the whole interpolation on floats.
+        self._rows = self.displacement.tolist()
+        self._origin = self.origin.tolist()
+        self._cell_size = self.cell_size.tolist()
+
+    @property
+    def nbytes(self):
+        return self.displacement.nbytes
+
+    def predict(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        n_cols, n_rows = self.resolution
+
+        cell = (points - self.origin) / self.cell_size
+        cell[:, 0] = np.clip(cell[:, 0], 0, n_cols - 1)
+        cell[:, 1] = np.clip(cell[:, 1], 0, n_rows - 1)
+
+        col = np.minimum(cell[:, 0].astype(np.int64), n_cols - 2)
+        row = np.minimum(cell[:, 1].astype(np.int64), n_rows - 2)
+        fx = (cell[:, 0] - col)[:, None]
+        fy = (cell[:, 1] - row)[:, None]
+
+        d = self.displacement
+        top = d[row, col] * (1 - fx) + d[row, col + 1] * fx
+        bottom = d[row + 1, col] * (1 - fx) + d[row + 1, col + 1] * fx
+
+        return points + top * (1 - fy) + bottom * fy
+
+    def predict_point(self, point):
+        n_cols, n_rows = self.resolution
+        x, y = point
+
+        u = min(max((x - self._origin[0]) / self._cell_size[0], 0.0), n_cols - 1)
+        v = min(max((y - self._origin[1]) / self._cell_size[1], 0.0), n_rows - 1)
+        col = min(int(u), n_cols - 2)
+        row = min(int(v), n_rows - 2)
+        fx = u - col
+        fy = v - row
+
+        top_row = self._rows[row]
+        bottom_row = self._rows[row + 1]
+        (tl_x, tl_y), (tr_x, tr_y) = top_row[col], top_row[col + 1]
+        (bl_x, bl_y), (br_x, br_y) = bottom_row[col], bottom_row[col + 1]
+
+        top_x = tl_x + (tr_x - tl_x) * fx
+        top_y = tl_y + (tr_y - tl_y) * fx
+        bottom_x = bl_x + (br_x - bl_x) * fx
+        bottom_y = bl_y + (br_y - bl_y) * fx
+
+        return (
+            x + top_x + (bottom_x - top_x) * fy,
+            y + top_y + (bottom_y - top_y) * fy,
+        )
+
+    def report(self, predictor, n_points=10000, n_timing_calls=2000):
+        """Compare the grid against direct evaluation of `predictor`.
+
+        Errors are measured on random on-screen points, timings are for
+        single-sample calls as they happen in the gaze pipeline.
+        """
+        rng = np.random.default_rng(0)
+        points = rng.uniform((0, 0), self.screen_size, size=(n_points, 2))
+        errors = np.linalg.norm(self.predict(points) - predictor.predict(points), axis=1)
+
+        timing_points = [tuple(p) for p in points[:n_timing_calls].tolist()]
+
+        def time_per_call(predict_point):
+            start = time.perf_counter()
+            for point in timing_points:
+                predict_point(point)
+            return (time.perf_counter() - start) / len(timing_points)
+
+        return {
+            "resolution": self.resolution,
+            "memory_bytes": self.nbytes,
+            "mean_error_px": float(errors.mean()),
+            "max_error_px": float(errors.max()),
+            "grid_us_per_sample": time_per_call(self.predict_point) * 1e6,
+            "direct_us_per_sample": time_per_call(predictor.predict_point) * 1e6,
+        }
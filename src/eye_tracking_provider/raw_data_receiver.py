@@ -1,29 +1,97 @@
+import math
 import sys
+import threading
+import time
 from collections import namedtuple
 
 from pupil_labs.realtime_api.simple import discover_one_device, Device
 from pupil_labs.realtime_api import EyestateGazeData, GazeData
 
+from .connection_supervisor import StreamHealth
+from .device_cache import DeviceCache, is_reachable, same_scene_calibration
+from .gaze_filter import MovingAverageFilter
+from .imu_fusion import SurfacePosePredictor
+from .latency import LatencyMonitor
+from .metrics import REGISTRY
+
+SCENE_FRAME_RATE = 30
+# Devices without IMU data by then are not asked for it again
+IMU_TIMEOUT = 2.0
+
 RawETData = namedtuple("RawETData", ["timestamp", "raw_gaze", "scene", "eyes"])
 
 
 class RawDataReceiver:
     def __init__(self):
         self.device = None
+        self.device_cache = DeviceCache()
+        self.latency = LatencyMonitor()
+        self.health = StreamHealth()
+        self.surface_pose_predictor = SurfacePosePredictor()
+        self._imu_available = None
+        self._imu_requested_at = None
 
-        self._gaze_history = []
-        self.smoothing_window_size = 5
+        self._scene_calibration = None
+        self._updated_calibration = None
+
+        self._last_scene_timestamp = None
+        self._frames_received = REGISTRY.counter(
+            "gaze_control_scene_frames_received_total",
+            "Scene frames with matched gaze received from the device.",
+        )
+        self._frames_dropped = REGISTRY.counter(
+            "gaze_control_scene_frames_dropped_total",
+            "Scene frames that were never received, estimated from timestamp gaps.",
+        )
+        self._receive_timeouts = REGISTRY.counter(
+            "gaze_control_receive_timeouts_total",
+            "Polls without new data from the device.",
+        )
+        self._sample_age = REGISTRY.histogram(
+            "gaze_control_sample_age_seconds",
+            "Age of samples on arrival, measured against the device clock.",
+            buckets=[0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0],
+        )
+        self._connected = REGISTRY.gauge(
+            "gaze_control_device_connected", "Whether a device is connected."
+        )
+        self._connect_time = REGISTRY.histogram(
+            "gaze_control_connect_seconds",
+            "Time to connect to the device until streaming can start.",
+            buckets=[0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0],
+        )
+
+        self.gaze_filter = MovingAverageFilter(5)
 
     @property
     def scene_calibration(self):
-        return self.device.get_calibration()
+        if self._scene_calibration is None:
+            self._scene_calibration = self.device.get_calibration()
+        return self._scene_calibration
 
-    def _smooth_gaze(self, gaze: EyestateGazeData):
-        self._gaze_history.append(gaze)
-        if len(self._gaze_history) > self.smoothing_window_size:
-            self._gaze_history.pop(0)
-        gaze_avg = (sum(x) / len(x) for x in zip(*self._gaze_history))
-        return EyestateGazeData(*gaze_avg)
+    def _set_scene_calibration(self, calibration):
+        self._scene_calibration = calibration
+
+    @property
+    def device_serial(self):
+        if self.device is None:
+            return None
+
+        return self.device.module_serial
+
+    def set_gaze_filter(self, gaze_filter):
+        """Filters the gaze position of the following samples with `gaze_filter`."""
+        self.gaze_filter = gaze_filter
+
+    def _filter_gaze(self, gaze):
+        # Only the position is filtered, eye state and timestamps are kept as
+        # they were measured
+        if not (math.isfinite(gaze.x) and math.isfinite(gaze.y)):
+            self.gaze_filter.reset()
+            return gaze
+
+        x, y = self.gaze_filter.filter(gaze.x, gaze.y, gaze.timestamp_unix_seconds)
+        return gaze._replace(x=x, y=y)
 
     def connect(self, auto_discover=False, ip=None, port=None):
         assert auto_discover or (ip is not None and port is not None)
@@ -31,7 +99,16 @@ class RawDataReceiver:
         if self.device is not None:
             self.device.close()
 
+        start_time = time.perf_counter()
         try:
+            if auto_discover:
+                # The device is usually still where it was last time, which is
+                # much faster to check than discovering it again
+                address = self.device_cache.last_address()
+                if address is not None and is_reachable(*address):
+                    ip, port = address
+                    auto_discover = False
+
             if auto_discover:
                 print("Connecting to device...")
                 self.device = discover_one_device()
@@ -40,37 +117,162 @@ class RawDataReceiver:
                 print(f"Connecting to device at {ip}:{port}...")
                 self.device = Device(ip, port)
                 print("\rdone")
+
+            self._load_scene_calibration()
         except Exception as exc:
             print(exc, file=sys.stderr)
+            if self.device is not None:
+                self.device.close()
             self.device = None
 
+        self._last_scene_timestamp = None
+        self.surface_pose_predictor.reset()
+        self._imu_available = None
+        self._imu_requested_at = None
+        self._connected.set(0 if self.device is None else 1)
+
         if self.device is None:
             return None
         else:
+            self.health.reset()
+            self._connect_time.observe(time.perf_counter() - start_time)
+            self.device_cache.update(
+                self.device.module_serial,
+                address=(self.device.phone_ip, self.device.port),
+            )
             return self.device.phone_ip, self.device.port
 
+    def _load_scene_calibration(self):
+        """Uses the cached calibration of the device, or downloads it.
+
+        A cached calibration is validated against the device in the background,
+        if it changed the new one is applied by `receive`.
+        """
+        serial = self.device.module_serial
+        self._updated_calibration = None
+        self._scene_calibration = self.device_cache.scene_calibration(serial)
+
+        if self._scene_calibration is None:
+            self._scene_calibration = self.device.get_calibration()
+            self.device_cache.update(serial, self._scene_calibration)
+            return
+
+        threading.Thread(
+            target=self._validate_cached_calibration,
+            args=(self.device, serial, self._scene_calibration),
+            name="CalibrationValidation",
+            daemon=True,
+        ).start()
+
+    def _validate_cached_calibration(self, device, serial, cached):
+        try:
+            calibration = device.get_calibration()
+        except Exception as exc:
+            print(f"Could not validate the cached calibration: {exc}", file=sys.stderr)
+            return
+
+        if same_scene_calibration(calibration, cached):
+            return
+
+        print("The cached scene camera calibration is outdated, updating it")
+        self.device_cache.update(serial, calibration)
+        if device is self.device:
+            self._updated_calibration = calibration
+
     def receive(self):
         if self.device is None:
             return None
 
+        updated_calibration = self._updated_calibration
+        if updated_calibration is not None:
+            self._updated_calibration = None
+            self._set_scene_calibration(updated_calibration)
+
+        self.latency.start_sample()
         scene_and_gaze = self.device.receive_matched_scene_video_frame_and_gaze(
             timeout_seconds=1 / 15
         )
         if scene_and_gaze is None:
+            self._receive_timeouts.inc()
             return None
 
         eyes = self.device.receive_eyes_video_frame(timeout_seconds=1 / 15)
         if eyes is None:
+            self._receive_timeouts.inc()
             return None
 
         (
             scene,
             gaze,
         ) = scene_and_gaze
+        if self.surface_pose_predictor.enabled:
+            gaze = self._receive_latest_gaze(gaze)
+
         timestamp = gaze.timestamp_unix_seconds
-        gaze = self._smooth_gaze(gaze)
+        self.latency.record_device_timestamp(timestamp)
+        self._count_frames(scene.timestamp_unix_seconds, timestamp)
+        gaze = self._filter_gaze(gaze)
+        self.latency.mark("receive")
         return RawETData(timestamp, gaze, scene, eyes)
 
+    def _receive_latest_gaze(self, matched_gaze):
+        """The newest gaze, which arrives earlier than the scene frames. It is
+        mapped with the surface predicted from the IMU, see
+        `SurfacePosePredictor`.
+        """
+        predictor = self.surface_pose_predictor
+        if self._imu_available is not False:
+            now = time.monotonic()
+            if self._imu_requested_at is None:
+                self._imu_requested_at = now
+
+            # The device connection only keeps the newest IMU datum, so the
+            # ~110 Hz gyro stream is decimated to the poll rate. Reading all of
+            # it would need a second, async connection. Head turns are smooth
+            # enough at the poll rate, and the predictor integrates between the
+            # timestamps of the kept data instead of assuming a fixed rate.
+            imu = self.device.receive_imu_datum(timeout_seconds=0)
+            if imu is not None:
+                self._imu_available = True
+                predictor.add_imu(imu.timestamp_unix_seconds, imu.gyro_data)
+            elif self._imu_available is None and (
+                now - self._imu_requested_at > IMU_TIMEOUT
+            ):
+                print("The device sends no IMU data, head motion is not predicted")
+                self._imu_available = False
+                self.device.streaming_stop("imu")
+
+        if not predictor.has_imu:
+            return matched_gaze
+
+        gaze = self.device.receive_gaze_datum(timeout_seconds=0)
+        if gaze is None or (
+            gaze.timestamp_unix_seconds <= matched_gaze.timestamp_unix_seconds
+        ):
+            return matched_gaze
+        return gaze
+
+    def _count_frames(self, scene_timestamp, gaze_timestamp):
+        self._frames_received.inc()
+        self.health.add_frame()
+        self._sample_age.observe(time.time() - gaze_timestamp)
+
+        # Only the latest frame is kept by the device connection, frames that
+        # arrive between two polls are skipped
+        if self._last_scene_timestamp is not None:
+            gap = scene_timestamp - self._last_scene_timestamp
+            missed = round(gap * SCENE_FRAME_RATE) - 1
+            if missed > 0:
+                self._frames_dropped.inc(missed)
+        self._last_scene_timestamp = scene_timestamp
+
+    def detach_device(self):
+        """Stops using the device and returns it, for the caller to close it."""
+        device = self.device
+        self.device = None
+        self._connected.set(0)
+        return device
+
     def close(self):
         if self.device is not None:
             self.device.close()
@@ -0,0 +1,329 @@
+import glob
+import json
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from .metrics import REGISTRY
+
+
+RECORDINGS_DIR = "recordings"
+VIDEO_FILE = "scene.mp4"
+METADATA_FILE = "metadata.json"
+CALIBRATION_FILE = "scene_calibration.npy"
+
+
+class _VideoEncoder:
+    """Encodes frames on a background thread.
+
+    The queue is bounded, when the encoder falls behind new frames are dropped
+    instead of blocking the caller.
+    """
+
+    def __init__(self, path, fps, queue_size):
+        self.path = path
+        self.fps = fps
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.n_frames = 0
+        self.n_dropped = 0
+        self.writer = None
+        self.thread = threading.Thread(
+            target=self._run, name="RecorderVideo", daemon=True
+        )
+        self.thread.start()
+
+    def add_frame(self, pixels):
+        """Returns the index of the frame in the video, or -1 if it was dropped."""
+        try:
+            self.queue.put_nowait(pixels)
+        except queue.Full:
+            self.n_dropped += 1
+            return -1
+
+        index = self.n_frames
+        self.n_frames += 1
+        return index
+
+    def _run(self):
+        while True:
+            pixels = self.queue.get()
+            if pixels is None:
+                break
+
+            if self.writer is None:
+                height, width = pixels.shape[:2]
+                fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+                self.writer = cv2.VideoWriter(
+                    self.path, fourcc, self.fps, (width, height)
+                )
+            self.writer.write(pixels)
+
+        if self.writer is not None:
+            self.writer.release()
+
+    def close(self):
+        # Blocks until the frames that were queued are encoded
+        self.queue.put(None)
+        self.thread.join()
+
+
+class _LogChunk:
+    """Preallocated columns for `size` samples."""
+
+    def __init__(self, size):
+        self.n_rows = 0
+        self.columns = {
+            "timestamp": np.full(size, np.nan),
+            "scene_timestamp": np.full(size, np.nan),
+            "raw_gaze": np.full((size, 2), np.nan, dtype=np.float32),
+            "worn": np.zeros(size, dtype=bool),
+            "gaze": np.full((size, 2), np.nan, dtype=np.float32),
+            "uncorrected_gaze": np.full((size, 2), np.nan, dtype=np.float32),
+            "dwell_process": np.zeros(size, dtype=np.float32),
+            "homography": np.full((size, 3, 3), np.nan, dtype=np.float32),
+            "frame_index": np.full(size, -1, dtype=np.int32),
+            "marker_count": np.zeros(size, dtype=np.int16),
+        }
+        self.marker_uids = []
+        self.marker_corners = []
+
+    @property
+    def full(self):
+        return self.n_rows == len(self.columns["timestamp"])
+
+    def arrays(self):
+        n = self.n_rows
+        arrays = {name: column[:n] for name, column in self.columns.items()}
+        arrays["marker_uid"] = np.array(self.marker_uids, dtype=np.int32)
+        arrays["marker_corners"] = np.array(
+            self.marker_corners, dtype=np.float32
+        ).reshape(-1, 4, 2)
+        return arrays
+
+
+class SessionRecorder:
+    """Records scene video, gaze and events of a session for offline analysis.
+
+    A recording is a directory with the scene video, the scene camera
+    calibration, a metadata file and the sample log. The log is columnar: one
+    row per sample with the raw, uncorrected and mapped gaze, dwell progress,
+    the surface homography and the index of the scene frame in the video.
+    Marker detections are stored as a flat table, `marker_count` tells how many
+    belong to each sample. Events, e.g. clicks or triggered actions, are a
+    separate table. They are timestamped on the clock of the samples, using the
+    offset between it and the local clock at the latest sample, and also keep
+    their local time. Samples are collected in chunks which are compressed and
+    written by a background thread.
+
+    Nothing that is called per sample blocks: frames go through the bounded
+    queue of the video encoder and are dropped (and counted) when it cannot
+    keep up.
+    """
+
+    def __init__(self, chunk_size=1024, video_queue_size=30, fps=30):
+        self.chunk_size = chunk_size
+        self.video_queue_size = video_queue_size
+        self.fps = fps
+
+        self.directory = None
+        self.recording = False
+        self._encoder = None
+        self._chunk = None
+        self._n_chunks = 0
+        self._events = []
+        self._clock_offset = None
+        self._log_queue = None
+        self._log_thread = None
+
+        self._dropped_frames = REGISTRY.counter(
+            "gaze_control_recorder_dropped_frames_total",
+            "Scene frames the recorder dropped because the encoder fell behind.",
+        )
+
+    @property
+    def n_frames(self):
+        return 0 if self._encoder is None else self._encoder.n_frames
+
+    @property
+    def n_dropped_frames(self):
+        return 0 if self._encoder is None else self._encoder.n_dropped
+
+    def start(self, directory=None, metadata=None, scene_calibration=None):
+        if self.recording:
+            self.stop()
+
+        if directory is None:
+            directory = os.path.join(RECORDINGS_DIR, time.strftime("%Y%m%d-%H%M%S"))
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+        metadata = dict(metadata or {})
+        metadata["start_time"] = time.time()
+        with open(os.path.join(directory, METADATA_FILE), "w") as f:
+            json.dump(metadata, f, indent=4)
+
+        if scene_calibration is not None:
+            np.save(os.path.join(directory, CALIBRATION_FILE), scene_calibration)
+
+        self._encoder = _VideoEncoder(
+            os.path.join(directory, VIDEO_FILE), self.fps, self.video_queue_size
+        )
+        self._chunk = _LogChunk(self.chunk_size)
+        self._n_chunks = 0
+        self._events = []
+        self._clock_offset = None
+        self._log_queue = queue.Queue()
+        self._log_thread = threading.Thread(
+            target=self._write_log, name="RecorderLog", daemon=True
+        )
+        self._log_thread.start()
+        self.recording = True
+
+        print(f"Recording to {directory}")
+        return directory
+
+    def add_sample(self, eye_tracking_data):
+        if not self.recording:
+            return
+
+        self._clock_offset = eye_tracking_data.timestamp - time.time()
+
+        chunk = self._chunk
+        row = chunk.n_rows
+        columns = chunk.columns
+
+        columns["timestamp"][row] = eye_tracking_data.timestamp
+        columns["scene_timestamp"][row] = getattr(
+            eye_tracking_data.scene, "timestamp_unix_seconds", np.nan
+        )
+        raw_gaze = eye_tracking_data.raw_gaze
+        if raw_gaze is not None:
+            columns["raw_gaze"][row] = raw_gaze.x, raw_gaze.y
+            columns["worn"][row] = raw_gaze.worn
+        if eye_tracking_data.gaze is not None:
+            columns["gaze"][row] = eye_tracking_data.gaze
+        if eye_tracking_data.uncorrected_gaze is not None:
+            columns["uncorrected_gaze"][row] = eye_tracking_data.uncorrected_gaze
+        columns["dwell_process"][row] = eye_tracking_data.dwell_process
+        if eye_tracking_data.surf_to_img_trans is not None:
+            columns["homography"][row] = eye_tracking_data.surf_to_img_trans
+
+        markers = eye_tracking_data.markers or []
+        for marker in markers:
+            chunk.marker_uids.append(marker.uid)
+            chunk.marker_corners.append(list(marker.as_dict()["vertices"].values()))
+        columns["marker_count"][row] = len(markers)
+
+        frame_index = self._encoder.add_frame(eye_tracking_data.scene.bgr_pixels)
+        if frame_index < 0:
+            self._dropped_frames.inc()
+        columns["frame_index"][row] = frame_index
+
+        chunk.n_rows += 1
+        if chunk.full:
+            self._flush_chunk()
+
+    def add_event(self, name, detail=""):
+        """Records something that happened, e.g. a click or a triggered action.
+
+        Events before the first sample have no timestamp on the sample clock.
+        """
+        if self.recording:
+            local_time = time.time()
+            if self._clock_offset is None:
+                timestamp = np.nan
+            else:
+                timestamp = local_time + self._clock_offset
+            self._events.append((timestamp, local_time, name, str(detail)))
+
+    def _flush_chunk(self):
+        if self._chunk.n_rows > 0:
+            path = os.path.join(self.directory, f"log_{self._n_chunks:05d}.npz")
+            self._log_queue.put((path, self._chunk.arrays()))
+            self._n_chunks += 1
+        self._chunk = _LogChunk(self.chunk_size)
+
+    def _write_log(self):
+        while True:
+            item = self._log_queue.get()
+            if item is None:
+                break
+
+            path, arrays = item
+            np.savez_compressed(path, **arrays)
+
+    def stop(self):
+        if not self.recording:
+            return
+
+        self.recording = False
+        self._flush_chunk()
+
+        if self._events:
+            timestamps, local_timestamps, names, details = zip(*self._events)
+        else:
+            timestamps, local_timestamps, names, details = [], [], [], []
+        self._log_queue.put(
+            (
+                os.path.join(self.directory, "events.npz"),
+                {
+                    "timestamp": np.array(timestamps, dtype=np.float64),
+                    "local_timestamp": np.array(local_timestamps, dtype=np.float64),
+                    "name": np.array(names, dtype=str),
+                    "detail": np.array(details, dtype=str),
+                },
+            )
+        )
+
+        self._log_queue.put(None)
+        self._encoder.close()
+        self._log_thread.join()
+
+        print(
+            f"Recording stopped, {self._encoder.n_frames} frames written, "
+            f"{self._encoder.n_dropped} dropped"
+        )
+
+
+def load_recording(directory):
+    """Loads the sample log, events and metadata of a recording.
+
+    Returns a dict with the concatenated sample columns, `marker_offsets` to
+    find the markers of sample `i` at `marker_uid[offsets[i]:offsets[i + 1]]`,
+    the `events` table, the `metadata` and the `scene_calibration` (or None).
+    """
+    chunks = []
+    for path in sorted(glob.glob(os.path.join(directory, "log_*.npz"))):
+        with np.load(path, allow_pickle=False) as data:
+            chunks.append({name: data[name] for name in data.files})
+
+    if not chunks:
+        raise ValueError(f"{directory} contains no samples")
+
+    recording = {
+        name: np.concatenate([chunk[name] for chunk in chunks])
+        for name in chunks[0]
+    }
+    recording["marker_offsets"] = np.concatenate(
+        [[0], np.cumsum(recording["marker_count"], dtype=np.int64)]
+    )
+
+    events_path = os.path.join(directory, "events.npz")
+    if os.path.exists(events_path):
+        with np.load(events_path, allow_pickle=False) as data:
+            recording["events"] = {name: data[name] for name in data.files}
+
+    with open(os.path.join(directory, METADATA_FILE)) as f:
+        recording["metadata"] = json.load(f)
+
+    calibration_path = os.path.join(directory, CALIBRATION_FILE)
+    recording["scene_calibration"] = (
+        np.load(calibration_path) if os.path.exists(calibration_path) else None
+    )
+    recording["video_path"] = os.path.join(directory, VIDEO_FILE)
+
+    return recording
@@ -0,0 +1,145 @@
+import time
+from enum import Enum, auto
+
+import cv2
+import numpy as np
+from pupil_labs.realtime_api import GazeData
+from pupil_labs.realtime_api.simple.models import SimpleVideoFrame
+
+from .raw_data_receiver import RawDataReceiver, RawETData
+
+
+class ReplayPacing(Enum):
+    REAL_TIME = auto()
+    AS_FAST_AS_POSSIBLE = auto()
+
+
+class ReplayDataReceiver(RawDataReceiver):
+    """Plays a recorded session back in place of a device connection.
+
+    With `REAL_TIME` pacing samples become available at the rate they were
+    recorded. Like the device connection only the latest sample is returned,
+    samples that became due between two calls are skipped and `receive`
+    returns None until the next one is due, it never sleeps. With
+    `AS_FAST_AS_POSSIBLE` every call returns the next sample, which makes
+    runs deterministic and allows measuring the maximum throughput.
+
+    Samples whose scene frame was dropped by the recorder are skipped. The
+    recorded gaze is already smoothed and is not smoothed again.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.recording = None
+        self.pacing = ReplayPacing.REAL_TIME
+        self.loop = False
+        self.n_replayed = 0
+
+        self._capture = None
+        self._samples = None
+        self._next = 0
+        self._frame_index = -1
+        self._frame = None
+        self._clock_start = None
+
+    def open(self, recording, pacing=ReplayPacing.REAL_TIME, loop=False):
+        """Starts replaying `recording`, as returned by `load_recording`."""
+        if recording["scene_calibration"] is None:
+            raise ValueError("The recording contains no scene camera calibration")
+
+        self.recording = recording
+        self.pacing = pacing
+        self.loop = loop
+        # Only samples with a scene frame in the video can be mapped again
+        self._samples = np.flatnonzero(recording["frame_index"] >= 0)
+        self._rewind()
+
+    def _rewind(self):
+        if self._capture is not None:
+            self._capture.release()
+        self._capture = cv2.VideoCapture(self.recording["video_path"])
+        self._next = 0
+        self._frame_index = -1
+        self._frame = None
+        self._clock_start = None
+
+    @property
+    def finished(self):
+        return self.recording is not None and self._next >= len(self._samples)
+
+    @property
+    def scene_calibration(self):
+        return self.recording["scene_calibration"]
+
+    @property
+    def device_serial(self):
+        if self.recording is None:
+            return None
+
+        return self.recording["metadata"].get("device_serial")
+
+    def connect(self, auto_discover=False, ip=None, port=None):
+        if self.recording is None:
+            return None
+
+        return "replay", 0
+
+    def _due_sample(self):
+        timestamps = self.recording["timestamp"]
+        first = timestamps[self._samples[0]]
+        if self._clock_start is None:
+            self._clock_start = time.monotonic() - (
+                timestamps[self._samples[self._next]] - first
+            )
+
+        elapsed = first + time.monotonic() - self._clock_start
+        due = np.searchsorted(timestamps[self._samples], elapsed, side="right") - 1
+        return due if due >= self._next else None
+
+    def receive(self):
+        if self.recording is None:
+            return None
+
+        if self.finished:
+            if not self.loop:
+                return None
+            self._rewind()
+
+        self.latency.start_sample()
+
+        if self.pacing == ReplayPacing.REAL_TIME:
+            position = self._due_sample()
+            if position is None:
+                return None
+        else:
+            position = self._next
+        self._next = position + 1
+
+        sample = self._samples[position]
+        frame_index = self.recording["frame_index"][sample]
+        # Frames are decoded in order, skipped ones are only grabbed
+        while self._frame_index < frame_index:
+            if self._frame_index + 1 < frame_index:
+                self._capture.grab()
+            else:
+                ok, self._frame = self._capture.read()
+                if not ok:
+                    self._samples = self._samples[:position]
+                    return None
+            self._frame_index += 1
+
+        recording = self.recording
+        timestamp = float(recording["timestamp"][sample])
+        scene_timestamp = float(recording["scene_timestamp"][sample])
+        x, y = recording["raw_gaze"][sample].tolist()
+        gaze = GazeData(x, y, bool(recording["worn"][sample]), timestamp)
+        scene = SimpleVideoFrame(self._frame, scene_timestamp)
+
+        self.latency.mark("receive")
+        self.n_replayed += 1
+        return RawETData(timestamp, gaze, scene, None)
+
+    def close(self):
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
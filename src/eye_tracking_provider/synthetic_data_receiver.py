@@ -0,0 +1,440 @@
+import math
+import time
+
+import cv2
+import numpy as np
+from pupil_labs.realtime_api import GazeData
+from pupil_labs.realtime_api.simple.models import SimpleVideoFrame
+from pupil_labs.real_time_screen_gaze import marker_generator
+
+from .device_cache import SCENE_CALIBRATION_DTYPE
+from .raw_data_receiver import RawDataReceiver, RawETData
+from .replay_data_receiver import ReplayPacing
+
+
+class _Segment:
+    __slots__ = [
+        "kind",
+        "n_samples",
+        "done",
+        "start",
+        "end",
+        "offset_start",
+        "offset_end",
+    ]
+
+    def __init__(self, kind, n_samples, start, end, offset_start, offset_end):
+        self.kind = kind
+        self.n_samples = n_samples
+        self.done = 0
+        self.start = start
+        self.end = end
+        self.offset_start = offset_start
+        self.offset_end = offset_end
+
+
+class SyntheticGaze:
+    """Generates a realistic gaze stream in screen coordinates.
+
+    Gaze alternates between fixations with gamma distributed durations and
+    saccades with a minimum-jerk profile, whose duration follows the main
+    sequence. Samples get gaussian noise, a slowly drifting offset (a random
+    walk, like calibration drift from headset slippage), blinks between
+    fixations, during which samples are invalid, and occasional fixations
+    outside of the screen.
+
+    Samples are generated block-wise into preallocated buffers, `next` only
+    reads from them.
+    """
+
+    def __init__(
+        self,
+        screen_size,
+        rate=200.0,
+        seed=None,
+        block_size=1024,
+        noise=4.0,
+        drift=10.0,
+        mean_fixation_duration=0.5,
+        blink_rate=0.3,
+        off_screen_probability=0.05,
+        pixels_per_degree=40.0,
+    ):
+        if not 30 <= rate <= 1000:
+            raise ValueError("rate must be between 30 and 1000 Hz")
+
+        self.screen_size = np.asarray(screen_size, dtype=np.float64)
+        self.rate = rate
+        self.noise = noise
+        self.drift = drift
+        self.mean_fixation_duration = mean_fixation_duration
+        self.blink_rate = blink_rate
+        self.off_screen_probability = off_screen_probability
+        self.pixels_per_degree = pixels_per_degree
+        self.rng = np.random.default_rng(seed)
+
+        self.block_size = block_size
+        self.timestamps = np.empty(block_size)
+        self.points = np.empty((block_size, 2))
+        self.valid = np.empty(block_size, dtype=bool)
+        self._noise = np.empty((block_size, 2))
+        self._progress = np.empty(block_size)
+        self._profile = np.empty(block_size)
+        self._sample_offsets = np.arange(block_size) / rate
+
+        self._position = self.screen_size / 2
+        self._offset = np.zeros(2)
+        self._segment = None
+        self._blink_pending = False
+        self._n_generated = 0
+        self._read = block_size
+
+    def next(self):
+        """The next sample as (timestamp, x, y, valid), timestamps start at 0."""
+        if self._read == self.block_size:
+            self._fill()
+
+        i = self._read
+        self._read += 1
+        x, y = self.points[i]
+        return self.timestamps[i], x, y, self.valid[i]
+
+    def skip(self, n):
+        """Drops the next `n` samples."""
+        while n > 0:
+            if self._read == self.block_size:
+                self._fill()
+            step = min(n, self.block_size - self._read)
+            self._read += step
+            n -= step
+
+    def _random_target(self):
+        if self.rng.random() < self.off_screen_probability:
+            # Somewhere in a band around the screen, e.g. looking at the keyboard
+            while True:
+                target = self.rng.uniform(-0.15, 1.15, 2) * self.screen_size
+                if np.any(target < 0) or np.any(target > self.screen_size):
+                    return target
+
+        return self.rng.uniform(0.02, 0.98, 2) * self.screen_size
+
+    def _next_segment(self):
+        previous = self._segment
+        offset = self._offset
+
+        if previous is not None and previous.kind == "fixation":
+            if self._blink_pending:
+                self._blink_pending = False
+                n_samples = round(self.rng.uniform(0.1, 0.25) * self.rate)
+                return _Segment(
+                    "blink",
+                    max(n_samples, 1),
+                    self._position,
+                    self._position,
+                    offset,
+                    offset,
+                )
+
+            target = self._random_target()
+            amplitude = np.linalg.norm(target - self._position) / self.pixels_per_degree
+            duration = 0.021 + 0.0022 * amplitude
+            segment = _Segment(
+                "saccade",
+                max(round(duration * self.rate), 1),
+                self._position,
+                target,
+                offset,
+                offset,
+            )
+            self._position = target
+            return segment
+
+        duration = self.rng.gamma(4.0, self.mean_fixation_duration / 4.0)
+        duration = max(duration, 0.08)
+        self._blink_pending = self.rng.random() < self.blink_rate * duration
+        self._offset = offset + self.rng.normal(0, self.drift * math.sqrt(duration), 2)
+        return _Segment(
+            "fixation",
+            max(round(duration * self.rate), 1),
+            self._position,
+            self._position,
+            offset,
+            self._offset,
+        )
+
+    def _fill(self):
+        i = 0
+        n = self.block_size
+        while i < n:
+            if self._segment is None or self._segment.done == self._segment.n_samples:
+                self._segment = self._next_segment()
+
+            segment = self._segment
+            k = min(n - i, segment.n_samples - segment.done)
+            self._write_segment(segment, i, k)
+            segment.done += k
+            i += k
+
+        np.add(
+            self._sample_offsets,
+            self._n_generated / self.rate,
+            out=self.timestamps,
+        )
+        self.rng.standard_normal(out=self._noise)
+        self._noise *= self.noise
+        self.points += self._noise
+
+        self._n_generated += n
+        self._read = 0
+
+    def _write_segment(self, segment, i, k):
+        progress = self._progress[:k]
+        np.add(np.arange(segment.done, segment.done + k), 1, out=progress)
+        progress /= segment.n_samples
+        points = self.points[i : i + k]
+
+        if segment.kind == "saccade":
+            # Minimum-jerk position profile
+            profile = self._profile[:k]
+            np.multiply(progress, 6, out=profile)
+            profile -= 15
+            profile *= progress
+            profile += 10
+            profile *= progress**3
+        else:
+            profile = progress
+
+        delta = segment.end - segment.start
+        offset_delta = segment.offset_end - segment.offset_start
+        for axis in range(2):
+            np.multiply(profile, delta[axis], out=points[:, axis])
+            points[:, axis] += segment.start[axis] + segment.offset_start[axis]
+            points[:, axis] += progress * offset_delta[axis]
+
+        self.valid[i : i + k] = segment.kind != "blink"
+
+
+def corner_marker_verts(screen_size, marker_size=150):
+    """Marker vertices of the default marker overlay, one marker per corner."""
+    width, height = screen_size
+    border = marker_size / 10
+    verts = []
+    for x, y in [
+        (0, 0),
+        (width - marker_size, 0),
+        (0, height - marker_size),
+        (width - marker_size, height - marker_size),
+    ]:
+        left, top = x + border, y + border
+        right, bottom = x + marker_size - border, y + marker_size - border
+        verts.append([(left, top), (right, top), (left, bottom), (right, bottom)])
+    return verts
+
+
+class SceneRenderer:
+    """Renders scene camera frames showing the screen with its markers.
+
+    The screen is drawn into a preallocated frame through a homography given by
+    the screen pose. The frame is only redrawn when the pose changes.
+    """
+
+    def __init__(self, screen_size, marker_verts, frame_size=(1600, 1200)):
+        self.screen_size = screen_size
+        self.marker_verts = marker_verts
+        width, height = frame_size
+        self.frame = np.empty((height, width, 3), dtype=np.uint8)
+
+        focal_length = 0.55 * width
+        self.camera_matrix = np.array(
+            [[focal_length, 0, width / 2], [0, focal_length, height / 2], [0, 0, 1]]
+        )
+
+        # Marker images as shown by the marker widgets, with their white border
+        self.marker_tiles = []
+        for marker_id in range(len(marker_verts)):
+            tile = np.full((10, 10), 255, dtype=np.uint8)
+            tile[1:9, 1:9] = marker_generator.generate_marker(
+                marker_id, flip_x=True, flip_y=True
+            )
+            self.marker_tiles.append(tile)
+
+        self.set_screen_pose()
+
+    @property
+    def scene_calibration(self):
+        calibration = np.zeros(1, dtype=SCENE_CALIBRATION_DTYPE)
+        calibration["serial"] = b"synth"
+        calibration["scene_camera_matrix"] = self.camera_matrix
+        return calibration
+
+    def set_screen_pose(self, scale=0.6, offset=(0.0, 0.0), rotation=0.0, tilt=0.0):
+        """Places the screen in the scene image.
+
+        `scale` is the width of the screen relative to the frame width,
+        `offset` moves it from the frame center (in pixels), `rotation` rolls
+        it (in degrees) and `tilt` shrinks the top edge relative to the bottom
+        edge, like when looking down at the screen.
+        """
+        frame_height, frame_width = self.frame.shape[:2]
+        screen_width, screen_height = self.screen_size
+        half_width = scale * frame_width / 2
+        half_height = half_width * screen_height / screen_width
+        top = half_width * (1 - tilt)
+
+        corners = np.array(
+            [
+                [-top, -half_height],
+                [top, -half_height],
+                [-half_width, half_height],
+                [half_width, half_height],
+            ]
+        )
+        angle = math.radians(rotation)
+        rotation_matrix = np.array(
+            [[math.cos(angle), -math.sin(angle)], [math.sin(angle), math.cos(angle)]]
+        )
+        corners = corners @ rotation_matrix.T
+        corners += np.array([frame_width / 2, frame_height / 2]) + offset
+
+        screen_corners = np.array(
+            [
+                [0, 0],
+                [screen_width, 0],
+                [0, screen_height],
+                [screen_width, screen_height],
+            ]
+        )
+        self.homography = cv2.getPerspectiveTransform(
+            screen_corners.astype(np.float32), corners.astype(np.float32)
+        )
+        self._homography = self.homography.tolist()
+        self._render(corners)
+
+    def screen_to_scene(self, x, y):
+        (a, b, c), (d, e, f), (g, h, i) = self._homography
+        w = g * x + h * y + i
+        return (a * x + b * y + c) / w, (d * x + e * y + f) / w
+
+    def _render(self, screen_corners):
+        self.frame[:] = 90
+        screen_polygon = screen_corners[[0, 1, 3, 2]].round().astype(np.int32)
+        cv2.fillConvexPoly(self.frame, screen_polygon, (40, 40, 40))
+
+        cell_corners = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=np.float64)
+        for tile, verts in zip(self.marker_tiles, self.marker_verts):
+            # The vertices are the corners of the inner 8x8 cells of the tile
+            tile_to_screen = cv2.getPerspectiveTransform(
+                np.array([[1, 1], [9, 1], [1, 9], [9, 9]], dtype=np.float32),
+                np.array(verts, dtype=np.float32),
+            )
+            tile_to_scene = self.homography @ tile_to_screen
+
+            for row in range(10):
+                for col in range(10):
+                    points = cell_corners + (col, row)
+                    points = cv2.perspectiveTransform(points[None], tile_to_scene)[0]
+                    color = int(tile[row, col])
+                    cv2.fillConvexPoly(
+                        self.frame,
+                        points.round().astype(np.int32),
+                        (color, color, color),
+                    )
+
+
+class SyntheticDataReceiver(RawDataReceiver):
+    """Generates gaze, and optionally scene frames, in place of a device.
+
+    With scene rendering the generated screen gaze is projected into the
+    rendered scene frame and goes through marker detection and mapping like
+    real data. Without it, a preallocated blank frame is used and the screen
+    gaze is passed on directly, which isolates everything after mapping.
+    Pacing works like for `ReplayDataReceiver`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.generator = None
+        self.renderer = None
+        self.pacing = ReplayPacing.AS_FAST_AS_POSSIBLE
+        self.screen_gaze = None
+
+        self._blank_frame = None
+        self._clock_start = None
+        self._time_offset = 0.0
+        self._n_consumed = 0
+
+    def configure(
+        self,
+        screen_size,
+        rate=200.0,
+        render_scene=False,
+        marker_verts=None,
+        pacing=ReplayPacing.AS_FAST_AS_POSSIBLE,
+        seed=None,
+        **gaze_options,
+    ):
+        self.generator = SyntheticGaze(screen_size, rate, seed, **gaze_options)
+        self.pacing = pacing
+        self.renderer = None
+        if render_scene:
+            self.renderer = SceneRenderer(
+                screen_size, marker_verts or corner_marker_verts(screen_size)
+            )
+        else:
+            self._blank_frame = np.zeros((1200, 1600, 3), dtype=np.uint8)
+
+    @property
+    def scene_calibration(self):
+        if self.renderer is not None:
+            return self.renderer.scene_calibration
+
+        calibration = np.zeros(1, dtype=SCENE_CALIBRATION_DTYPE)
+        calibration["scene_camera_matrix"] = np.eye(3)
+        return calibration
+
+    @property
+    def device_serial(self):
+        return "synthetic"
+
+    def connect(self, auto_discover=False, ip=None, port=None):
+        if self.generator is None:
+            return None
+
+        self._clock_start = time.monotonic()
+        self._time_offset = time.time()
+        self._n_consumed = 0
+        return "synthetic", 0
+
+    def receive(self):
+        if self.generator is None or self._clock_start is None:
+            return None
+
+        self.latency.start_sample()
+
+        if self.pacing == ReplayPacing.REAL_TIME:
+            due = int((time.monotonic() - self._clock_start) * self.generator.rate)
+            if due <= self._n_consumed:
+                return None
+            # Like the device connection, only the latest sample is received
+            self.generator.skip(due - self._n_consumed - 1)
+            self._n_consumed = due
+        else:
+            self._n_consumed += 1
+
+        timestamp, x, y, valid = self.generator.next()
+        timestamp += self._time_offset
+        self.screen_gaze = (x, y) if valid else None
+
+        if not valid:
+            scene_x = scene_y = math.nan
+        elif self.renderer is not None:
+            scene_x, scene_y = self.renderer.screen_to_scene(x, y)
+        else:
+            scene_x, scene_y = x, y
+
+        frame = self._blank_frame if self.renderer is None else self.renderer.frame
+        gaze = GazeData(scene_x, scene_y, True, timestamp)
+        scene = SimpleVideoFrame(frame, timestamp)
+
+        self.latency.mark("receive")
+        return RawETData(timestamp, gaze, scene, None)
@@ -0,0 +1,226 @@
+from PySide6.QtCore import *
+from PySide6.QtGui import *
+from PySide6.QtWidgets import *
+
+from eye_tracking_provider import EyeTrackingData, REGISTRY
+from gaze_event_type import GazeEvent, GazeEventType
+
+
+ALL_EVENTS = frozenset(GazeEventType)
+# Side length of the square screen cells targets are indexed by, in pixels
+CELL_SIZE = 128
+LAYOUT_EVENTS = {
+    QEvent.Move,
+    QEvent.Resize,
+    QEvent.Show,
+    QEvent.Hide,
+    QEvent.ParentChange,
+}
+
+
+class _WidgetTarget:
+    def __init__(self, widget, handler, events):
+        self.widget = widget
+        self.handler = handler
+        self.events = events
+        self.rect = QRect()
+
+    def bounds(self):
+        if not self.widget.isVisible():
+            return QRect()
+        self.rect = QRect(self.widget.mapToGlobal(QPoint(0, 0)), self.widget.size())
+        return self.rect
+
+    def owner(self):
+        return self.widget
+
+    def contains(self, point):
+        return self.rect.contains(point)
+
+    def deliver(self, event_type, eye_tracking_data, point):
+        event = GazeEvent(
+            event_type, eye_tracking_data, point, point - self.rect.topLeft()
+        )
+        self.handler(event)
+
+
+class GazeRegion:
+    """A polygon on the screen that receives gaze events, e.g. a screen edge.
+
+    Regions may lie outside of the screen, where gaze can be mapped but there
+    are no widgets. The region is only active while its `owner` widget is
+    visible, if it has one.
+    """
+
+    def __init__(self, polygon, handler, events=ALL_EVENTS, owner=None):
+        self.polygon = polygon
+        self.handler = handler
+        self.events = events
+        self._owner = owner
+
+    def bounds(self):
+        if self.polygon is None or not (
+            self._owner is None or self._owner.isVisible()
+        ):
+            return QRect()
+        return self.polygon.boundingRect().toAlignedRect()
+
+    def owner(self):
+        return self._owner
+
+    def contains(self, point):
+        return self.polygon.containsPoint(QPointF(point), Qt.OddEvenFill)
+
+    def deliver(self, event_type, eye_tracking_data, point):
+        self.handler(GazeEvent(event_type, eye_tracking_data, point, point))
+
+
+class GazeEventRouter(QObject):
+    """Delivers gaze to the widgets under it, like Qt does for the mouse.
+
+    Widgets subscribe with `subscribe` and receive `GazeEvent`s in their
+    `gaze_event` method: GAZE_ENTER and GAZE_EXIT when the gaze enters and
+    leaves them, GAZE_UPON for every sample on them, and FIXATE when a dwell
+    completes on them. Regions of the screen that are not widgets, like the
+    screen edges, are added with `add_region`.
+
+    The targets under the gaze are resolved once per sample. Targets are
+    indexed by the screen cells they overlap, so only the few targets in the
+    cell of the gaze are tested and only the targets the gaze enters, stays on
+    or leaves receive events. Hidden targets are left out of the index, which
+    is rebuilt when a subscribed widget or one of its parents moves, resizes,
+    is shown, hidden or reparented. Samples without gaze leave the targets under the gaze
+    unchanged.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._targets = []
+        self._cells = {}
+        self._dirty = True
+        self._hovered = []
+
+        self._rebuilds = REGISTRY.counter(
+            "gaze_control_gaze_router_rebuilds_total",
+            "Times the screen index of the gaze event targets was rebuilt.",
+        )
+
+    def subscribe(self, widget, events=ALL_EVENTS, handler=None):
+        """Delivers gaze events of the given types to `widget.gaze_event`, or to
+        `handler`.
+        """
+        if handler is None:
+            handler = widget.gaze_event
+        self._targets.append(_WidgetTarget(widget, handler, frozenset(events)))
+        self._watch_layout(widget)
+        self.invalidate()
+
+    def unsubscribe(self, widget):
+        self._remove([t for t in self._targets if t.owner() is widget])
+
+    def add_region(self, polygon, handler, events=ALL_EVENTS, owner=None):
+        """Delivers gaze events on `polygon`, in screen coordinates, to
+        `handler`. Returns the `GazeRegion`, call `invalidate` after changing
+        its polygon.
+        """
+        region = GazeRegion(polygon, handler, frozenset(events), owner)
+        self._targets.append(region)
+        self.invalidate()
+        return region
+
+    def remove_region(self, region):
+        self._remove([region])
+
+    def _remove(self, targets):
+        for target in targets:
+            self._targets.remove(target)
+        self._hovered = [t for t in self._hovered if t not in targets]
+        self.invalidate()
+
+    def invalidate(self):
+        """Rebuilds the index before the next sample."""
+        self._dirty = True
+
+    def _watch_layout(self, widget):
+        # Installing a filter again keeps a single one
+        while widget is not None:
+            widget.installEventFilter(self)
+            widget = widget.parentWidget()
+
+    def eventFilter(self, watched, event):
+        if event.type() in LAYOUT_EVENTS:
+            self._dirty = True
+            # Widgets are often subscribed before they are added to a layout,
+            # the parents they get later move them too
+            if event.type() == QEvent.ParentChange:
+                self._watch_layout(watched)
+        return False
+
+    def _rebuild(self):
+        self._cells = {}
+        for target in self._targets:
+            bounds = target.bounds()
+            if bounds.isEmpty():
+                continue
+
+            first_x = bounds.left() // CELL_SIZE
+            last_x = bounds.right() // CELL_SIZE
+            first_y = bounds.top() // CELL_SIZE
+            last_y = bounds.bottom() // CELL_SIZE
+            for cell_x in range(first_x, last_x + 1):
+                for cell_y in range(first_y, last_y + 1):
+                    self._cells.setdefault((cell_x, cell_y), []).append(target)
+
+        self._dirty = False
+        self._rebuilds.inc()
+
+    def targets_at(self, point, blocked=None):
+        """The active targets at `point` in screen coordinates, in the order they
+        were subscribed. Targets of widgets inside `blocked` are left out.
+        """
+        if self._dirty:
+            self._rebuild()
+
+        cell = (point.x() // CELL_SIZE, point.y() // CELL_SIZE)
+        targets = []
+        for target in self._cells.get(cell, ()):
+            owner = target.owner()
+            if owner is not None:
+                if not owner.isVisible():
+                    continue
+                if blocked is not None and (
+                    owner is blocked or blocked.isAncestorOf(owner)
+                ):
+                    continue
+            if target.contains(point):
+                targets.append(target)
+        return targets
+
+    def dispatch(self, eye_tracking_data: EyeTrackingData, blocked=None):
+        """Delivers the events of a sample to the targets it affects.
+
+        Widgets inside `blocked` are treated as if the gaze was not on them.
+        """
+        if eye_tracking_data is None or eye_tracking_data.gaze is None:
+            return
+
+        x, y = eye_tracking_data.gaze
+        point = QPoint(int(x), int(y))
+        targets = self.targets_at(point, blocked)
+
+        # Targets that were hidden since still receive GAZE_EXIT
+        hovered = self._hovered
+        self._hovered = targets
+        for target in hovered:
+            if target not in targets and GazeEventType.GAZE_EXIT in target.events:
+                target.deliver(GazeEventType.GAZE_EXIT, eye_tracking_data, point)
+
+        fixated = eye_tracking_data.dwell_process == 1.0
+        for target in targets:
+            events = target.events
+            if target not in hovered and GazeEventType.GAZE_ENTER in events:
+                target.deliver(GazeEventType.GAZE_ENTER, eye_tracking_data, point)
+            if GazeEventType.GAZE_UPON in events:
+                target.deliver(GazeEventType.GAZE_UPON, eye_tracking_data, point)
+            if fixated and GazeEventType.FIXATE in events:
+                target.deliver(GazeEventType.FIXATE, eye_tracking_data, point)
@@ -10,3 +10,16 @@ class TriggerEvent:
     def __init__(self, event_config, gaze_data):
         self.event_config = event_config
         self.gaze_data = gaze_data
+
+class GazeEvent:
+    """A gaze event of the `GazeEventRouter`, positions are in pixels.
+
+    `pos` is relative to the widget that receives the event, `global_pos` is
+    in screen coordinates.
+    """
+
+    def __init__(self, type, eye_tracking_data, global_pos, pos):
+        self.type = type
+        self.eye_tracking_data = eye_tracking_data
+        self.global_pos = global_pos
+        self.pos = pos
@@ -0,0 +1,296 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from PySide6.QtCore import *
+from PySide6.QtGui import *
+from PySide6.QtWidgets import *
+
+from eye_tracking_provider import (
+    ReplayEyeTrackingProvider,
+    ReplayPacing,
+    SyntheticEyeTrackingProvider,
+    METADATA_FILE,
+)
+from gaze_event_router import GazeEventRouter
+
+
+DEFAULT_SCREEN_SIZE = (1920, 1080)
+
+
+def use_offscreen_platform(screen_size, directory):
+    """Makes Qt render to memory, on a single screen of `screen_size`.
+
+    Has to be called before the application is created. The screen is
+    configured in a file in `directory`. A platform that was chosen explicitly
+    with QT_QPA_PLATFORM is kept. Returns whether the platform was set.
+    """
+    if os.environ.get("QT_QPA_PLATFORM"):
+        return False
+
+    width, height = screen_size
+    config = {
+        "screens": [
+            {
+                "name": "Headless",
+                "x": 0,
+                "y": 0,
+                "width": int(width),
+                "height": int(height),
+                "logicalDpi": 96,
+                "logicalBaseDpi": 96,
+                "dpr": 1,
+            }
+        ]
+    }
+    path = os.path.join(directory, "screen.json")
+    with open(path, "w") as f:
+        json.dump(config, f)
+
+    os.environ["QT_QPA_PLATFORM"] = f"offscreen:configfile={path}"
+    return True
+
+
+def recording_screen_size(directory):
+    with open(os.path.join(directory, METADATA_FILE)) as f:
+        return tuple(json.load(f)["screen_size"])
+
+
+class HeadlessApp(QApplication):
+    """The gaze pipeline of `GazeControlApp` without visible windows.
+
+    Wires a replay or synthetic provider, gaze mapping, the predictor, the
+    dwell detector and the main window with its modes like the app does, but
+    on Qt's offscreen platform. Clicks, mouse moves and key presses of the
+    modes are collected in `events` instead of being injected. Triggered edge
+    actions are collected too instead of being executed, as they may inject
+    input, e.g. scroll. Samples are processed with `step()` or `run()` instead
+    of the poll timer.
+    """
+
+    def __init__(
+        self,
+        replay_directory=None,
+        synthetic_rate=200.0,
+        render_scene=False,
+        pacing=ReplayPacing.AS_FAST_AS_POSSIBLE,
+        screen_size=None,
+        seed=None,
+        use_calibrated_gaze=False,
+    ):
+        if screen_size is None:
+            screen_size = DEFAULT_SCREEN_SIZE
+            if replay_directory is not None:
+                screen_size = recording_screen_size(replay_directory)
+        # Removed on close, or at exit if the app is not closed
+        screen_config = tempfile.TemporaryDirectory(prefix="gaze-control-")
+        set_platform = use_offscreen_platform(screen_size, screen_config.name)
+        super().__init__([])
+        self._screen_config = screen_config
+        self._set_platform = set_platform
+
+        event_handlers = {
+            "on_key_pressed": self.on_key_pressed,
+            "on_mouse_click": self.on_mouse_click,
+            "on_mouse_move": self.on_mouse_move,
+            "on_surface_changed": self.on_surface_changed,
+            "on_calibration_finished": self.on_calibration_finished,
+            "on_validation_finished": self.on_validation_finished,
+        }
+
+        # Imported late, the widgets need the application to exist
+        from main_ui import MainWindow
+
+        self.pause_switch_active = False
+        self.events = []
+
+        screen = self.primaryScreen()
+        self.gaze_event_router = GazeEventRouter()
+        self.main_window = MainWindow(event_handlers)
+        self.main_window.setScreen(screen)
+
+        if replay_directory is not None:
+            self.eye_tracking_provider = ReplayEyeTrackingProvider(
+                replay_directory,
+                markers=self.main_window.marker_overlay.markers,
+                pacing=pacing,
+                use_calibrated_gaze=use_calibrated_gaze,
+                correction_grid_resolution=(64, 36),
+            )
+        else:
+            size = screen.size()
+            self.eye_tracking_provider = SyntheticEyeTrackingProvider(
+                (size.width(), size.height()),
+                rate=synthetic_rate,
+                render_scene=render_scene,
+                pacing=pacing,
+                seed=seed,
+                use_calibrated_gaze=use_calibrated_gaze,
+                correction_grid_resolution=(64, 36),
+            )
+        self.eye_tracking_provider.connect()
+
+        self.main_window.setGeometry(screen.geometry())
+        self.main_window.show()
+        self.main_window.marker_overlay.surface_changed.connect(self.on_surface_changed)
+        self.main_window.surface_changed.connect(self.on_surface_changed)
+        self.processEvents()
+
+    def on_surface_changed(self):
+        self.eye_tracking_provider.update_surface()
+
+    def on_calibration_finished(self, predictor):
+        predictor.device_serial = self.eye_tracking_provider.device_serial
+        self.eye_tracking_provider.set_predictor(predictor)
+
+    def on_validation_finished(self, report):
+        self._add_event("validation", report["accuracy_px"])
+
+    def on_mouse_click(self, pos: QPoint):
+        self._add_event("click", f"{pos.x()},{pos.y()}")
+
+    def on_mouse_move(self, pos: QPoint):
+        self._add_event("move", f"{pos.x()},{pos.y()}")
+
+    def on_key_pressed(self, key):
+        self._add_event("key", key)
+
+    def on_edge_action(self, action_config, trigger_event):
+        self._add_event("action", str(action_config))
+
+    def _add_event(self, name, detail):
+        self.events.append((time.time(), name, detail))
+        self.eye_tracking_provider.recorder.add_event(name, detail)
+
+    def set_mode(self, mode):
+        self.main_window._switch_modes(mode)
+        self.processEvents()
+
+    @property
+    def finished(self):
+        return getattr(self.eye_tracking_provider, "finished", False)
+
+    def dispatch(self, eye_tracking_data):
+        """Hands a sample to the widgets, like `GazeControlApp.poll`."""
+        main_window = self.main_window
+        if main_window.current_mode.captures_gaze:
+            main_window.update_data(eye_tracking_data)
+            self.eye_tracking_provider.latency.mark("dispatch")
+            return
+
+        mode = main_window.current_mode
+        blocked = mode if self.pause_switch_active else None
+        self.gaze_event_router.dispatch(eye_tracking_data, blocked)
+        if main_window.current_mode is mode and not self.pause_switch_active:
+            main_window.update_data(eye_tracking_data)
+
+        self.eye_tracking_provider.latency.mark("dispatch")
+
+    def step(self):
+        """Receives and dispatches one sample, then lets the widgets repaint.
+
+        Returns the sample, or None if there was none.
+        """
+        eye_tracking_data = self.eye_tracking_provider.receive()
+        self.dispatch(eye_tracking_data)
+        self.processEvents()
+        return eye_tracking_data
+
+    def run(self, max_samples=None, duration=None):
+        """Processes samples until either limit is reached or a replay ends.
+
+        Returns a summary of the run.
+        """
+        if max_samples is None and duration is None and not hasattr(
+            self.eye_tracking_provider, "finished"
+        ):
+            raise ValueError("Generated gaze never ends, set a sample limit")
+
+        n_samples = 0
+        n_events = len(self.events)
+        start_time = time.perf_counter()
+        end_time = None if duration is None else start_time + duration
+        while not self.finished:
+            if max_samples is not None and n_samples >= max_samples:
+                break
+            if end_time is not None and time.perf_counter() >= end_time:
+                break
+            if self.step() is not None:
+                n_samples += 1
+        elapsed = time.perf_counter() - start_time
+
+        return {
+            "mode": self.main_window.current_mode.__class__.__name__,
+            "n_samples": n_samples,
+            "duration_s": elapsed,
+            "samples_per_second": n_samples / elapsed if elapsed > 0 else 0.0,
+            "n_events": len(self.events) - n_events,
+            "latency": self.eye_tracking_provider.latency.summary(),
+        }
+
+    def close(self):
+        self.main_window.close()
+        self.eye_tracking_provider.close()
+        if self._set_platform:
+            del os.environ["QT_QPA_PLATFORM"]
+            self._set_platform = False
+        self._screen_config.cleanup()
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Run the gaze pipeline without visible windows"
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument(
+        "--replay", metavar="RECORDING", help="Process a recorded session"
+    )
+    source.add_argument(
+        "--synthetic",
+        metavar="RATE",
+        type=float,
+        default=200.0,
+        help="Process generated gaze at RATE Hz (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--render-scene",
+        action="store_true",
+        help="Map generated gaze through rendered scene frames with markers",
+    )
+    parser.add_argument(
+        "--real-time",
+        action="store_true",
+        help="Process samples at their recorded rate instead of as fast as possible",
+    )
+    parser.add_argument("--mode", default="View", help="App mode to run in")
+    parser.add_argument("--samples", type=int, help="Stop after this many samples")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds")
+    parser.add_argument("--seed", type=int, help="Seed of the generated gaze")
+    args = parser.parse_args()
+
+    max_samples = args.samples
+    if args.replay is None and max_samples is None and args.duration is None:
+        max_samples = 10000
+
+    pacing = ReplayPacing.AS_FAST_AS_POSSIBLE
+    if args.real_time:
+        pacing = ReplayPacing.REAL_TIME
+
+    app = HeadlessApp(
+        replay_directory=args.replay,
+        synthetic_rate=args.synthetic,
+        render_scene=args.render_scene,
+        pacing=pacing,
+        seed=args.seed,
+    )
+    app.set_mode(args.mode)
+    summary = app.run(max_samples, args.duration)
+    app.close()
+
+    print(json.dumps(summary, indent=4))
+
+
+if __name__ == "__main__":
+    run()
@@ -1,3 +1,4 @@
+import argparse
 import json
 
 from PySide6.QtCore import *
@@ -12,18 +13,37 @@ from widgets.debug_window import DebugWindow
 
 
 from eye_tracking_provider import EyeTrackingProvider as EyeTrackingProvider
+from eye_tracking_provider import ReplayEyeTrackingProvider, ReplayPacing
+from eye_tracking_provider import SyntheticEyeTrackingProvider
+from eye_tracking_provider import ConnectionSupervisor, ConnectionState
+from eye_tracking_provider import GazeFilterSettings, SCENE_FRAME_RATE
+from eye_tracking_provider import (
+    PREDICTOR_FILE,
+    VALIDATION_FILE,
+    save_validation_report,
+    load_validation_report,
+)
 
 from encoder import create_property_dict
 import actions
 from gaze_event_type import GazeEventType
+from gaze_event_router import GazeEventRouter
 
 from hotkey_manager import HotkeyManager
+from stall_watchdog import StallWatchdog
+from metrics_exporter import MetricsExporter
 
 pyautogui.FAILSAFE = False
 
 
 class GazeControlApp(QApplication):
-    def __init__(self):
+    def __init__(
+        self,
+        replay_directory=None,
+        replay_pacing=ReplayPacing.REAL_TIME,
+        synthetic_rate=None,
+        render_scene=False,
+    ):
         super().__init__()
 
         event_handlers = {
@@ -31,6 +51,8 @@ class GazeControlApp(QApplication):
             "on_mouse_click": self.on_mouse_click,
             "on_mouse_move": self.on_mouse_move,
             "on_surface_changed": self.on_surface_changed,
+            "on_calibration_finished": self.on_calibration_finished,
+            "on_validation_finished": self.on_validation_finished,
         }
 
         self.hotkey_manager = HotkeyManager()
@@ -45,16 +67,35 @@ class GazeControlApp(QApplication):
         self.setApplicationDisplayName("Gaze Control")
 
         screen_size = self.primaryScreen().size()
+        self.gaze_event_router = GazeEventRouter()
         self.main_window = MainWindow(event_handlers)
         self.main_window.marker_overlay.surface_changed.connect(self.on_surface_changed)
         self.main_window.surface_changed.connect(self.on_surface_changed)
         self.main_window.setScreen(self.primaryScreen())
 
-        self.eye_tracking_provider = EyeTrackingProvider(
-            markers=self.main_window.marker_overlay.markers,
-            screen_size=(screen_size.width(), screen_size.height()),
-            use_calibrated_gaze=True,
-        )
+        if synthetic_rate is not None:
+            self.eye_tracking_provider = SyntheticEyeTrackingProvider(
+                (screen_size.width(), screen_size.height()),
+                rate=synthetic_rate,
+                render_scene=render_scene,
+                pacing=ReplayPacing.REAL_TIME,
+            )
+            self.eye_tracking_provider.connect()
+        elif replay_directory is None:
+            self.eye_tracking_provider = EyeTrackingProvider(
+                markers=self.main_window.marker_overlay.markers,
+                screen_size=(screen_size.width(), screen_size.height()),
+                use_calibrated_gaze=True,
+                correction_grid_resolution=(64, 36),
+            )
+        else:
+            self.eye_tracking_provider = ReplayEyeTrackingProvider(
+                replay_directory,
+                markers=self.main_window.marker_overlay.markers,
+                pacing=replay_pacing,
+                correction_grid_resolution=(64, 36),
+            )
+            self.eye_tracking_provider.connect()
 
         edge_action_configs = []
         a_config = actions.EdgeActionConfig()
@@ -77,13 +118,27 @@ class GazeControlApp(QApplication):
             self.primaryScreen(), edge_action_configs
         )
 
+        self.connection_supervisor = ConnectionSupervisor(self.eye_tracking_provider)
+        self.connection_supervisor.state_changed.connect(
+            self._on_connection_state_changed
+        )
+        self._reconnecting = False
+
+        self.metrics_exporter = MetricsExporter()
+
+        self.gaze_filter_settings = GazeFilterSettings()
+        self.current_mode_name = "View"
+
         self._load_settings()
+        self._update_gaze_filter()
+        self._report_gaze_filter_latency()
 
         self.settings_window = SettingsWidget()
         self.settings_window.add_object_page(
             [
                 self,
                 self.eye_tracking_provider.dwell_detector,
+                self.eye_tracking_provider.drift_corrector,
             ],
             "General Options",
         )
@@ -91,17 +146,40 @@ class GazeControlApp(QApplication):
         self.settings_window.add_object_page(
             self.main_window.modes["Zoom"].selection_zoom, "Zoom-clicking"
         )
-
-        self.debug_window = DebugWindow(
-            self.eye_tracking_provider.distort_point,
-            self.eye_tracking_provider.map_surface_to_scene_video,
+        self.settings_window.add_object_page(
+            self.main_window.modes["Calibrate"], "Calibration"
         )
-        self._build_tray_icon()
+        self.settings_window.add_object_page(self.gaze_filter_settings, "Gaze Filter")
+        self.settings_window.add_object_page(
+            self.eye_tracking_provider.gaze_extrapolator, "Gaze Prediction"
+        )
+        self.settings_window.add_object_page(
+            self.eye_tracking_provider.surface_pose_predictor, "Head Motion"
+        )
+        self.settings_window.add_object_page(self.connection_supervisor, "Connection")
+        self.settings_window.add_object_page(self.metrics_exporter, "Metrics")
 
         self.poll_timer = QTimer()
         self.poll_timer.setInterval(1000 / 30)
         self.poll_timer.timeout.connect(self.poll)
         self.poll_timer.start()
+        self.stall_watchdog = StallWatchdog(self.poll_timer.interval() / 1000)
+
+        self.debug_window = DebugWindow(
+            self.eye_tracking_provider.distort_point,
+            self.eye_tracking_provider.map_surface_to_scene_video,
+            latency=self.eye_tracking_provider.latency,
+            stall_watchdog=self.stall_watchdog,
+        )
+        try:
+            self.debug_window.set_validation_report(
+                load_validation_report(VALIDATION_FILE)
+            )
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError) as exc:
+            print(f"Ignoring invalid validation report {VALIDATION_FILE}: {exc}")
+        self._build_tray_icon()
 
         # Delay saves to prevent hammering the disk
         self.save_timer = QTimer()
@@ -114,6 +192,18 @@ class GazeControlApp(QApplication):
             self.save_settings
         )
         self.eye_tracking_provider.dwell_detector.changed.connect(self.save_settings)
+        self.eye_tracking_provider.drift_corrector.changed.connect(self.save_settings)
+        self.main_window.modes["Calibrate"].changed.connect(self.save_settings)
+        self.connection_supervisor.changed.connect(self.save_settings)
+        self.metrics_exporter.changed.connect(self.save_settings)
+        self.gaze_filter_settings.changed.connect(self.save_settings)
+        self.eye_tracking_provider.gaze_extrapolator.changed.connect(self.save_settings)
+        self.eye_tracking_provider.surface_pose_predictor.changed.connect(
+            self.save_settings
+        )
+        self.gaze_filter_settings.changed.connect(self._update_gaze_filter)
+        self.gaze_filter_settings.changed.connect(self._report_gaze_filter_latency)
+        self.main_window.mode_changed.connect(self._on_mode_changed)
 
         self.pause_switch_active = False
 
@@ -177,6 +267,19 @@ class GazeControlApp(QApplication):
             "selection_zoom": create_property_dict(
                 self.main_window.modes["Zoom"].selection_zoom
             ),
+            "drift_correction": create_property_dict(
+                self.eye_tracking_provider.drift_corrector
+            ),
+            "calibration": create_property_dict(self.main_window.modes["Calibrate"]),
+            "gaze_filter": create_property_dict(self.gaze_filter_settings),
+            "gaze_extrapolation": create_property_dict(
+                self.eye_tracking_provider.gaze_extrapolator
+            ),
+            "head_motion": create_property_dict(
+                self.eye_tracking_provider.surface_pose_predictor
+            ),
+            "connection": create_property_dict(self.connection_supervisor),
+            "metrics": create_property_dict(self.metrics_exporter),
             "edge_event_actions": [],
         }
 
@@ -203,6 +306,43 @@ class GazeControlApp(QApplication):
         for k, v in settings["selection_zoom"].items():
             setattr(self.main_window.modes["Zoom"].selection_zoom, k, v)
 
+        for k, v in settings.get("drift_correction", {}).items():
+            setattr(self.eye_tracking_provider.drift_corrector, k, v)
+
+        for k, v in settings.get("calibration", {}).items():
+            setattr(self.main_window.modes["Calibrate"], k, v)
+
+        for k, v in settings.get("gaze_filter", {}).items():
+            setattr(self.gaze_filter_settings, k, v)
+
+        for k, v in settings.get("gaze_extrapolation", {}).items():
+            setattr(self.eye_tracking_provider.gaze_extrapolator, k, v)
+
+        for k, v in settings.get("head_motion", {}).items():
+            setattr(self.eye_tracking_provider.surface_pose_predictor, k, v)
+
+        for k, v in settings.get("connection", {}).items():
+            setattr(self.connection_supervisor, k, v)
+
+        for k, v in settings.get("metrics", {}).items():
+            setattr(self.metrics_exporter, k, v)
+
+    def _on_mode_changed(self, mode):
+        self.current_mode_name = mode
+        self._update_gaze_filter()
+
+    def _update_gaze_filter(self):
+        self.eye_tracking_provider.set_gaze_filter(
+            self.gaze_filter_settings.create_chain(self.current_mode_name)
+        )
+
+    def _report_gaze_filter_latency(self):
+        latency = self.gaze_filter_settings.latency_report(SCENE_FRAME_RATE)
+        print(
+            "Latency added by the gaze filters: "
+            + ", ".join(f"{mode} {ms:.0f} ms" for mode, ms in latency.items())
+        )
+
     def _build_tray_icon(self):
         icon_image = QImage("PPL-Favicon-144x144.png")
 
@@ -226,6 +366,11 @@ class GazeControlApp(QApplication):
         self.tray_menu.addAction("Toggle Settings Window").triggered.connect(
             lambda _: self.toggle_settings_window()
         )
+        self.tray_menu.addAction("Calibrate").triggered.connect(
+            lambda _: self.start_calibration()
+        )
+        self.record_action = self.tray_menu.addAction("Start Recording")
+        self.record_action.triggered.connect(lambda _: self.toggle_recording())
         self.tray_menu.addSeparator()
         self.tray_menu.addAction("Quit").triggered.connect(lambda _: self.quit())
 
@@ -251,6 +396,26 @@ class GazeControlApp(QApplication):
         else:
             self.settings_window.show()
 
+    def toggle_recording(self):
+        if self.eye_tracking_provider.recorder.recording:
+            self.eye_tracking_provider.stop_recording()
+            self.record_action.setText("Start Recording")
+        else:
+            directory = self.eye_tracking_provider.start_recording()
+            self.record_action.setText("Stop Recording")
+            self.tray_icon.showMessage(
+                "Gaze Control Recording",
+                f"Recording to {directory}",
+                QSystemTrayIcon.Information,
+                3000,
+            )
+
+    def start_calibration(self):
+        if not self.main_window.isVisible():
+            self.main_window.showMaximized()
+
+        self.main_window._switch_modes("Calibrate")
+
     def connect_to_device(self, host, port):
         result = self.eye_tracking_provider.connect(ip=host, port=port)
 
@@ -266,6 +431,7 @@ class GazeControlApp(QApplication):
 
         else:
             ip, port = result
+            self.connection_supervisor.on_connected(result)
             self.tray_icon.showMessage(
                 "Gaze Control Connection",
                 f"Connected to {ip}:{port}!",
@@ -280,43 +446,157 @@ class GazeControlApp(QApplication):
 
             return True
 
+    def _on_connection_state_changed(self, state):
+        self.settings_window.device_settings_widget.set_connection_state(state.value)
+
+        if state == ConnectionState.RECONNECTING:
+            self.tray_icon.showMessage(
+                "Gaze Control Connection",
+                "Connection to the device lost, reconnecting...",
+                QSystemTrayIcon.Warning,
+                3000,
+            )
+        elif state == ConnectionState.CONNECTED and self._reconnecting:
+            ip, port = self.connection_supervisor.address
+            self.tray_icon.showMessage(
+                "Gaze Control Connection",
+                f"Reconnected to {ip}:{port}!",
+                QSystemTrayIcon.Information,
+                3000,
+            )
+        self._reconnecting = state == ConnectionState.RECONNECTING
+
     def on_surface_changed(self):
         self.eye_tracking_provider.update_surface()
 
+    def on_calibration_finished(self, predictor):
+        previous = self.eye_tracking_provider.predictor
+
+        predictor.device_serial = self.eye_tracking_provider.device_serial
+        predictor.save(PREDICTOR_FILE)
+        self.eye_tracking_provider.set_predictor(predictor)
+
+        print("New calibration:", self._calibration_summary(predictor.fit_stats))
+        if previous is not None and "method" in previous.fit_stats:
+            print(
+                "Previous calibration:",
+                self._calibration_summary(previous.fit_stats),
+            )
+
+        self.tray_icon.showMessage(
+            "Gaze Control Calibration",
+            f"Calibration finished with an error of "
+            f"{predictor.fit_stats['cv_error_px']:.0f} px.",
+            QSystemTrayIcon.Information,
+            3000,
+        )
+
+    def on_validation_finished(self, report):
+        save_validation_report(report, VALIDATION_FILE)
+        self.debug_window.set_validation_report(report)
+
+        if report["accuracy_px"] is None:
+            message = "Validation failed, gaze could not be mapped to the screen."
+        else:
+            message = (
+                f"Validation accuracy {report['accuracy_px']:.0f} px, "
+                f"mapping failed for {report['failure_fraction']:.0%} of samples."
+            )
+        print(message)
+        self.tray_icon.showMessage(
+            "Gaze Control Calibration", message, QSystemTrayIcon.Information, 3000
+        )
+
+    def _calibration_summary(self, stats):
+        return (
+            f"{stats['method']} in {stats['session_duration_s']:.0f} s, "
+            f"{stats['samples_per_second']:.1f} samples/s, "
+            f"error {stats['cv_error_px']:.1f} px"
+        )
+
     def on_mouse_click(self, pos: QPoint):
-        pyautogui.click(pos.x(), pos.y())
+        self.eye_tracking_provider.recorder.add_event("click", f"{pos.x()},{pos.y()}")
+        with actions.injection_timer("click"):
+            pyautogui.click(pos.x(), pos.y())
 
     def on_mouse_move(self, pos: QPoint):
-        pyautogui.moveTo(pos.x(), pos.y())
+        self.eye_tracking_provider.recorder.add_event("move", f"{pos.x()},{pos.y()}")
+        with actions.injection_timer("move"):
+            pyautogui.moveTo(pos.x(), pos.y())
 
     def on_key_pressed(self, key):
-        pyautogui.press(key)
+        self.eye_tracking_provider.recorder.add_event("key", key)
+        with actions.injection_timer("key"):
+            pyautogui.press(key)
+
+    def on_edge_action(self, action_config, trigger_event):
+        self.eye_tracking_provider.recorder.add_event("action", str(action_config))
+        action_config.action.execute(trigger_event)
 
     def poll(self):
+        self.stall_watchdog.tick()
         eye_tracking_data = self.eye_tracking_provider.receive()
         self.debug_window.update_data(eye_tracking_data)
 
-        self.edge_action_handler.update_data(eye_tracking_data)
-        self.main_window.mode_menu_left.update_data(eye_tracking_data)
-        self.main_window.mode_menu_right.update_data(eye_tracking_data)
-        self.main_window.mode_menu_permanent.update_data(eye_tracking_data)
-        mode_change = (
-            self.main_window.mode_menu_left.mode_change
-            or self.main_window.mode_menu_right.mode_change
-            or self.main_window.mode_menu_permanent.mode_change
-        )
-        if not mode_change and not self.pause_switch_active:
+        if self.main_window.current_mode.captures_gaze:
             self.main_window.update_data(eye_tracking_data)
+        else:
+            # Paused modes get no gaze, the mode menus and edges still do
+            mode = self.main_window.current_mode
+            blocked = mode if self.pause_switch_active else None
+            self.gaze_event_router.dispatch(eye_tracking_data, blocked)
+            if self.main_window.current_mode is mode and not self.pause_switch_active:
+                self.main_window.update_data(eye_tracking_data)
+
+        self.eye_tracking_provider.latency.mark("dispatch")
+        self.stall_watchdog.poll_finished()
 
     def exec(self):
         self.settings_window.show()
 
+        self.stall_watchdog.start()
         super().exec()
+        self.stall_watchdog.stop()
+        self.connection_supervisor.stop()
+        self.metrics_exporter.close()
         self.eye_tracking_provider.close()
 
 
 def run():
-    app = GazeControlApp()
+    parser = argparse.ArgumentParser(description="Gaze Control")
+    parser.add_argument(
+        "--replay",
+        metavar="RECORDING",
+        help="Replay a recorded session instead of connecting to a device",
+    )
+    parser.add_argument(
+        "--as-fast-as-possible",
+        action="store_true",
+        help="Replay one sample per poll instead of at the recorded rate",
+    )
+    parser.add_argument(
+        "--synthetic",
+        metavar="RATE",
+        type=float,
+        help="Use generated gaze at RATE Hz (30-1000) instead of a device",
+    )
+    parser.add_argument(
+        "--render-scene",
+        action="store_true",
+        help="Map generated gaze through rendered scene frames with markers",
+    )
+    args, _ = parser.parse_known_args()
+
+    pacing = ReplayPacing.REAL_TIME
+    if args.as_fast_as_possible:
+        pacing = ReplayPacing.AS_FAST_AS_POSSIBLE
+
+    app = GazeControlApp(
+        replay_directory=args.replay,
+        replay_pacing=pacing,
+        synthetic_rate=args.synthetic,
+        render_scene=args.render_scene,
+    )
     app.exec()
 
 
@@ -12,6 +12,7 @@ from widgets import app_modes
 class MainWindow(QWidget):
     surface_changed = Signal()
     hidden = Signal()
+    mode_changed = Signal(str)
 
     def __init__(self, event_handlers):
         super().__init__()
@@ -30,16 +31,18 @@ class MainWindow(QWidget):
             "Zoom": app_modes.ZoomMode(self, event_handlers),
             "Keyboard": app_modes.KeyboardMode(self, event_handlers),
             "Speaker": app_modes.SpeakerMode(self, event_handlers),
+            "Calibrate": app_modes.CalibrationMode(self, event_handlers),
         }
+        self.modes["Calibrate"].finished.connect(lambda: self._switch_modes("View"))
         self.current_mode = self.modes["View"]
 
         self.mode_menu_left = ModeMenu(self, ["View", "Click", "Zoom", "Keyboard"])
         self.mode_menu_left.mode_changed.connect(self._switch_modes)
-        self.mode_menu_right = ModeMenu(self, ["Speaker"])
+        self.mode_menu_right = ModeMenu(self, ["Speaker", "Calibrate"])
         self.mode_menu_right.mode_changed.connect(self._switch_modes)
 
         self.mode_menu_permanent = ModeMenuPermanent(
-            self, ["View", "Click", "Zoom", "Keyboard", "Speaker"]
+            self, ["View", "Click", "Zoom", "Keyboard", "Speaker", "Calibrate"]
         )
         self.mode_menu_permanent.mode_changed.connect(self._switch_modes)
 
@@ -51,6 +54,7 @@ class MainWindow(QWidget):
         self.current_mode.deactivate()
         self.current_mode = self.modes[mode]
         self.current_mode.activate()
+        self.mode_changed.emit(mode)
 
     def update_data(self, eye_tracking_data):
         self.current_mode.update_data(eye_tracking_data)
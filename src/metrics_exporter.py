@@ -0,0 +1,183 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PySide6.QtCore import *
+
+from eye_tracking_provider.metrics import REGISTRY
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = self.registry.exposition().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsExporter(QObject):
+    """Exports the metrics registry for monitoring.
+
+    Either serves it on http://127.0.0.1:<port>/metrics for a Prometheus
+    scraper on the same machine, or writes it to a file periodically, e.g. for
+    the textfile collector of the node exporter. Both use the Prometheus text
+    format.
+    """
+
+    changed = Signal()
+
+    def __init__(self, registry=REGISTRY):
+        super().__init__()
+        self.registry = registry
+
+        self._http_enabled = False
+        self._http_port = 9464
+        self._file_enabled = False
+        self._file_path = "gaze_control.prom"
+        self._file_interval = 15.0
+
+        self.server = None
+        self.server_thread = None
+
+        self.file_timer = QTimer()
+        self.file_timer.timeout.connect(self._write_file)
+
+        # Delay rebinding while the port is being edited, e.g. with a slider
+        self.server_timer = QTimer()
+        self.server_timer.setSingleShot(True)
+        self.server_timer.setInterval(1000)
+        self.server_timer.timeout.connect(self._update_server)
+
+    @property
+    def http_enabled(self) -> bool:
+        """
+        Serve the metrics on localhost for a Prometheus scraper.
+
+        :label Metrics HTTP Endpoint
+        """
+        return self._http_enabled
+
+    @http_enabled.setter
+    def http_enabled(self, value):
+        self._http_enabled = value
+        self._update_server()
+        self.changed.emit()
+
+    @property
+    def http_port(self) -> int:
+        """
+        :label Metrics HTTP Port
+        :min 1024
+        :max 65535
+        """
+        return self._http_port
+
+    @http_port.setter
+    def http_port(self, value):
+        self._http_port = value
+        if self._http_enabled:
+            self.server_timer.start()
+        self.changed.emit()
+
+    @property
+    def file_enabled(self) -> bool:
+        """
+        Write the metrics to a file periodically.
+
+        :label Metrics File Dump
+        """
+        return self._file_enabled
+
+    @file_enabled.setter
+    def file_enabled(self, value):
+        self._file_enabled = value
+        self._update_file_timer()
+        self.changed.emit()
+
+    @property
+    def file_path(self) -> str:
+        """
+        :label Metrics File
+        """
+        return self._file_path
+
+    @file_path.setter
+    def file_path(self, value):
+        self._file_path = value
+        self.changed.emit()
+
+    @property
+    def file_interval(self) -> float:
+        """
+        :label Metrics File Interval (seconds)
+        :min 1.0
+        :max 300.0
+        :decimals 0
+        """
+        return self._file_interval
+
+    @file_interval.setter
+    def file_interval(self, value):
+        self._file_interval = value
+        self._update_file_timer()
+        self.changed.emit()
+
+    def _update_server(self):
+        self.server_timer.stop()
+        self._stop_server()
+        if not self._http_enabled:
+            return
+
+        handler = type(
+            "MetricsRequestHandler",
+            (_MetricsRequestHandler,),
+            {"registry": self.registry},
+        )
+        try:
+            # Bound to the loopback interface only, metrics are not exposed to
+            # the network
+            self.server = ThreadingHTTPServer(("127.0.0.1", self._http_port), handler)
+        except OSError as exc:
+            print(f"Failed to start metrics endpoint on port {self._http_port}", exc)
+            self.server = None
+            return
+
+        self.server_thread = threading.Thread(
+            target=self.server.serve_forever, name="MetricsExporter", daemon=True
+        )
+        self.server_thread.start()
+        print(f"Serving metrics on http://127.0.0.1:{self._http_port}/metrics")
+
+    def _stop_server(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            self.server_thread = None
+
+    def _update_file_timer(self):
+        if self._file_enabled:
+            self.file_timer.start(int(self._file_interval * 1000))
+        else:
+            self.file_timer.stop()
+
+    def _write_file(self):
+        try:
+            self.registry.write(self._file_path)
+        except OSError as exc:
+            print("Failed to write metrics", exc)
+
+    def close(self):
+        self.server_timer.stop()
+        self._stop_server()
+        self.file_timer.stop()
@@ -0,0 +1,36 @@
+import argparse
+
+import joblib
+
+from eye_tracking_provider.predictor import PolynomialPredictor, PREDICTOR_FILE
+
+
+def migrate(legacy_path, output_path, screen_size=None, device_serial=None):
+    pipeline = joblib.load(legacy_path)
+    predictor = PolynomialPredictor.from_sklearn(
+        pipeline,
+        screen_size=screen_size,
+        device_serial=device_serial,
+        fit_stats={"migrated_from": legacy_path},
+    )
+    predictor.save(output_path)
+
+    return predictor
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Convert a legacy predictor.pkl into the versioned predictor file format."
+    )
+    parser.add_argument("input", nargs="?", default="predictor.pkl")
+    parser.add_argument("output", nargs="?", default=PREDICTOR_FILE)
+    parser.add_argument("--screen-size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--device-serial")
+    args = parser.parse_args()
+
+    predictor = migrate(args.input, args.output, args.screen_size, args.device_serial)
+    print(f"Wrote degree {predictor.degree} predictor to {args.output}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,149 @@
+import json
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from PySide6.QtCore import *
+
+from eye_tracking_provider.latency import RollingBuffer
+from eye_tracking_provider.metrics import REGISTRY
+
+
+STALL_REPORT_FILE = "stalls.json"
+
+
+class StallWatchdog(QObject):
+    """Detects stalls of the Qt event loop.
+
+    `tick` is called when the poll timer fires and `poll_finished` when the
+    poll returns. The watchdog measures the interval between ticks and the
+    dispatch lag, i.e. how long an event posted after the poll waits in the
+    event queue, without the time the poll itself takes. A helper thread
+    checks that ticks keep coming. When none came for longer than the expected
+    interval plus `stall_threshold`, it captures the stack of the main thread,
+    which shows what is blocking it. The last `max_events` stalls are kept.
+    """
+
+    def __init__(
+        self, expected_interval, stall_threshold=0.25, max_events=50, capacity=512
+    ):
+        super().__init__()
+        self.expected_interval = expected_interval
+        self.stall_threshold = stall_threshold
+        self.check_interval = 0.05
+
+        self.intervals = RollingBuffer(capacity)
+        self.dispatch_lags = RollingBuffer(capacity)
+        self.events = deque(maxlen=max_events)
+        self.n_stalls = 0
+
+        self._stall_counter = REGISTRY.counter(
+            "gaze_control_event_loop_stalls_total",
+            "Times the Qt event loop was blocked longer than the stall threshold.",
+        )
+        self._poll_interval = REGISTRY.histogram(
+            "gaze_control_poll_interval_seconds",
+            "Actual interval between poll timer ticks.",
+            buckets=[0.02, 0.035, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0],
+        )
+
+        self._main_thread_id = threading.get_ident()
+        self._lock = threading.Lock()
+        self._last_tick = None
+        self._current_stall = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._watch, name="StallWatchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def tick(self):
+        now = time.monotonic()
+
+        with self._lock:
+            if self._last_tick is not None:
+                self.intervals.add(now - self._last_tick)
+                self._poll_interval.observe(now - self._last_tick)
+            self._last_tick = now
+
+            if self._current_stall is not None:
+                self._current_stall["duration_s"] = now - self._current_stall["_start"]
+                del self._current_stall["_start"]
+                self._current_stall = None
+
+    def poll_finished(self):
+        posted = time.monotonic()
+        QTimer.singleShot(0, lambda: self.dispatch_lags.add(time.monotonic() - posted))
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            with self._lock:
+                last_tick = self._last_tick
+                if last_tick is None or self._current_stall is not None:
+                    continue
+
+            blocked = time.monotonic() - last_tick
+            if blocked < self.expected_interval + self.stall_threshold:
+                continue
+
+            frame = sys._current_frames().get(self._main_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else ""
+
+            with self._lock:
+                # The main thread recovered while the stack was captured
+                if self._last_tick != last_tick:
+                    continue
+
+                self._current_stall = {
+                    "time": time.time() - blocked,
+                    "duration_s": None,
+                    "stack": stack,
+                    "_start": last_tick,
+                }
+                self.events.append(self._current_stall)
+                self.n_stalls += 1
+                self._stall_counter.inc()
+
+    def summary(self, q=(50, 95, 99)):
+        with self._lock:
+            last_stall = dict(self.events[-1]) if self.events else None
+
+        return {
+            "percentiles": list(q),
+            "interval_ms": [v * 1000 for v in self.intervals.percentiles(q)],
+            "dispatch_lag_ms": [v * 1000 for v in self.dispatch_lags.percentiles(q)],
+            "n_stalls": self.n_stalls,
+            "last_stall": last_stall,
+        }
+
+    def dump(self, path=STALL_REPORT_FILE):
+        with self._lock:
+            events = [
+                {k: v for k, v in event.items() if not k.startswith("_")}
+                for event in self.events
+            ]
+
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "expected_interval_s": self.expected_interval,
+                    "stall_threshold_s": self.stall_threshold,
+                    "n_stalls": self.n_stalls,
+                    "events": events,
+                },
+                f,
+                indent=4,
+            )
@@ -0,0 +1,271 @@
+import argparse
+import json
+import math
+import sys
+
+import numpy as np
+
+from eye_tracking_provider import (
+    GazeFilterChain,
+    KalmanFilter,
+    MedianFilter,
+    MovingAverageFilter,
+    OneEuroFilter,
+    SaccadeAwareFilter,
+    SyntheticGaze,
+    load_recording,
+    SCENE_FRAME_RATE,
+)
+
+
+# Neon's scene camera, about 15.5 pixels per degree
+SCENE_SIZE = (1600, 1200)
+SCENE_PIXELS_PER_DEGREE = 15.5
+
+BASELINE = "moving_average_5"
+DEFAULT_DURATION = 600.0
+MIN_SACCADE_AMPLITUDE = 40.0
+SETTLE_SAMPLES = 3
+# Filters that lag are still catching up after a saccade, which counts as lag
+# and not as jitter
+SETTLE_TIME = 0.4
+
+
+def synthetic_gaze(duration, rate=SCENE_FRAME_RATE, seed=0, noise=6.0):
+    """Generated scene camera gaze, NaN during blinks."""
+    generator = SyntheticGaze(
+        SCENE_SIZE,
+        rate=rate,
+        seed=seed,
+        noise=noise,
+        drift=0.0,
+        off_screen_probability=0.0,
+        pixels_per_degree=SCENE_PIXELS_PER_DEGREE,
+    )
+    n_samples = int(duration * rate)
+    timestamps = np.empty(n_samples)
+    points = np.empty((n_samples, 2))
+    for i in range(n_samples):
+        timestamp, x, y, valid = generator.next()
+        timestamps[i] = timestamp
+        points[i] = (x, y) if valid else (np.nan, np.nan)
+    return timestamps, points
+
+
+def recorded_gaze(directory):
+    """The scene camera gaze of a recording, NaN while the glasses were not worn.
+
+    Recordings store the gaze after the filter that was active while recording,
+    record with the "None" filter to tune on unfiltered gaze.
+    """
+    recording = load_recording(directory)
+    points = recording["raw_gaze"].astype(np.float64)
+    points[~recording["worn"]] = np.nan
+    return recording["timestamp"], points
+
+
+def find_saccades(timestamps, points, velocity_threshold=1000.0):
+    """Saccades, found offline with the samples before and after them.
+
+    Returns (first index, last index, start position, end position) per
+    saccade that is larger than `MIN_SACCADE_AMPLITUDE` pixels.
+    """
+    # A centered median keeps single noisy samples from looking like saccades
+    padded = np.concatenate([points[:1], points, points[-1:]])
+    smoothed = np.median(np.stack([padded[:-2], padded[1:-1], padded[2:]]), axis=0)
+    dt = np.diff(timestamps)
+    dt[dt <= 0] = np.nan
+    speed = np.linalg.norm(np.diff(smoothed, axis=0), axis=1) / dt
+    # Sample i + 1 is moving if it is far from sample i
+    moving = np.concatenate([[False], np.nan_to_num(speed) > velocity_threshold])
+
+    saccades = []
+    i = 0
+    n = len(points)
+    while i < n:
+        if not moving[i]:
+            i += 1
+            continue
+        start = i
+        while i < n and moving[i]:
+            i += 1
+        end = i
+
+        before = points[max(start - 1 - SETTLE_SAMPLES, 0) : start]
+        after = points[end : end + SETTLE_SAMPLES]
+        if not (len(before) and len(after)):
+            continue
+        if np.isnan(before).any() or np.isnan(after).any():
+            continue
+        start_position = np.median(before, axis=0)
+        end_position = np.median(after, axis=0)
+        if np.linalg.norm(end_position - start_position) >= MIN_SACCADE_AMPLITUDE:
+            saccades.append((start - 1, end, start_position, end_position))
+
+    return saccades
+
+
+def apply_filter(gaze_filter, timestamps, points):
+    """Filters gaze like `RawDataReceiver` does, resetting at invalid samples."""
+    gaze_filter.reset()
+    filtered = np.empty_like(points)
+    for i, ((x, y), timestamp) in enumerate(zip(points, timestamps)):
+        if math.isnan(x) or math.isnan(y):
+            gaze_filter.reset()
+            filtered[i] = x, y
+        else:
+            filtered[i] = gaze_filter.filter(x, y, timestamp)
+    return filtered
+
+
+def _half_way_time(timestamps, points, start, end, start_position, end_position):
+    """When `points` first cover half the way from the start to the end position,
+    interpolated between samples.
+    """
+    direction = end_position - start_position
+    progress = (points[start:end] - start_position) @ direction
+    progress /= direction @ direction
+    for i in range(1, len(progress)):
+        if progress[i] >= 0.5 > progress[i - 1]:
+            fraction = (0.5 - progress[i - 1]) / (progress[i] - progress[i - 1])
+            t0 = timestamps[start + i - 1]
+            return t0 + fraction * (timestamps[start + i] - t0)
+    return None
+
+
+def evaluate(gaze_filter, timestamps, points, saccades, rate=SCENE_FRAME_RATE):
+    """Lag of the filtered gaze at saccades and its jitter during fixations.
+
+    The lag is the time between the unfiltered and the filtered gaze covering
+    half of a saccade. The jitter is the mean distance between consecutive
+    filtered samples during fixations, from `SETTLE_TIME` after a saccade on,
+    what dwell detection has to tolerate.
+    """
+    filtered = apply_filter(gaze_filter, timestamps, points)
+    max_lag_samples = int(rate)
+    settle_samples = int(SETTLE_TIME * rate)
+
+    lags = []
+    fixation = np.isfinite(points).all(axis=1)
+    for start, end, start_position, end_position in saccades:
+        search_end = min(end + max_lag_samples, len(points))
+        t_input = _half_way_time(
+            timestamps, points, start, search_end, start_position, end_position
+        )
+        t_output = _half_way_time(
+            timestamps, filtered, start, search_end, start_position, end_position
+        )
+        if t_input is not None and t_output is not None:
+            lags.append(t_output - t_input)
+        fixation[start : end + settle_samples] = False
+
+    steps = np.linalg.norm(np.diff(filtered, axis=0), axis=1)
+    steps = steps[fixation[1:] & fixation[:-1]]
+    steps = steps[np.isfinite(steps)]
+
+    return {
+        "lag_ms": float(np.mean(lags) * 1000) if lags else math.nan,
+        "lag_p90_ms": float(np.percentile(lags, 90) * 1000) if lags else math.nan,
+        "jitter_px": float(np.mean(steps)) if len(steps) else math.nan,
+        "n_saccades": len(lags),
+    }
+
+
+def candidates(thresholds, window_sizes):
+    """Filters to compare, by name, including the `BASELINE`."""
+    filters = {
+        "none": GazeFilterChain(),
+        "moving_average_5": MovingAverageFilter(5),
+        "median_5": MedianFilter(5),
+        "one_euro": OneEuroFilter(),
+        "kalman": KalmanFilter(),
+    }
+    for window_size in window_sizes:
+        filters[f"moving_average_{window_size}"] = MovingAverageFilter(window_size)
+        for threshold in thresholds:
+            filters[f"adaptive_{window_size}_{threshold:.0f}"] = SaccadeAwareFilter(
+                MovingAverageFilter(window_size), threshold
+            )
+    return filters
+
+
+def tune(timestamps, points, filters):
+    """Evaluates all filters, with the lag each saves against the `BASELINE`."""
+    saccades = find_saccades(timestamps, points)
+    results = {
+        name: evaluate(gaze_filter, timestamps, points, saccades)
+        for name, gaze_filter in filters.items()
+    }
+    baseline_lag = results[BASELINE]["lag_ms"]
+    for result in results.values():
+        result["lag_saved_ms"] = baseline_lag - result["lag_ms"]
+    return results
+
+
+def _print_results(results):
+    print(
+        f"{'filter':<24} {'lag ms':>8} {'p90 ms':>8} {'saved ms':>9} "
+        f"{'jitter px':>10}"
+    )
+    for name, result in sorted(results.items(), key=lambda item: item[1]["lag_ms"]):
+        print(
+            f"{name:<24} {result['lag_ms']:>8.1f} {result['lag_p90_ms']:>8.1f} "
+            f"{result['lag_saved_ms']:>9.1f} {result['jitter_px']:>10.2f}"
+        )
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Compare gaze filters by their lag at saccades and their "
+        "jitter during fixations"
+    )
+    parser.add_argument(
+        "--recording",
+        nargs="+",
+        help="Tune on these recordings instead of generated gaze, recorded with "
+        'the "None" gaze filter',
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=DEFAULT_DURATION,
+        help="Seconds of generated gaze (default: %(default)s)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of generated gaze")
+    parser.add_argument(
+        "--thresholds",
+        type=float,
+        nargs="+",
+        default=[800.0, 1200.0, 1600.0, 2400.0],
+        help="Saccade thresholds of the adaptive filter, in pixels per second",
+    )
+    parser.add_argument(
+        "--window-sizes",
+        type=int,
+        nargs="+",
+        default=[5, 8, 12],
+        help="Fixation windows of the adaptive filter, in samples",
+    )
+    parser.add_argument("-o", "--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.recording:
+        gaze = [recorded_gaze(directory) for directory in args.recording]
+        # Recordings are concatenated with a gap, which resets the filters
+        timestamps = np.concatenate([np.append(t, t[-1]) for t, _ in gaze])[:-1]
+        points = np.concatenate([np.vstack([p, [[np.nan, np.nan]]]) for _, p in gaze])
+        points = points[:-1]
+    else:
+        print(f"Generating {args.duration:.0f} s of gaze...", file=sys.stderr)
+        timestamps, points = synthetic_gaze(args.duration, seed=args.seed)
+
+    results = tune(timestamps, points, candidates(args.thresholds, args.window_sizes))
+    _print_results(results)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    run()
@@ -3,3 +3,4 @@ from .click_mode import ClickMode
 from .keyboard_mode import KeyboardMode
 from .zoom_mode import ZoomMode
 from .speaker_mode import SpeakerMode
+from .calibration_mode import CalibrationMode
@@ -8,6 +8,9 @@ from eye_tracking_provider import EyeTrackingData
 
 
 class AppMode(QWidget):
+    # Modes that capture gaze are not interrupted by the mode menus and edge actions
+    captures_gaze = False
+
     def __init__(
         self, parent: QWidget = None, event_handlers: dict[str, Callable] = None
     ):
@@ -30,3 +33,10 @@ class AppMode(QWidget):
 
     def _update_data(self, eye_tracking_data: EyeTrackingData):
         raise NotImplementedError
+
+    def event(self, event):
+        handled = super().event(event)
+        if event.type() == QEvent.Paint and self.active:
+            QApplication.instance().eye_tracking_provider.latency.mark_paint()
+
+        return handled
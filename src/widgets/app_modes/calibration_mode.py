@@ -0,0 +1,443 @@
+import threading
+import time
+from enum import Enum, auto
+
+from PySide6.QtCore import *
+from PySide6.QtGui import *
+from PySide6.QtWidgets import *
+import numpy as np
+
+from .app_mode import AppMode
+
+from eye_tracking_provider import (
+    AdaptiveTargetPlanner,
+    EyeTrackingData,
+    CalibrationCollector,
+    CalibrationFitter,
+    CalibrationValidator,
+    PursuitPath,
+    grid_targets,
+    validation_targets,
+)
+
+
+class CalibrationMethod(Enum):
+    GRID = auto()
+    PURSUIT = auto()
+    ADAPTIVE = auto()
+
+
+class CalibrationMode(AppMode):
+    """Runs a calibration session inside the running app.
+
+    Uses the live device connection and the marker overlay of the main window.
+    The predictor is fitted in the background and handed to the
+    `on_calibration_finished` event handler when done. Optionally a separate
+    set of targets is shown afterwards to validate the new calibration, the
+    report goes to the `on_validation_finished` event handler.
+    """
+
+    changed = Signal()
+    predictor_fitted = Signal(object)
+    targets_planned = Signal(object)
+    finished = Signal()
+
+    captures_gaze = True
+
+    def __init__(self, parent=None, event_handlers=None):
+        super().__init__(parent, event_handlers)
+
+        self._calibration_method = CalibrationMethod.GRID
+        self._pursuit_duration = 40.0
+        self._adaptive_accuracy_goal = 5.0
+        self._validate = True
+
+        self.start_delay = 2.0
+        self.total_target_time = 2.0
+        self.target_acquisition_time = 0.75
+        self.pursuit_onset_time = 0.5
+        self.pursuit_segment_duration = 1.0
+        self.target_radius = 10
+
+        self.background_color = QColor(Qt.gray)
+        self.background_color.setAlphaF(0.9)
+
+        self.collector = CalibrationCollector()
+        self.validator = None
+        self.validating = False
+        self.fitter = None
+        self.targets = []
+        self.pursuit_path = None
+        self.planner = None
+        self.calibration_idx = 0
+        self.session = None
+        self.session_start = None
+        self.target_start = None
+        self.target_duration = 0.0
+        self.clock_offset = None
+        self.status = ""
+
+        self.predictor_fitted.connect(self._on_predictor_fitted)
+        self.targets_planned.connect(self._on_targets_planned)
+
+    @property
+    def calibration_method(self) -> CalibrationMethod:
+        """
+        Static targets shown one after another, a single moving target, or
+        static targets placed where the calibration is still inaccurate.
+        """
+        return self._calibration_method
+
+    @calibration_method.setter
+    def calibration_method(self, value):
+        if isinstance(value, str):
+            value = CalibrationMethod[value]
+
+        self._calibration_method = value
+        self.changed.emit()
+
+    @property
+    def pursuit_duration(self) -> float:
+        """
+        :label Pursuit Duration (seconds)
+        :min 10
+        :max 120
+        :step 5
+        :decimals 0
+        """
+        return self._pursuit_duration
+
+    @pursuit_duration.setter
+    def pursuit_duration(self, value):
+        self._pursuit_duration = value
+        self.changed.emit()
+
+    @property
+    def adaptive_accuracy_goal(self) -> float:
+        """
+        Adaptive calibration stops once the estimated error is below this.
+
+        :label Adaptive Accuracy Goal (pixels)
+        :min 1
+        :max 100
+        :step 1
+        :decimals 0
+        """
+        return self._adaptive_accuracy_goal
+
+    @adaptive_accuracy_goal.setter
+    def adaptive_accuracy_goal(self, value):
+        self._adaptive_accuracy_goal = value
+        self.changed.emit()
+
+    @property
+    def validate(self) -> bool:
+        """
+        Show a second set of targets to measure the accuracy of the new
+        calibration.
+
+        :label Validate After Calibration
+        """
+        return self._validate
+
+    @validate.setter
+    def validate(self, value):
+        self._validate = value
+        self.changed.emit()
+
+    def activate(self):
+        super().activate()
+        self.raise_()
+
+        screen_size = self.screen().size()
+        screen_size = (screen_size.width(), screen_size.height())
+        self.targets = grid_targets(*screen_size)
+        self.planner = AdaptiveTargetPlanner(
+            *screen_size, accuracy_goal=self._adaptive_accuracy_goal
+        )
+        if self._calibration_method == CalibrationMethod.ADAPTIVE:
+            self.targets = self.planner.initial_targets
+        self.pursuit_path = PursuitPath(*screen_size, duration=self._pursuit_duration)
+
+        self.validator = CalibrationValidator(screen_size)
+
+        if self.fitter is None:
+            self.fitter = CalibrationFitter(screen_size)
+            self.fitter.start()
+
+        self.collector.clear()
+        self.validating = False
+        self.calibration_idx = 0
+        # Tags results of background work with the session they belong to
+        self.session = object()
+        self.session_start = time.time() + self.start_delay
+        self.target_start = self.session_start
+        self.target_duration = 0.0
+        self.clock_offset = None
+        self.status = "Look at the targets"
+
+    def _update_data(self, eye_tracking_data: EyeTrackingData):
+        if self.target_start is None:
+            return
+
+        if self.validating:
+            self._update_validation(eye_tracking_data)
+        elif self._calibration_method == CalibrationMethod.PURSUIT:
+            self._update_pursuit(eye_tracking_data)
+        else:
+            self._update_grid(eye_tracking_data)
+
+        self.update()
+
+    def _update_grid(self, eye_tracking_data):
+        self.target_duration = time.time() - self.target_start
+        if self.target_duration > self.total_target_time:
+            self.calibration_idx += 1
+            self.target_start = time.time()
+            self.target_duration = 0.0
+
+        if self.calibration_idx >= len(self.targets):
+            if self._calibration_method == CalibrationMethod.ADAPTIVE:
+                self._start_planning()
+            else:
+                self._start_fitting()
+            return
+
+        if self.target_duration > self.target_acquisition_time:
+            self.collector.add_sample(
+                eye_tracking_data.uncorrected_gaze,
+                eye_tracking_data.timestamp,
+                self.calibration_idx,
+                self.targets[self.calibration_idx],
+            )
+
+    def _update_validation(self, eye_tracking_data):
+        self.target_duration = time.time() - self.target_start
+        if self.target_duration > self.total_target_time:
+            self.calibration_idx += 1
+            self.target_start = time.time()
+            self.target_duration = 0.0
+
+        if self.calibration_idx >= len(self.targets):
+            self._finish_validation()
+
+        elif self.target_duration > self.target_acquisition_time:
+            # The corrected gaze, None samples count as mapping failures
+            self.validator.add_sample(
+                eye_tracking_data.gaze,
+                eye_tracking_data.timestamp,
+                self.calibration_idx,
+                self.targets[self.calibration_idx],
+            )
+
+    def _start_planning(self):
+        self.target_start = None
+        self.status = "Placing more targets..."
+
+        # Fitting the provisional models takes too long for the GUI thread
+        thread = threading.Thread(
+            target=self._plan,
+            args=(self.planner, self.collector.training_data(), len(self.targets)),
+            daemon=True,
+        )
+        thread.start()
+
+    def _plan(self, planner, training_data, n_targets):
+        try:
+            next_targets = planner.next_targets(*training_data, n_targets)
+        except Exception as exc:
+            print("Placing calibration targets failed", exc)
+            next_targets = None
+
+        # Delivered on the GUI thread through a queued connection
+        self.targets_planned.emit((planner, next_targets))
+
+    def _on_targets_planned(self, result):
+        planner, next_targets = result
+        if planner is not self.planner:
+            # Planned for a session that was restarted since
+            return
+
+        if next_targets is None:
+            self._start_fitting()
+            return
+
+        if planner.last_error is not None:
+            print(
+                f"Calibration error estimate {planner.last_error:.1f}px "
+                f"with {len(self.targets)} targets, adding {len(next_targets)}"
+            )
+        self.targets = np.vstack([self.targets, next_targets])
+        self.target_start = time.time()
+        self.target_duration = 0.0
+        self.update()
+
+    def _update_pursuit(self, eye_tracking_data):
+        self.target_duration = time.time() - self.target_start
+        if self.target_duration > self.pursuit_path.duration:
+            self._start_fitting()
+            return
+
+        if self.target_duration < self.pursuit_onset_time:
+            return
+
+        # Device timestamps are mapped onto the local clock with the offset of
+        # the first sample, the remaining latency is estimated when aligning
+        if self.clock_offset is None:
+            self.clock_offset = time.time() - eye_tracking_data.timestamp
+
+        segment = int(self.target_duration / self.pursuit_segment_duration)
+        self.collector.add_sample(
+            eye_tracking_data.uncorrected_gaze,
+            eye_tracking_data.timestamp,
+            segment,
+            self.pursuit_path.position(self.target_duration),
+        )
+
+    def _pursuit_training_data(self, samples, pursuit_path, start_time, clock_offset):
+        gaze, timestamps, segments = samples
+        if len(gaze) == 0:
+            raise ValueError("no valid gaze samples were recorded")
+
+        times = timestamps + clock_offset - start_time
+        labels, lag, mask = pursuit_path.align(gaze, times)
+
+        stats = {
+            "pursuit_lag_s": lag,
+            "n_inliers": int(mask.sum()),
+            "n_outliers": int(len(mask) - mask.sum()),
+        }
+        return (gaze[mask], labels[mask], segments[mask]), stats
+
+    def _start_fitting(self):
+        # Everything the fit needs is taken now, the settings and the next
+        # session can change the state of the mode while fitting
+        method = self._calibration_method
+        if method == CalibrationMethod.PURSUIT:
+            samples = tuple(values.copy() for values in self.collector.samples())
+            data = (samples, self.pursuit_path, self.target_start, self.clock_offset)
+        else:
+            data = self.collector.training_data()
+
+        stats = {
+            "method": method.name,
+            "session_duration_s": time.time() - self.session_start,
+        }
+        stats.update(self.collector.summary())
+        if method == CalibrationMethod.ADAPTIVE:
+            stats["planner_error_px"] = self.planner.last_error
+
+        self.target_start = None
+        self.status = "Calculating calibration..."
+
+        thread = threading.Thread(
+            target=self._fit,
+            args=(self.session, self.fitter, method, data, stats),
+            daemon=True,
+        )
+        thread.start()
+
+    def _fit(self, session, fitter, method, data, stats):
+        try:
+            if method == CalibrationMethod.PURSUIT:
+                training_data, pursuit_stats = self._pursuit_training_data(*data)
+                stats.update(pursuit_stats)
+            else:
+                training_data = data
+
+            stats["n_training_samples"] = len(training_data[0])
+            stats["samples_per_second"] = (
+                stats["n_training_samples"] / stats["session_duration_s"]
+            )
+
+            predictor = fitter.fit(*training_data)
+            predictor.fit_stats.update(stats)
+        except Exception as exc:
+            print("Calibration failed", exc)
+            predictor = None
+
+        # Delivered on the GUI thread through a queued connection
+        self.predictor_fitted.emit((session, fitter, predictor))
+
+    def _on_predictor_fitted(self, result):
+        session, fitter, predictor = result
+        if session is not self.session:
+            # Fitted for a session that was restarted since, which keeps using
+            # the fitter if it is still the current one
+            if fitter is not self.fitter:
+                fitter.close()
+            return
+
+        fitter.close()
+        self.fitter = None
+
+        if predictor is None:
+            self.finished.emit()
+            return
+
+        self.event_handlers["on_calibration_finished"](predictor)
+
+        if self._validate:
+            self._start_validation()
+        else:
+            self.finished.emit()
+
+    def _start_validation(self):
+        screen_size = self.screen().size()
+        self.targets = validation_targets(screen_size.width(), screen_size.height())
+        self.validator.clear()
+        self.validating = True
+        self.calibration_idx = 0
+        self.target_start = time.time() + self.start_delay
+        self.target_duration = 0.0
+        self.status = "Look at the targets to validate the calibration"
+        self.update()
+
+    def _finish_validation(self):
+        self.target_start = None
+        self.validating = False
+
+        try:
+            report = self.validator.report()
+        except ValueError as exc:
+            print("Validation failed", exc)
+        else:
+            self.event_handlers["on_validation_finished"](report)
+
+        self.finished.emit()
+
+    def _current_target(self):
+        pursuit = self._calibration_method == CalibrationMethod.PURSUIT
+        if pursuit and not self.validating:
+            return self.pursuit_path.position(max(self.target_duration, 0.0))
+
+        if self.calibration_idx >= len(self.targets):
+            return None
+
+        return self.targets[self.calibration_idx]
+
+    def paintEvent(self, event):
+        with QPainter(self) as painter:
+            painter.fillRect(self.rect(), self.background_color)
+
+            if self.target_start is None or self.target_start > time.time():
+                painter.setPen(Qt.white)
+                font = painter.font()
+                font.setPointSize(32)
+                painter.setFont(font)
+                painter.drawText(self.rect(), Qt.AlignCenter, self.status)
+
+            if self.target_start is None:
+                return
+
+            target = self._current_target()
+            if target is None:
+                return
+
+            if self.target_duration > self.target_acquisition_time:
+                painter.setBrush(QColor(Qt.green))
+            else:
+                painter.setBrush(QColor(Qt.red))
+
+            target = self.mapFromGlobal(QPoint(*target))
+            painter.drawEllipse(target, self.target_radius, self.target_radius)
@@ -16,7 +16,8 @@ class KeyboardMode(AppMode):
         self.keyboard.keyPressed.connect(event_handlers["on_key_pressed"])
 
     def _update_data(self, eye_tracking_data: EyeTrackingData):
-        self.keyboard.update_data(eye_tracking_data)
+        # The keys receive the gaze from the app's `GazeEventRouter`
+        pass
 
     def resize(self, size):
         super().resize(size)
@@ -37,12 +37,11 @@ class ViewMode(AppMode):
         edge_action_configs.append(a_config)
 
         self.edge_action_handler = actions.EdgeActionHandler(
-            QApplication.primaryScreen(), edge_action_configs
+            QApplication.primaryScreen(), edge_action_configs, owner=self
         )
 
     def _update_data(self, eye_tracking_data: EyeTrackingData):
         self.gaze_overlay.update_data(eye_tracking_data)
-        self.edge_action_handler.update_data(eye_tracking_data)
 
     def resize(self, size):
         super().resize(size)
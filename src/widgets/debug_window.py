@@ -1,3 +1,5 @@
+import time
+
 import numpy as np
 import cv2
 
@@ -7,6 +9,8 @@ from PySide6.QtWidgets import *
 
 from .scaled_image_view import ScaledImageView
 from image_conversion import qimage_from_frame
+from eye_tracking_provider.calibration_fitting import REGION_NAMES
+from stall_watchdog import STALL_REPORT_FILE
 
 
 class GazeView(ScaledImageView):
@@ -64,10 +68,24 @@ class GazeView(ScaledImageView):
 
 
 class DebugWindow(QWidget):
-    def __init__(self, distort_point, map_surface_to_scene_video):
+    """Shows the scene video with gaze, markers and surface, and statistics.
+
+    Latency and stall statistics are shown for the `LatencyMonitor` and
+    `StallWatchdog` that are passed, if any.
+    """
+
+    def __init__(
+        self,
+        distort_point,
+        map_surface_to_scene_video,
+        latency=None,
+        stall_watchdog=None,
+    ):
         super().__init__()
         self.distort_point = distort_point
         self.map_surface_to_scene_video = map_surface_to_scene_video
+        self.latency = latency
+        self.stall_watchdog = stall_watchdog
         self.setLayout(QVBoxLayout())
 
         self.setWindowTitle("Debug Window - Scene Camera")
@@ -81,10 +99,119 @@ class DebugWindow(QWidget):
         self.info_widget.setText("Waiting for stream...")
         self.layout().addWidget(self.info_widget)
 
+        self.latency_widget = QLabel()
+        self.latency_widget.setStyleSheet("font-family: monospace")
+        self.layout().addWidget(self.latency_widget)
+
+        stall_layout = QHBoxLayout()
+        self.stall_widget = QLabel()
+        self.stall_widget.setStyleSheet("font-family: monospace")
+        stall_layout.addWidget(self.stall_widget, stretch=1)
+        self.save_stalls_button = QPushButton("Save Stall Report")
+        self.save_stalls_button.clicked.connect(self._save_stall_report)
+        stall_layout.addWidget(self.save_stalls_button, alignment=Qt.AlignTop)
+        self.layout().addLayout(stall_layout)
+        self.latency_widget.setVisible(latency is not None)
+        self.stall_widget.setVisible(stall_watchdog is not None)
+        self.save_stalls_button.setVisible(stall_watchdog is not None)
+
+        self.stats_update_interval = 0.5
+        self.last_stats_update = 0.0
+        self.last_data = None
+
+        self.validation_widget = QLabel()
+        self.validation_widget.setStyleSheet("font-family: monospace")
+        self.validation_widget.setText("No calibration validation")
+        self.layout().addWidget(self.validation_widget)
+
+    def update_stats(self):
+        now = time.monotonic()
+        if now - self.last_stats_update < self.stats_update_interval:
+            return
+        self.last_stats_update = now
+
+        if self.latency is not None:
+            self.update_latency(self.latency)
+        if self.stall_watchdog is not None:
+            self.update_stalls(self.stall_watchdog)
+
+    def update_latency(self, latency):
+        summary = latency.summary()
+        header = "/".join(f"p{q}" for q in summary["percentiles"])
+        lines = [f"Latency {header} (ms) at {summary['rate_hz']:.1f} Hz"]
+        for stage, values in summary["stages"].items():
+            lines.append(f"{stage:>9}: " + " / ".join(f"{v:7.2f}" for v in values))
+
+        self.latency_widget.setText("\n".join(lines))
+
+    def update_stalls(self, watchdog):
+        summary = watchdog.summary()
+        header = "/".join(f"p{q}" for q in summary["percentiles"])
+        lines = [
+            f"Poll interval {header}: "
+            + " / ".join(f"{v:.1f}" for v in summary["interval_ms"])
+            + " ms, dispatch lag: "
+            + " / ".join(f"{v:.1f}" for v in summary["dispatch_lag_ms"])
+            + " ms",
+            f"Stalls: {summary['n_stalls']}",
+        ]
+
+        last_stall = summary["last_stall"]
+        if last_stall is not None:
+            duration = last_stall["duration_s"]
+            duration = "ongoing" if duration is None else f"{duration:.2f} s"
+            when = time.strftime("%H:%M:%S", time.localtime(last_stall["time"]))
+            # The innermost frames show what blocked the event loop
+            stack = last_stall["stack"].strip().splitlines()[-4:]
+            lines.append(f"Last stall at {when} ({duration}):")
+            lines.extend(stack)
+
+        self.stall_widget.setText("\n".join(lines))
+
+    def _save_stall_report(self):
+        self.stall_watchdog.dump(STALL_REPORT_FILE)
+        print(f"Stall report saved to {STALL_REPORT_FILE}")
+
+    def set_validation_report(self, report):
+        def value(number, width=0):
+            return "-".rjust(width) if number is None else f"{number:{width}.0f} px"
+
+        lines = [
+            f"Validation {report['created']}: "
+            f"accuracy {value(report['accuracy_px'])}, "
+            f"precision {value(report['precision_px'])}, "
+            f"mapping failed {report['failure_fraction']:.0%}"
+        ]
+        for row in REGION_NAMES:
+            cells = []
+            for name in row:
+                region = report["regions"].get(name, {})
+                cells.append(
+                    f"{name:>13}: {value(region.get('accuracy_px'), 4)}"
+                    f" / {region.get('failure_fraction', 0):3.0%}"
+                )
+            lines.append("  ".join(cells))
+
+        self.validation_widget.setText("\n".join(lines))
+
     def update_data(self, data):
+        # The statistics keep up while hidden, so they are current when the
+        # window is shown. Only converting and painting the frame is skipped.
+        self.update_stats()
+
         if data is None:
             return
 
+        self.last_data = data
+        if self.isVisible():
+            self.show_data(data)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.last_data is not None:
+            self.show_data(self.last_data)
+
+    def show_data(self, data):
         markers = []
         for marker in data.markers:
             corners_undist = marker.as_dict()["vertices"].values()
@@ -1,4 +1,9 @@
+import asyncio
+import threading
+import time
+
 from PySide6.QtCore import (
+    QObject,
     Signal,
     QTimer
 )
@@ -19,7 +24,9 @@ from PySide6.QtWidgets import (
     QToolButton,
 )
 
-from pupil_labs.realtime_api.simple import discover_devices
+from pupil_labs.realtime_api.discovery import Network
+
+from eye_tracking_provider import REGISTRY
 
 
 class DeviceSettingsWidget(QWidget):
@@ -36,6 +43,9 @@ class DeviceSettingsWidget(QWidget):
         self.device_port_label = QLabel()
         current_info.layout().addRow("Port", self.device_port_label)
 
+        self.connection_state_label = QLabel()
+        current_info.layout().addRow("Status", self.connection_state_label)
+
         self.disconnect_button = QPushButton("Disconnect")
         #self.disconnect_button.clicked.connect(app.companion.disconnect_device)
 
@@ -45,8 +55,6 @@ class DeviceSettingsWidget(QWidget):
         self.device_combo = DeviceCombo()
         self.device_combo.manual_entry_selected.connect(self.on_manual_entry_selected)
         self.device_combo.device_selected.connect(self.on_device_selected)
-        self.device_combo.search_started.connect(lambda: self.setEnabled(False))
-        self.device_combo.search_finished.connect(lambda: self.setEnabled(True))
 
         self.manual_host = QLineEdit()
         self.manual_host.setText("neon.local")
@@ -80,7 +88,7 @@ class DeviceSettingsWidget(QWidget):
         self.layout().addWidget(disconnected_page)
         self.layout().addWidget(connected_page)
 
-        QTimer.singleShot(100, self.device_combo.initiate_refresh)
+        self.device_combo.initiate_refresh()
 
 
     def show(self):
@@ -103,6 +111,9 @@ class DeviceSettingsWidget(QWidget):
             self.device_ip_label.setText(self.manual_host.text())
             self.device_port_label.setText(str(self.manual_port.value()))
 
+    def set_connection_state(self, state):
+        self.connection_state_label.setText(state)
+
     def on_manual_entry_selected(self):
         self.manual_host.setEnabled(True)
         self.manual_port.setEnabled(True)
@@ -116,11 +127,81 @@ class DeviceSettingsWidget(QWidget):
         self.manual_port.setValue(device_info["port"])
 
 
+class DeviceBrowser(QObject):
+    """Browses the network for devices continuously on a background thread.
+
+    Devices are reported as they announce themselves, and again when they
+    announce changes. Devices that leave the network, or whose announcement
+    expired, are reported as lost.
+    """
+
+    device_found = Signal(object)
+    device_lost = Signal(str)
+    first_device_found = Signal(float)
+
+    def __init__(self, poll_interval=0.25):
+        super().__init__()
+        self.poll_interval = poll_interval
+        self._thread = None
+        self._stop_event = threading.Event()
+
+        self._first_device_time = REGISTRY.histogram(
+            "gaze_control_discovery_first_device_seconds",
+            "Time from starting discovery until the first device was found.",
+            buckets=[0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0],
+        )
+
+    def start(self):
+        self.stop()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(self._stop_event,),
+            name="DeviceBrowser",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        # The thread finishes within a poll interval, no need to wait for it
+        self._stop_event.set()
+        self._thread = None
+
+    def _run(self, stop_event):
+        try:
+            asyncio.run(self._browse(stop_event))
+        except Exception as exc:
+            print("Device discovery failed:", exc)
+
+    async def _browse(self, stop_event):
+        start_time = time.perf_counter()
+        first_found = False
+        known = set()
+
+        async with Network() as network:
+            while not stop_event.is_set():
+                device = await network.wait_for_new_device(self.poll_interval)
+                if stop_event.is_set():
+                    break
+
+                if device is not None:
+                    known.add(device.name)
+                    self.device_found.emit(device)
+                    if not first_found:
+                        first_found = True
+                        duration = time.perf_counter() - start_time
+                        self._first_device_time.observe(duration)
+                        self.first_device_found.emit(duration)
+
+                current = {device.name for device in network.devices}
+                for name in known - current:
+                    self.device_lost.emit(name)
+                known &= current
+
+
 class DeviceCombo(QWidget):
     manual_entry_selected = Signal()
     device_selected = Signal(object)
-    search_started = Signal()
-    search_finished = Signal()
 
     def __init__(self):
         super().__init__()
@@ -133,40 +214,72 @@ class DeviceCombo(QWidget):
 
         self.refresh_button = QToolButton()
         self.refresh_button.setText("🔍")
+        self.refresh_button.setToolTip("Search for devices again")
         self.refresh_button.clicked.connect(self.initiate_refresh)
 
         self.layout().addWidget(self.combo)
         self.layout().addWidget(self.refresh_button)
 
         self.combo.currentIndexChanged.connect(self.on_index_changed)
+        # Only choices of the user, not the automatic selection
+        self.combo.activated.connect(lambda _: setattr(self, "_user_selected", True))
+        self._user_selected = False
+
+        self.browser = DeviceBrowser()
+        self.browser.device_found.connect(self.on_device_found)
+        self.browser.device_lost.connect(self.on_device_lost)
+        self.browser.first_device_found.connect(
+            lambda duration: print(f"Found the first device after {duration:.2f} s")
+        )
+        QApplication.instance().aboutToQuit.connect(self.browser.stop)
 
     def initiate_refresh(self):
-        self.combo.clear()
-        self.combo.addItem("Searching...")
-        self.search_started.emit()
-        QApplication.instance().processEvents()
-
-        devices = discover_devices(search_duration_seconds=0.5)
-        
-        self.combo.clear()
-        self.combo.addItem("Manual Entry")
-        for device in devices:
-            self.combo.addItem(
-                f"{device.phone_name} ({device.dns_name})",
-                {
-                    "phone_ip": device.phone_ip,
-                    "phone_name": device.phone_name,
-                    "address": device.address,
-                    "dns_name": device.dns_name,
-                    "full_name": device.full_name,
-                    "port": device.port,
-                }
-            )
-
-        if len(devices) == 1:
-            self.combo.setCurrentIndex(1)
-
-        self.search_finished.emit()
+        """Starts searching from scratch, devices are added as they are found."""
+        self.combo.blockSignals(True)
+        while self.combo.count() > 1:
+            self.combo.removeItem(1)
+        self.combo.setCurrentIndex(0)
+        self.combo.blockSignals(False)
+        self._user_selected = False
+
+        self.browser.start()
+
+    def _find(self, name):
+        for index in range(1, self.combo.count()):
+            if self.combo.itemData(index)["full_name"] == name:
+                return index
+        return -1
+
+    def on_device_found(self, device):
+        # Names follow 'PI monitor:<phone name>:<phone id>._http._tcp.local.'
+        phone_name = device.name.split(":")[1]
+        dns_name = device.server.rstrip(".")
+        device_info = {
+            "phone_ip": device.addresses[0],
+            "phone_name": phone_name,
+            "address": device.addresses[0],
+            "dns_name": dns_name,
+            "full_name": device.name,
+            "port": device.port,
+        }
+
+        index = self._find(device.name)
+        if index < 0:
+            self.combo.addItem(f"{phone_name} ({dns_name})", device_info)
+            index = self.combo.count() - 1
+        else:
+            self.combo.setItemData(index, device_info)
+            self.combo.setItemText(index, f"{phone_name} ({dns_name})")
+            if index == self.combo.currentIndex():
+                self.device_selected.emit(device_info)
+
+        if not self._user_selected and self.combo.currentIndex() == 0:
+            self.combo.setCurrentIndex(index)
+
+    def on_device_lost(self, name):
+        index = self._find(name)
+        if index >= 0:
+            self.combo.removeItem(index)
 
     def on_index_changed(self, index):
         selected = self.combo.currentData()
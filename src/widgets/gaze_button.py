@@ -3,7 +3,7 @@ from PySide6.QtGui import *
 from PySide6.QtWidgets import *
 from PySide6.QtMultimedia import QSoundEffect
 
-from eye_tracking_provider import EyeTrackingData
+from gaze_event_type import GazeEvent, GazeEventType
 
 
 class ButtonStyle:
@@ -37,21 +37,31 @@ class GazeButton(QPushButton):
         self.key_sound = QSoundEffect()
         self.key_sound.setSource(QUrl.fromLocalFile("key-stroke.wav"))
 
-    def update_data(self, eye_tracking_data: EyeTrackingData):
-        if not self.isVisible():
-            return
+        QApplication.instance().gaze_event_router.subscribe(self)
 
-        p = QPoint(*eye_tracking_data.gaze)
-        p = self.mapFromGlobal(p)
-        if self.rect().contains(p):
+    def gaze_event(self, event: GazeEvent):
+        if event.type == GazeEventType.GAZE_ENTER:
             self.set_hover(True)
-            self.dwell_process = eye_tracking_data.dwell_process
-            if eye_tracking_data.dwell_process == 1.0:
-                self.key_sound.play()
-                self.clicked.emit(self.code)
-        else:
+        elif event.type == GazeEventType.GAZE_EXIT:
             self.set_hover(False)
-            self.dwell_process = 0.0
+            self._set_dwell_process(0.0)
+        elif event.type == GazeEventType.GAZE_UPON:
+            self._set_dwell_process(event.eye_tracking_data.dwell_process)
+        elif event.type == GazeEventType.FIXATE:
+            self.key_sound.play()
+            self._confirm_target()
+            self.clicked.emit(self.code)
+
+    def _set_dwell_process(self, value):
+        if value != self.dwell_process:
+            self.dwell_process = value
+            self.update()
+
+    def _confirm_target(self):
+        center = self.mapToGlobal(self.rect().center())
+        QApplication.instance().eye_tracking_provider.add_confirmed_target(
+            (center.x(), center.y())
+        )
 
     def paintEvent(self, event):
         super().paintEvent(event)
@@ -69,6 +79,9 @@ class GazeButton(QPushButton):
                 painter.drawEllipse(center, size.width(), size.height())
 
     def set_hover(self, highlight):
+        if highlight == self.hover:
+            return
+
         if highlight:
             self.hover = True
             self.setStyleSheet(self.hover_style.to_css())
@@ -23,7 +23,10 @@ class GazeOverlay(QWidget):
         if eye_tracking_data.gaze is None:
             return
 
-        self.gaze = QPoint(*eye_tracking_data.gaze)
+        gaze = eye_tracking_data.predicted_gaze
+        if gaze is None:
+            gaze = eye_tracking_data.gaze
+        self.gaze = QPoint(*gaze)
         self.dwell_process = eye_tracking_data.dwell_process
         self.update()
 
@@ -117,7 +117,7 @@ class Keyboard(QWidget):
         # a.key_pressed.connect(self._toggle_caps)
 
         self.edge_action_handler = actions.EdgeActionHandler(
-            QApplication.primaryScreen(), edge_action_configs
+            QApplication.primaryScreen(), edge_action_configs, owner=self
         )
 
     def _set_page(self, value: Page, sound=True):
@@ -136,15 +136,6 @@ class Keyboard(QWidget):
                 for key in keys:
                     key.setVisible(False)
 
-    def update_data(self, eye_tracking_data):
-        if eye_tracking_data.gaze is None:
-            return
-
-        for key in self.keys:
-            key.update_data(eye_tracking_data)
-
-        self.edge_action_handler.update_data(eye_tracking_data)
-
     def _toggle_caps(self):
         if self.current_page == Page.CAPS:
             self._set_page(Page.LETTERS)
@@ -1,10 +1,8 @@
-import time
-
 from PySide6.QtCore import *
 from PySide6.QtGui import *
 from PySide6.QtWidgets import *
 
-from eye_tracking_provider import EyeTrackingData
+from gaze_event_type import GazeEvent, GazeEventType
 from widgets.gaze_button import GazeButton, ButtonStyle
 
 
@@ -15,7 +13,10 @@ class ModeMenuPermanent(QWidget):
         super().__init__(parent)
 
         self.disappear_timeout = 3.0
-        self.lost_focus_at = None
+        # Runs while the gaze is not on the menu
+        self.disappear_timer = QTimer(self)
+        self.disappear_timer.setSingleShot(True)
+        self.disappear_timer.timeout.connect(lambda: self.setVisible(False))
 
         layout = QGridLayout()
         layout.setSpacing(0)
@@ -40,38 +41,25 @@ class ModeMenuPermanent(QWidget):
 
         self.setLayout(layout)
 
-        self.mode_change = False
-        for btn in self.buttons:
-            btn.clicked.connect(self.on_button_clicked)
-
         op = QGraphicsOpacityEffect(self)
         op.setOpacity(0.5)
         self.setGraphicsEffect(op)
         self.setAutoFillBackground(True)
 
-    def on_button_clicked(self):
-        self.mode_change = True
-
-    def update_data(self, eye_tracking_data: EyeTrackingData):
-        if eye_tracking_data is None:
-            return
+        QApplication.instance().gaze_event_router.subscribe(
+            self, [GazeEventType.GAZE_ENTER, GazeEventType.GAZE_EXIT]
+        )
 
-        self.mode_change = False
-        if self.isVisible():
-            if eye_tracking_data.gaze is None:
-                return
+    def gaze_event(self, event: GazeEvent):
+        if event.type == GazeEventType.GAZE_ENTER:
+            self.disappear_timer.stop()
+        elif event.type == GazeEventType.GAZE_EXIT and self.isVisible():
+            self.disappear_timer.start(self.disappear_timeout * 1000)
 
-            for btn in self.buttons:
-                btn.update_data(eye_tracking_data)
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.disappear_timer.start(self.disappear_timeout * 1000)
 
-            gaze = QPoint(*eye_tracking_data.gaze)
-            p = self.mapFromGlobal(gaze)
-            if self.rect().contains(p):
-                self.lost_focus_at = None
-            else:
-                if self.lost_focus_at is None:
-                    self.lost_focus_at = time.time()
-                else:
-                    if time.time() - self.lost_focus_at > self.disappear_timeout:
-                        self.setVisible(False)
-                        self.lost_focus_at = None
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.disappear_timer.stop()
@@ -0,0 +1,80 @@
+import math
+
+import numpy as np
+
+from eye_tracking_provider import CalibrationCollector
+
+TARGETS = [(100.0, 100.0), (900.0, 500.0)]
+
+
+def fixations(collector, n_samples=20, seed=0):
+    """Noisy gaze on each target in turn, with unique timestamps."""
+    rng = np.random.default_rng(seed)
+    timestamp = 0.0
+    for target_idx, target in enumerate(TARGETS):
+        for _ in range(n_samples):
+            timestamp += 0.005
+            gaze = np.asarray(target) + rng.normal(0, 3.0, 2)
+            collector.add_sample(gaze, timestamp, target_idx, target)
+    return timestamp
+
+
+def test_far_off_samples_are_rejected_per_target():
+    collector = CalibrationCollector()
+    timestamp = fixations(collector)
+    collector.add_sample((400.0, 100.0), timestamp + 0.005, 0, TARGETS[0])
+    collector.add_sample((900.0, 540.0), timestamp + 0.01, 1, TARGETS[1])
+
+    mask = collector.inlier_mask()
+    assert mask[:-2].all()
+    assert not mask[-2:].any()
+
+    gaze, targets, target_indices = collector.training_data()
+    assert len(gaze) == len(targets) == 40
+    assert np.bincount(target_indices).tolist() == [20, 20]
+    assert collector.summary() == {
+        "n_samples": 42,
+        "n_inliers": 40,
+        "n_outliers": 2,
+        "n_invalid": 0,
+    }
+
+
+def test_targets_with_few_or_identical_samples_keep_all_of_them():
+    collector = CalibrationCollector()
+    collector.add_sample((100.0, 100.0), 0.0, 0, TARGETS[0])
+    collector.add_sample((600.0, 100.0), 0.1, 0, TARGETS[0])
+    for i in range(5):
+        collector.add_sample(TARGETS[1], 1.0 + i, 1, TARGETS[1])
+
+    assert collector.inlier_mask().all()
+
+
+def test_invalid_and_repeated_samples_are_not_stored():
+    collector = CalibrationCollector()
+    assert collector.add_sample((100.0, 100.0), 0.0, 0, TARGETS[0])
+    assert not collector.add_sample((101.0, 100.0), 0.0, 0, TARGETS[0])
+    assert not collector.add_sample(None, 0.1, 0, TARGETS[0])
+    assert not collector.add_sample((math.nan, 100.0), 0.2, 0, TARGETS[0])
+
+    assert collector.n_samples == 1
+    assert collector.summary()["n_invalid"] == 2
+
+    collector.clear()
+    assert collector.summary() == {
+        "n_samples": 0,
+        "n_inliers": 0,
+        "n_outliers": 0,
+        "n_invalid": 0,
+    }
+
+
+def test_storage_grows_beyond_the_capacity():
+    collector = CalibrationCollector(capacity=4)
+    fixations(collector, n_samples=10)
+
+    gaze, targets, _ = collector.training_data()
+    assert collector.n_samples == 20
+    np.testing.assert_allclose(targets[:10], [TARGETS[0]] * 10)
+    np.testing.assert_allclose(targets[10:], [TARGETS[1]] * 10)
+    assert np.abs(gaze - targets).max() < 20
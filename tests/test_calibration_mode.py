@@ -0,0 +1,114 @@
+import time
+import types
+
+import numpy as np
+import pytest
+
+from eye_tracking_provider import CalibrationFitter, LatencyMonitor
+from widgets.app_modes.calibration_mode import CalibrationMethod, CalibrationMode
+
+CANDIDATES = [("polynomial", {"degree": 2, "alpha": 1e-6})]
+
+
+class SerialFitter(CalibrationFitter):
+    """Fits in the calling thread and counts how often it was closed."""
+
+    def __init__(self, screen_size):
+        super().__init__(screen_size, CANDIDATES, max_workers=0)
+        self.n_closed = 0
+
+    def close(self):
+        self.n_closed += 1
+        super().close()
+
+
+@pytest.fixture
+def mode(qapp, monkeypatch):
+    # Modes report their paints to the latency monitor of the app
+    provider = types.SimpleNamespace(latency=LatencyMonitor())
+    monkeypatch.setattr(qapp, "eye_tracking_provider", provider, raising=False)
+
+    predictors = []
+    mode = CalibrationMode(
+        event_handlers={
+            "on_calibration_finished": predictors.append,
+            "on_validation_finished": lambda report: None,
+        }
+    )
+    mode.predictors = predictors
+    mode.calibration_method = CalibrationMethod.GRID
+    mode.validate = False
+    yield mode
+    mode.deactivate()
+
+
+def start_session(mode):
+    if mode.fitter is None:
+        screen_size = mode.screen().size()
+        mode.fitter = SerialFitter((screen_size.width(), screen_size.height()))
+    mode.activate()
+
+
+def look_at_targets(mode, offset=(20.0, -10.0)):
+    timestamp = 0.0
+    for target_idx, target in enumerate(mode.targets):
+        for _ in range(10):
+            timestamp += 0.005
+            gaze = target + offset + np.random.normal(0, 1.0, 2)
+            mode.collector.add_sample(gaze, timestamp, target_idx, target)
+
+
+def wait_for_fit(qapp, mode, n_results):
+    results = []
+    mode.predictor_fitted.connect(results.append)
+    deadline = time.monotonic() + 10.0
+    while len(results) < n_results and time.monotonic() < deadline:
+        qapp.processEvents()
+    mode.predictor_fitted.disconnect(results.append)
+    assert len(results) == n_results
+
+
+def test_the_fitted_predictor_ends_the_session(qapp, mode):
+    start_session(mode)
+    look_at_targets(mode)
+    fitter = mode.fitter
+    mode._start_fitting()
+    wait_for_fit(qapp, mode, 1)
+
+    (predictor,) = mode.predictors
+    assert predictor.fit_stats["method"] == "GRID"
+    assert predictor.fit_stats["n_samples"] == 10 * len(mode.targets)
+    np.testing.assert_allclose(
+        predictor.predict_point(tuple(mode.targets[0] + (20.0, -10.0))),
+        mode.targets[0],
+        atol=2.0,
+    )
+    assert mode.fitter is None
+    assert fitter.n_closed == 1
+
+
+def test_a_fit_of_a_restarted_session_is_dropped(qapp, mode):
+    start_session(mode)
+    look_at_targets(mode)
+    fitter = mode.fitter
+    mode._start_fitting()
+    # Calibrating again while the first session is still fitting
+    start_session(mode)
+    wait_for_fit(qapp, mode, 1)
+
+    assert mode.predictors == []
+    assert mode.fitter is fitter
+    assert fitter.n_closed == 0
+
+    look_at_targets(mode, offset=(-30.0, 5.0))
+    mode._start_fitting()
+    wait_for_fit(qapp, mode, 1)
+
+    (predictor,) = mode.predictors
+    np.testing.assert_allclose(
+        predictor.predict_point(tuple(mode.targets[0] + (-30.0, 5.0))),
+        mode.targets[0],
+        atol=2.0,
+    )
+    assert mode.fitter is None
+    assert fitter.n_closed == 1
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from eye_tracking_provider import AdaptiveTargetPlanner, PursuitPath, grid_targets
+
+SCREEN_SIZE = (1920, 1080)
+RATE = 200.0
+
+
+def test_grid_targets_are_on_the_screen():
+    width, height = SCREEN_SIZE
+    targets = grid_targets(width, height)
+
+    assert len(np.unique(targets, axis=0)) == len(targets)
+    assert (targets >= 0).all()
+    assert (targets[:, 0] <= width).all() and (targets[:, 1] <= height).all()
+
+
+def test_pursuit_target_moves_smoothly_within_the_padding():
+    path = PursuitPath(*SCREEN_SIZE, padding=0.05)
+    times = np.arange(0.0, path.duration, 1 / RATE)
+    positions = path.position(times)
+
+    np.testing.assert_allclose(path.position(0.0), [96.0, 54.0])
+    assert positions.min(axis=0) == pytest.approx([96.0, 54.0])
+    assert positions.max(axis=0) == pytest.approx([1824.0, 1026.0], abs=0.5)
+    speeds = np.linalg.norm(np.diff(positions, axis=0), axis=1) * RATE
+    assert speeds.max() < 1000.0
+    # The target stays at the end once the duration is over
+    np.testing.assert_allclose(path.position(50.0), path.position(path.duration))
+
+
+def test_alignment_finds_the_lag_of_the_gaze():
+    path = PursuitPath(*SCREEN_SIZE, duration=10.0)
+    rng = np.random.default_rng(0)
+    times = np.arange(0.3, 10.0, 1 / RATE)
+    # Affine gaze error on top of the lag behind the target
+    gaze = path.position(times - 0.1) * 1.03 + [20.0, -35.0]
+    gaze += rng.normal(0, 2.0, gaze.shape)
+    # A catch-up saccade
+    gaze[500:510] += [200.0, 0.0]
+
+    labels, lag, mask = path.align(gaze, times)
+
+    assert lag == pytest.approx(0.1, abs=1 / 120)
+    np.testing.assert_allclose(labels, path.position(times - lag))
+    assert not mask[500:510].any()
+    assert np.count_nonzero(mask) > 0.9 * len(times)
+
+
+def fixation_data(targets, error=lambda points: 0.0, samples_per_target=10, seed=0):
+    rng = np.random.default_rng(seed)
+    target_indices = np.repeat(np.arange(len(targets)), samples_per_target)
+    points = np.asarray(targets)[target_indices]
+    gaze = points + error(points) + rng.normal(0, 1.0, points.shape)
+    return gaze, points, target_indices
+
+
+def test_planning_starts_with_the_initial_grid():
+    planner = AdaptiveTargetPlanner(*SCREEN_SIZE)
+    empty = np.empty((0, 2))
+    targets = planner.next_targets(empty, empty, np.empty(0, dtype=int), 0)
+    np.testing.assert_allclose(targets, planner.initial_targets)
+
+    # Initial targets without data are shown again
+    gaze, points, target_indices = fixation_data(planner.initial_targets[:4])
+    targets = planner.next_targets(gaze, points, target_indices, 9)
+    np.testing.assert_allclose(targets, planner.initial_targets[4:])
+
+
+def test_new_targets_are_placed_where_the_error_is_largest():
+    planner = AdaptiveTargetPlanner(*SCREEN_SIZE, batch_size=3)
+    corner = np.array([1700.0, 950.0])
+
+    def error(points):
+        distance = np.linalg.norm(points - corner, axis=1, keepdims=True)
+        return 80.0 * np.exp(-((distance / 300.0) ** 2)) * [1.0, -1.0]
+
+    data = fixation_data(planner.initial_targets, error)
+    targets = planner.next_targets(*data, 9)
+
+    assert len(targets) == 3
+    assert planner.last_error > planner.accuracy_goal
+    assert (targets.mean(axis=0) > np.array(SCREEN_SIZE) / 2).all()
+
+
+def test_planning_stops_when_accurate_or_at_the_max_targets():
+    planner = AdaptiveTargetPlanner(*SCREEN_SIZE)
+    data = fixation_data(planner.candidates[::9])
+
+    assert planner.next_targets(*data, 16) is None
+    assert planner.last_error < planner.accuracy_goal
+    assert planner.next_targets(*data, planner.max_targets) is None
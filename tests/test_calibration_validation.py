@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from eye_tracking_provider import (
+    CalibrationValidator,
+    load_validation_report,
+    save_validation_report,
+    validation_targets,
+)
+
+SCREEN_SIZE = (1920, 1080)
+
+
+def validate(offset=(3.0, 4.0), samples_per_target=10, failed_targets=()):
+    """Gaze off by `offset`, unmapped on `failed_targets` every other sample."""
+    validator = CalibrationValidator(SCREEN_SIZE, capacity=16)
+    timestamp = 0.0
+    for target_idx, target in enumerate(validation_targets(*SCREEN_SIZE)):
+        for i in range(samples_per_target):
+            timestamp += 0.005
+            gaze = target + offset
+            if target_idx in failed_targets and i % 2 == 0:
+                gaze = None
+            validator.add_sample(gaze, timestamp, target_idx, target)
+    return validator
+
+
+def test_validation_targets_cover_every_region():
+    report = validate().report()
+
+    assert report["n_targets"] == 12
+    assert report["n_samples"] == 120
+    assert report["accuracy_px"] == pytest.approx(5.0)
+    assert report["precision_px"] == pytest.approx(0.0)
+    assert len(report["regions"]) == 9
+    for region in report["regions"].values():
+        assert region["accuracy_px"] == pytest.approx(5.0)
+        assert region["failure_fraction"] == 0.0
+
+
+def test_unmapped_gaze_counts_as_failed():
+    report = validate(failed_targets=[0]).report()
+
+    assert report["failure_fraction"] == pytest.approx(5 / 120)
+    assert report["regions"]["top-left"]["failure_fraction"] == pytest.approx(0.5)
+    assert report["regions"]["bottom-right"]["failure_fraction"] == 0.0
+    # Failed samples do not affect the accuracy of the others
+    assert report["accuracy_px"] == pytest.approx(5.0)
+
+
+def test_repeated_samples_are_ignored():
+    validator = CalibrationValidator(SCREEN_SIZE)
+    validator.add_sample((100.0, 100.0), 1.0, 0, (100.0, 100.0))
+    validator.add_sample((200.0, 100.0), 1.0, 0, (100.0, 100.0))
+    assert validator.n_samples == 1
+
+
+def test_a_report_needs_samples():
+    with pytest.raises(ValueError):
+        CalibrationValidator(SCREEN_SIZE).report()
+
+
+def test_saved_reports_are_rounded(tmp_path):
+    path = str(tmp_path / "predictor_validation.json")
+    report = validate(offset=(1 / 3, 0.0)).report()
+    save_validation_report(report, path)
+    loaded = load_validation_report(path)
+
+    assert loaded["accuracy_px"] == 0.33
+    assert loaded["regions"]["middle-center"]["accuracy_px"] == 0.33
+    assert loaded["n_samples"] == report["n_samples"]
+    assert loaded["created"] == report["created"]
+    assert np.isclose(loaded["failure_fraction"], 0.0)
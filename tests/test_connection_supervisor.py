@@ -0,0 +1,128 @@
+import time
+import types
+
+import pytest
+
+from eye_tracking_provider import ConnectionState, ConnectionSupervisor, StreamHealth
+from eye_tracking_provider import connection_supervisor
+
+ADDRESS = ("192.168.1.20", 8080)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeReceiver:
+    def __init__(self):
+        self.health = StreamHealth()
+        self.device = types.SimpleNamespace(phone_id="abc123")
+        self.reachable = False
+        self.connected_to = []
+
+    def detach_device(self):
+        return None
+
+    def connect(self, ip=None, port=None):
+        self.connected_to.append((ip, port))
+        return (ip, port) if self.reachable else None
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(
+        connection_supervisor, "time", types.SimpleNamespace(monotonic=clock.monotonic)
+    )
+    return clock
+
+
+@pytest.fixture
+def receiver(monkeypatch):
+    receiver = FakeReceiver()
+    monkeypatch.setattr(
+        connection_supervisor, "is_reachable", lambda ip, port: receiver.reachable
+    )
+    monkeypatch.setattr(connection_supervisor, "_discover_address", lambda *a: None)
+    return receiver
+
+
+def check(qapp, supervisor):
+    """Runs a check and waits for the search for the device it started."""
+    supervisor._check()
+    deadline = time.monotonic() + 5.0
+    while supervisor._searching and time.monotonic() < deadline:
+        qapp.processEvents()
+    assert not supervisor._searching
+
+
+def test_reconnect_attempts_back_off_exponentially(qapp, clock, receiver):
+    supervisor = ConnectionSupervisor(receiver)
+    supervisor.max_reconnect_interval = 4.0
+    supervisor.on_connected(ADDRESS)
+    supervisor.timer.stop()
+    for _ in range(10):
+        receiver.health.add_frame()
+        clock.now += 1 / 30
+    check(qapp, supervisor)
+    assert supervisor.state == ConnectionState.CONNECTED
+
+    clock.now += supervisor.stall_timeout + 0.1
+    attempts = []
+    for _ in range(6):
+        check(qapp, supervisor)
+        attempts.append(clock.now)
+        assert supervisor.state == ConnectionState.RECONNECTING
+        # Nothing is tried before the next attempt is due
+        clock.now = supervisor._next_attempt - 0.01
+        supervisor._check()
+        assert not supervisor._searching
+        clock.now = supervisor._next_attempt
+
+    intervals = [round(b - a, 6) for a, b in zip(attempts, attempts[1:])]
+    assert intervals == [0.5, 1.0, 2.0, 4.0, 4.0]
+
+    receiver.reachable = True
+    check(qapp, supervisor)
+    assert supervisor.state == ConnectionState.CONNECTED
+    assert receiver.connected_to[-1] == ADDRESS
+
+
+def test_a_low_frame_rate_counts_as_broken(qapp, clock, receiver):
+    supervisor = ConnectionSupervisor(receiver)
+    supervisor.on_connected(ADDRESS)
+    supervisor.timer.stop()
+    states = []
+    supervisor.state_changed.connect(states.append)
+
+    for _ in range(20):
+        clock.now += 0.5
+        receiver.health.add_frame()
+        supervisor._check()
+        if supervisor.state != ConnectionState.CONNECTED:
+            break
+
+    assert states == [ConnectionState.RECONNECTING]
+    supervisor.stop()
+    assert supervisor.state == ConnectionState.DISCONNECTED
+
+
+def test_stream_health_measures_rate_and_jitter(clock):
+    health = StreamHealth()
+    assert health.time_since_last_frame() == float("inf")
+
+    health.reset()
+    for interval in [0.03, 0.04] * 20:
+        clock.now += interval
+        health.add_frame()
+
+    # 1 / 0.035 frames per second on average
+    assert health.frame_rate(window=1.0) == pytest.approx(28.5, abs=1.0)
+    assert health.jitter() == pytest.approx(0.005, abs=1e-4)
+    assert health.observed_for() == pytest.approx(1.4)
+    clock.now += 0.25
+    assert health.time_since_last_frame() == pytest.approx(0.25)
@@ -0,0 +1,36 @@
+import types
+
+import numpy as np
+import pytest
+
+from eye_tracking_provider import LatencyMonitor
+from widgets.debug_window import DebugWindow
+
+
+@pytest.fixture
+def window(qapp):
+    latency = LatencyMonitor()
+    latency.start_sample()
+    latency.mark("receive")
+    window = DebugWindow(lambda point: point, lambda point, transform: point, latency)
+    yield window
+    window.close()
+
+
+def scene_data():
+    scene = types.SimpleNamespace(bgr_pixels=np.zeros((120, 160, 3), np.uint8))
+    return types.SimpleNamespace(markers=[], scene=scene, raw_gaze=None)
+
+
+def test_statistics_are_updated_while_hidden(window):
+    window.update_data(None)
+
+    assert window.latency_widget.text().startswith("Latency")
+
+
+def test_frames_are_shown_once_the_window_is(window):
+    window.update_data(scene_data())
+    assert window.gaze_view.image is None
+
+    window.show()
+    assert window.gaze_view.image.width() == 160
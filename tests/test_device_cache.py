@@ -0,0 +1,88 @@
+import json
+import socket
+
+import numpy as np
+
+from eye_tracking_provider import DeviceCache
+from eye_tracking_provider.device_cache import (
+    is_reachable,
+    same_scene_calibration,
+    scene_calibration_from_arrays,
+)
+
+CAMERA_MATRIX = [[890.0, 0.0, 800.0], [0.0, 890.0, 600.0], [0.0, 0.0, 1.0]]
+DISTORTION = [-0.13, 0.11, 0.0, 0.0, 0.0, 0.17, 0.08, 0.02]
+
+
+def calibration(serial="abc123", camera_matrix=CAMERA_MATRIX):
+    return scene_calibration_from_arrays(serial, camera_matrix, DISTORTION)
+
+
+def test_entries_are_kept_on_disk(tmp_path):
+    path = str(tmp_path / "device_cache.json")
+    cache = DeviceCache(path)
+    cache.update("abc123", scene_calibration=calibration())
+    cache.update("abc123", address=("192.168.1.20", 8080))
+
+    loaded = DeviceCache(path)
+    assert same_scene_calibration(loaded.scene_calibration("abc123"), calibration())
+    assert loaded.scene_calibration("abc123")["serial"][0] == b"abc123"
+    assert loaded.address("abc123") == ("192.168.1.20", 8080)
+    assert loaded.last_address() == ("192.168.1.20", 8080)
+
+
+def test_last_address_is_the_most_recently_connected_device(tmp_path):
+    cache = DeviceCache(str(tmp_path / "device_cache.json"))
+    assert cache.last_address() is None
+
+    cache.update("abc123", address=("192.168.1.20", 8080))
+    cache.update("def456", address=("192.168.1.21", 8080))
+    cache.update("abc123", scene_calibration=calibration())
+
+    assert cache.last_address() == ("192.168.1.21", 8080)
+
+
+def test_unknown_and_default_devices_are_not_cached(tmp_path):
+    path = tmp_path / "device_cache.json"
+    cache = DeviceCache(str(path))
+    cache.update("default", address=("127.0.0.1", 8080))
+    cache.update(None, scene_calibration=calibration())
+
+    assert not path.exists()
+    assert cache.scene_calibration("default") is None
+    assert cache.address("abc123") is None
+
+
+def test_missing_and_invalid_cache_files_are_ignored(tmp_path, capsys):
+    assert DeviceCache(str(tmp_path / "missing.json")).last_address() is None
+    assert capsys.readouterr().out == ""
+
+    for content in ["{not json", json.dumps([1, 2, 3])]:
+        path = tmp_path / "device_cache.json"
+        path.write_text(content)
+        cache = DeviceCache(str(path))
+        assert cache.last_address() is None
+        assert "Ignoring invalid device cache" in capsys.readouterr().out
+
+        cache.update("abc123", address=("192.168.1.20", 8080))
+        assert DeviceCache(str(path)).last_address() == ("192.168.1.20", 8080)
+
+
+def test_recalibrated_cameras_are_detected():
+    recalibrated = np.array(CAMERA_MATRIX)
+    recalibrated[0, 0] += 5.0
+
+    assert same_scene_calibration(calibration(), calibration("def456"))
+    assert not same_scene_calibration(
+        calibration(), calibration(camera_matrix=recalibrated)
+    )
+
+
+def test_reachability_is_checked_with_a_connection():
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        port = server.getsockname()[1]
+        assert is_reachable("127.0.0.1", port)
+
+    assert not is_reachable("127.0.0.1", port, timeout=0.1)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from eye_tracking_provider import DriftCorrector
+
+SCREEN_SIZE = (1920, 1080)
+TARGETS = [(200.0, 150.0), (1700.0, 200.0), (960.0, 540.0), (300.0, 900.0)]
+
+
+def select_targets(corrector, drift, n_selections=40):
+    """Confirms selections of the targets while the gaze is off by `drift`."""
+    for i in range(n_selections):
+        target = TARGETS[i % len(TARGETS)]
+        gaze = corrector.apply(drift(target))
+        corrector.add_sample(gaze, target)
+
+
+def test_constant_drift_is_corrected():
+    corrector = DriftCorrector(SCREEN_SIZE)
+    select_targets(corrector, lambda p: (p[0] + 25.0, p[1] - 15.0))
+
+    assert corrector.apply((825.0, 385.0)) == pytest.approx((800.0, 400.0), abs=0.5)
+
+
+def test_drift_that_depends_on_the_screen_position_is_corrected():
+    corrector = DriftCorrector(SCREEN_SIZE)
+    select_targets(corrector, lambda p: (p[0] * 1.02 + 10.0, p[1] + p[0] * 0.01))
+
+    x, y = 1200.0, 700.0
+    gaze = (x * 1.02 + 10.0, y + x * 0.01)
+    assert corrector.apply(gaze) == pytest.approx((x, y), abs=2.0)
+
+
+def test_gaze_is_unchanged_until_a_selection_was_confirmed():
+    corrector = DriftCorrector(SCREEN_SIZE)
+    assert corrector.apply((100.0, 200.0)) == (100.0, 200.0)
+    assert corrector.apply(None) is None
+
+    select_targets(corrector, lambda p: (p[0] + 25.0, p[1]))
+    corrector.enabled = False
+    assert corrector.apply((100.0, 200.0)) == (100.0, 200.0)
+
+    corrector.enabled = True
+    corrector.reset()
+    assert corrector.apply((100.0, 200.0)) == (100.0, 200.0)
+
+
+def test_selections_far_from_the_target_are_ignored():
+    corrector = DriftCorrector(SCREEN_SIZE)
+    assert not corrector.add_sample((500.0, 500.0), (700.0, 500.0))
+    assert corrector.n_updates == 0
+
+    corrector.enabled = False
+    assert not corrector.add_sample((690.0, 500.0), (700.0, 500.0))
+
+
+def test_correction_is_limited():
+    corrector = DriftCorrector(SCREEN_SIZE)
+    corrector.max_residual = 500
+    select_targets(corrector, lambda p: (p[0] + 300.0, p[1]))
+
+    offset = corrector.correction((960.0, 540.0))
+    assert np.hypot(*offset) == pytest.approx(corrector.max_correction)
@@ -0,0 +1,268 @@
+import pytest
+from PySide6.QtCore import QPoint, QRectF
+from PySide6.QtGui import QPolygonF
+from PySide6.QtWidgets import QWidget
+
+from eye_tracking_provider import EyeTrackingData
+from gaze_event_router import GazeEventRouter
+from gaze_event_type import GazeEventType
+
+ENTER = GazeEventType.GAZE_ENTER
+EXIT = GazeEventType.GAZE_EXIT
+UPON = GazeEventType.GAZE_UPON
+FIXATE = GazeEventType.FIXATE
+
+
+def sample(x, y, dwell_process=0.0):
+    gaze = None if x is None else (x, y)
+    return EyeTrackingData(0.0, gaze, [], dwell_process, None, None, [], None, gaze)
+
+
+def sample_on(widget, dwell_process=0.0, x=50, y=50):
+    """A sample at (`x`, `y`) in the coordinates of `widget`."""
+    point = widget.mapToGlobal(QPoint(x, y))
+    return sample(point.x(), point.y(), dwell_process)
+
+
+class Log:
+    """Collects the events of several targets as (name, event type) pairs."""
+
+    def __init__(self):
+        self.events = []
+
+    def handler(self, name):
+        return lambda event: self.events.append((name, event.type))
+
+    def take(self):
+        events = self.events
+        self.events = []
+        return events
+
+
+@pytest.fixture
+def window(qapp):
+    window = QWidget()
+    window.setGeometry(0, 0, 800, 600)
+    window.show()
+    qapp.processEvents()
+    yield window
+    window.close()
+    window.deleteLater()
+
+
+def child(parent, x, y, width=100, height=100):
+    widget = QWidget(parent)
+    widget.setGeometry(x, y, width, height)
+    widget.show()
+    return widget
+
+
+def test_enter_and_exit_swap_when_the_gaze_moves_between_widgets(window):
+    router = GazeEventRouter()
+    log = Log()
+    a = child(window, 0, 0)
+    b = child(window, 300, 0)
+    router.subscribe(a, handler=log.handler("a"))
+    router.subscribe(b, handler=log.handler("b"))
+
+    router.dispatch(sample_on(a))
+    assert log.take() == [("a", ENTER), ("a", UPON)]
+
+    router.dispatch(sample_on(a, x=60))
+    assert log.take() == [("a", UPON)]
+
+    router.dispatch(sample_on(b))
+    assert log.take() == [("a", EXIT), ("b", ENTER), ("b", UPON)]
+
+    router.dispatch(sample(200, 50))
+    assert log.take() == [("b", EXIT)]
+
+
+def test_events_carry_global_and_local_positions(window):
+    router = GazeEventRouter()
+    events = []
+    widget = child(window, 300, 200)
+    router.subscribe(widget, events=[UPON], handler=events.append)
+
+    point = widget.mapToGlobal(QPoint(10, 50))
+    router.dispatch(sample(point.x() + 0.7, point.y() + 0.2))
+
+    assert len(events) == 1
+    assert events[0].global_pos == point
+    assert events[0].pos == QPoint(10, 50)
+
+
+def test_only_subscribed_event_types_are_delivered(window):
+    router = GazeEventRouter()
+    log = Log()
+    widget = child(window, 0, 0)
+    router.subscribe(widget, events=[ENTER, EXIT], handler=log.handler("w"))
+
+    router.dispatch(sample_on(widget))
+    router.dispatch(sample_on(widget, 1.0))
+    router.dispatch(sample(500, 500))
+
+    assert log.take() == [("w", ENTER), ("w", EXIT)]
+
+
+def test_fixate_is_dispatched_when_the_dwell_completes(window):
+    router = GazeEventRouter()
+    log = Log()
+    a = child(window, 0, 0)
+    b = child(window, 300, 0)
+    router.subscribe(a, handler=log.handler("a"))
+    router.subscribe(b, events=[ENTER, EXIT, UPON], handler=log.handler("b"))
+
+    router.dispatch(sample_on(a, 0.5))
+    assert ("a", FIXATE) not in log.take()
+
+    router.dispatch(sample_on(a, 1.0))
+    assert log.take() == [("a", UPON), ("a", FIXATE)]
+
+    router.dispatch(sample_on(b, 1.0))
+    assert ("b", FIXATE) not in log.take()
+
+
+def test_samples_without_gaze_keep_the_hovered_targets(window):
+    router = GazeEventRouter()
+    log = Log()
+    widget = child(window, 0, 0)
+    router.subscribe(widget, handler=log.handler("w"))
+
+    router.dispatch(sample_on(widget))
+    log.take()
+    router.dispatch(sample(None, None))
+    router.dispatch(None)
+    assert log.take() == []
+
+    router.dispatch(sample_on(widget))
+    assert log.take() == [("w", UPON)]
+
+
+def test_blocked_widgets_are_treated_as_if_the_gaze_was_not_on_them(window):
+    router = GazeEventRouter()
+    log = Log()
+    mode = child(window, 0, 0, 400, 400)
+    key = child(mode, 0, 0)
+    menu = child(window, 500, 0)
+    router.subscribe(key, handler=log.handler("key"))
+    router.subscribe(menu, handler=log.handler("menu"))
+    edge = router.add_region(
+        QPolygonF(QRectF(-100, 0, 100, 100)), log.handler("edge"), owner=mode
+    )
+
+    router.dispatch(sample_on(key))
+    assert log.take() == [("key", ENTER), ("key", UPON)]
+
+    # Paused: the mode and its children get no events, other widgets still do
+    router.dispatch(sample_on(key, 1.0), blocked=mode)
+    assert log.take() == [("key", EXIT)]
+    router.dispatch(sample(-50, 50), blocked=mode)
+    assert log.take() == []
+    router.dispatch(sample_on(menu), blocked=mode)
+    assert log.take() == [("menu", ENTER), ("menu", UPON)]
+
+    router.dispatch(sample_on(key))
+    assert log.take() == [("menu", EXIT), ("key", ENTER), ("key", UPON)]
+
+    router.remove_region(edge)
+
+
+def test_widgets_of_a_mode_receive_exit_when_the_mode_is_switched(qapp, window):
+    router = GazeEventRouter()
+    log = Log()
+    view = child(window, 0, 0, 400, 400)
+    keyboard = child(window, 0, 0, 400, 400)
+    keyboard.hide()
+    view_button = child(view, 0, 0)
+    key = child(keyboard, 0, 0)
+    router.subscribe(view_button, handler=log.handler("view"))
+    router.subscribe(key, handler=log.handler("key"))
+
+    router.dispatch(sample_on(view_button))
+    assert log.take() == [("view", ENTER), ("view", UPON)]
+
+    view.hide()
+    keyboard.show()
+    qapp.processEvents()
+
+    router.dispatch(sample_on(key))
+    assert log.take() == [("view", EXIT), ("key", ENTER), ("key", UPON)]
+
+
+def test_unsubscribed_widgets_receive_no_events(window):
+    router = GazeEventRouter()
+    log = Log()
+    widget = child(window, 0, 0)
+    router.subscribe(widget, handler=log.handler("w"))
+
+    router.dispatch(sample_on(widget))
+    log.take()
+    router.unsubscribe(widget)
+    router.dispatch(sample_on(widget))
+    router.dispatch(sample(500, 500))
+
+    assert log.take() == []
+
+
+def test_regions_are_only_active_while_their_owner_is_visible(window):
+    router = GazeEventRouter()
+    log = Log()
+    owner = child(window, 0, 0)
+    region = router.add_region(
+        QPolygonF(QRectF(-100, 0, 100, 100)),
+        log.handler("edge"),
+        events=[ENTER, EXIT],
+        owner=owner,
+    )
+
+    router.dispatch(sample(-50, 50))
+    assert log.take() == [("edge", ENTER)]
+
+    owner.hide()
+    router.dispatch(sample(-50, 50))
+    assert log.take() == [("edge", EXIT)]
+
+    owner.show()
+    region.polygon = QPolygonF(QRectF(800, 0, 100, 100))
+    router.invalidate()
+    router.dispatch(sample(-50, 50))
+    assert log.take() == []
+    router.dispatch(sample(850, 50))
+    assert log.take() == [("edge", ENTER)]
+
+
+def test_moved_widgets_are_found_at_their_new_position(qapp, window):
+    router = GazeEventRouter()
+    log = Log()
+    widget = child(window, 0, 0)
+    router.subscribe(widget, events=[ENTER], handler=log.handler("w"))
+
+    widget.move(600, 400)
+    qapp.processEvents()
+    router.dispatch(sample_on(window))
+    assert log.take() == []
+    router.dispatch(sample_on(widget))
+    assert log.take() == [("w", ENTER)]
+
+
+def test_widgets_follow_parents_they_got_after_subscribing(qapp, window):
+    router = GazeEventRouter()
+    log = Log()
+    widget = QWidget()
+    router.subscribe(widget, events=[ENTER, EXIT], handler=log.handler("w"))
+
+    container = child(window, 0, 0, 300, 300)
+    widget.setParent(container)
+    widget.setGeometry(0, 0, 100, 100)
+    widget.show()
+    qapp.processEvents()
+    router.dispatch(sample_on(widget))
+    assert log.take() == [("w", ENTER)]
+
+    container.move(400, 300)
+    qapp.processEvents()
+    router.dispatch(sample_on(window))
+    assert log.take() == [("w", EXIT)]
+    router.dispatch(sample_on(widget))
+    assert log.take() == [("w", ENTER)]
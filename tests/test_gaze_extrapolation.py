@@ -0,0 +1,84 @@
+import math
+
+import pytest
+
+from eye_tracking_provider import GazeExtrapolator
+
+RATE = 200.0
+
+
+class FixedLatency:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def end_to_end(self):
+        return self.latency
+
+
+def pursuit(extrapolator, speed, n_samples=20, start=(100.0, 300.0)):
+    """Gaze moving right at `speed` px/s, returns the last sample and prediction."""
+    for i in range(n_samples):
+        gaze = (start[0] + speed * i / RATE, start[1])
+        predicted = extrapolator.add(gaze, i / RATE)
+    return gaze, predicted
+
+
+def test_smooth_pursuit_is_predicted_ahead_by_the_latency():
+    extrapolator = GazeExtrapolator(FixedLatency(0.03))
+    gaze, predicted = pursuit(extrapolator, 600.0)
+
+    assert predicted[0] == pytest.approx(gaze[0] + 600.0 * 0.03)
+    assert predicted[1] == pytest.approx(gaze[1])
+
+
+def test_the_default_latency_is_used_without_measurements():
+    for monitor in [None, FixedLatency(math.nan), FixedLatency(-1.0)]:
+        extrapolator = GazeExtrapolator(monitor, default_latency=0.04)
+        gaze, predicted = pursuit(extrapolator, 600.0)
+        assert predicted[0] == pytest.approx(gaze[0] + 600.0 * 0.04)
+
+
+def test_prediction_is_limited_to_the_max_horizon():
+    extrapolator = GazeExtrapolator(FixedLatency(0.5))
+    extrapolator.max_horizon = 0.1
+    gaze, predicted = pursuit(extrapolator, 600.0)
+
+    assert predicted[0] == pytest.approx(gaze[0] + 600.0 * 0.1)
+
+
+def test_fixations_are_not_predicted():
+    extrapolator = GazeExtrapolator(FixedLatency(0.05))
+    gaze, predicted = pursuit(extrapolator, extrapolator.min_speed * 0.9)
+    assert predicted == gaze
+
+
+def test_prediction_fades_in_above_the_min_speed():
+    extrapolator = GazeExtrapolator(FixedLatency(0.05))
+    speed = extrapolator.min_speed * 1.5
+    gaze, predicted = pursuit(extrapolator, speed)
+
+    assert predicted[0] == pytest.approx(gaze[0] + 0.5 * speed * 0.05)
+
+
+def test_saccades_are_not_predicted():
+    extrapolator = GazeExtrapolator(FixedLatency(0.05))
+    gaze, predicted = pursuit(extrapolator, extrapolator.saccade_threshold * 2)
+    assert predicted == gaze
+
+
+def test_disabled_extrapolator_passes_gaze_unchanged():
+    extrapolator = GazeExtrapolator(FixedLatency(0.05))
+    extrapolator.enabled = False
+    gaze, predicted = pursuit(extrapolator, 600.0)
+    assert predicted == gaze
+
+
+def test_gaps_and_missing_gaze_restart_the_velocity_estimate():
+    extrapolator = GazeExtrapolator(FixedLatency(0.05))
+    pursuit(extrapolator, 600.0)
+
+    assert extrapolator.add(None, 1.0) is None
+    assert extrapolator.add((500.0, 300.0), 1.005) == (500.0, 300.0)
+
+    pursuit(extrapolator, 600.0)
+    assert extrapolator.add((900.0, 300.0), 2.0) == (900.0, 300.0)
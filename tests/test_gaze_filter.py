@@ -0,0 +1,134 @@
+import math
+import random
+import statistics
+
+import pytest
+
+from eye_tracking_provider import (
+    GazeFilterChain,
+    GazeFilterSettings,
+    GazeFilterType,
+    KalmanFilter,
+    MedianFilter,
+    ModeGazeFilterType,
+    MovingAverageFilter,
+    OneEuroFilter,
+    SaccadeAwareFilter,
+)
+
+RATE = 200.0
+
+
+def run(gaze_filter, xs, rate=RATE):
+    return [gaze_filter.filter(x, -x, i / rate) for i, x in enumerate(xs)]
+
+
+def all_filters():
+    return [
+        MovingAverageFilter(5),
+        MedianFilter(5),
+        OneEuroFilter(),
+        KalmanFilter(),
+        SaccadeAwareFilter(),
+        GazeFilterChain([MedianFilter(3), MovingAverageFilter(5)]),
+    ]
+
+
+@pytest.mark.parametrize("gaze_filter", all_filters(), ids=type)
+def test_constant_gaze_passes_unchanged(gaze_filter):
+    for x, y in run(gaze_filter, [500.0] * 50):
+        assert x == pytest.approx(500.0)
+        assert y == pytest.approx(-500.0)
+
+
+@pytest.mark.parametrize("gaze_filter", all_filters(), ids=type)
+def test_filters_settle_after_a_jump(gaze_filter):
+    x, y = run(gaze_filter, [0.0] * 50 + [100.0] * 200)[-1]
+    assert x == pytest.approx(100.0, abs=0.5)
+    assert y == pytest.approx(-100.0, abs=0.5)
+
+
+@pytest.mark.parametrize("gaze_filter", all_filters(), ids=type)
+def test_reset_forgets_earlier_samples(gaze_filter):
+    run(gaze_filter, [0.0] * 50)
+    gaze_filter.reset()
+    assert gaze_filter.filter(300.0, 200.0, 1.0) == pytest.approx((300.0, 200.0))
+
+
+def test_moving_average_is_the_mean_of_the_window():
+    xs = [random.uniform(0, 1000) for _ in range(100)]
+    for i, (x, _) in enumerate(run(MovingAverageFilter(4), xs)):
+        assert x == pytest.approx(statistics.mean(xs[max(i - 3, 0) : i + 1]))
+
+
+@pytest.mark.parametrize("window_size", [1, 3, 4])
+def test_median_is_the_median_of_the_window(window_size):
+    xs = [random.uniform(0, 1000) for _ in range(100)]
+    for i, (x, y) in enumerate(run(MedianFilter(window_size), xs)):
+        window = xs[max(i - window_size + 1, 0) : i + 1]
+        assert x == statistics.median(window)
+        assert y == -x
+
+
+def test_median_removes_single_outliers():
+    xs = [100.0] * 10 + [900.0] + [100.0] * 10
+    assert all(x == 100.0 for x, _ in run(MedianFilter(3), xs))
+
+
+def test_saccade_aware_filter_passes_saccades_without_lag():
+    xs = [0.0] * 50 + [500.0] * 5
+    smoothed = run(MovingAverageFilter(8), xs)
+    adaptive = run(SaccadeAwareFilter(MovingAverageFilter(8)), xs)
+
+    assert adaptive[50][0] == 500.0
+    assert smoothed[50][0] < 100.0
+
+
+def test_saccade_aware_filter_smooths_fixations():
+    rng = random.Random(0)
+    xs = [500.0 + rng.gauss(0, 1) for _ in range(400)]
+    filtered = [x for x, _ in run(SaccadeAwareFilter(), xs)][50:]
+    assert statistics.stdev(filtered) < statistics.stdev(xs[50:]) / 2
+
+
+def test_empty_chain_adds_no_latency():
+    chain = GazeFilterChain()
+    assert chain.filter(1.0, 2.0, 0.0) == (1.0, 2.0)
+    assert chain.added_latency(RATE) == 0.0
+
+
+def test_added_latency_grows_with_the_window():
+    short = MovingAverageFilter(3).added_latency(RATE)
+    long = MovingAverageFilter(9).added_latency(RATE)
+    assert 0 < short < long < math.inf
+    assert SaccadeAwareFilter().added_latency(RATE) == 0.0
+
+
+def test_settings_create_the_filter_of_each_mode(qapp):
+    settings = GazeFilterSettings()
+    settings.filter = GazeFilterType.MOVING_AVERAGE
+    settings.remove_outliers = True
+    settings.keyboard_filter = ModeGazeFilterType.KALMAN
+
+    chain = settings.create_chain("View")
+    assert [type(f) for f in chain.filters] == [MedianFilter, MovingAverageFilter]
+    assert chain.filters[1].window_size == settings.window_size
+
+    chain = settings.create_chain("Keyboard")
+    assert [type(f) for f in chain.filters] == [MedianFilter, KalmanFilter]
+
+    settings.filter = "NONE"
+    assert settings.create_chain("View").filters == []
+
+
+def test_adaptive_setting_creates_the_saccade_aware_filter(qapp):
+    settings = GazeFilterSettings()
+    settings.filter = GazeFilterType.ADAPTIVE
+    settings.remove_outliers = False
+    settings.zoom_filter = ModeGazeFilterType.NONE
+
+    (adaptive,) = settings.create_chain("View").filters
+    assert isinstance(adaptive, SaccadeAwareFilter)
+    assert adaptive.velocity_threshold == settings.saccade_threshold
+    assert adaptive.fixation_filter.window_size == settings.fixation_window_size
+    assert settings.create_chain("Zoom").filters == []
@@ -0,0 +1,22 @@
+import json
+import os
+
+from headless import use_offscreen_platform
+
+
+def test_the_offscreen_screen_is_configured_in_the_directory(tmp_path, monkeypatch):
+    monkeypatch.delenv("QT_QPA_PLATFORM")
+
+    assert use_offscreen_platform((1280, 720), str(tmp_path))
+    (path,) = tmp_path.iterdir()
+    (screen,) = json.loads(path.read_text())["screens"]
+    assert (screen["width"], screen["height"]) == (1280, 720)
+    assert os.environ["QT_QPA_PLATFORM"] == f"offscreen:configfile={path}"
+
+
+def test_an_explicitly_chosen_platform_is_kept(tmp_path, monkeypatch):
+    monkeypatch.setenv("QT_QPA_PLATFORM", "xcb")
+
+    assert not use_offscreen_platform((1280, 720), str(tmp_path))
+    assert list(tmp_path.iterdir()) == []
+    assert os.environ["QT_QPA_PLATFORM"] == "xcb"
@@ -0,0 +1,133 @@
+import cv2
+import numpy as np
+import pytest
+
+from eye_tracking_provider import IMU_TO_SCENE_ROTATION, SurfacePosePredictor
+
+CAMERA_MATRIX = np.array([[900.0, 0.0, 800.0], [0.0, 900.0, 600.0], [0.0, 0.0, 1.0]])
+SURFACE = np.array([[1000.0, 0.0, 300.0], [0.0, 700.0, 250.0], [0.0, 0.0, 1.0]])
+
+
+def camera_rotation(degrees_per_second, duration):
+    rotation, _ = cv2.Rodrigues(np.radians(degrees_per_second) * duration)
+    return rotation
+
+
+def moved_surface(rotation):
+    """The surface after the camera rotated by `rotation`."""
+    K = CAMERA_MATRIX
+    return K @ rotation.T @ np.linalg.inv(K) @ SURFACE
+
+
+def predictor_in_scene_axes():
+    predictor = SurfacePosePredictor(imu_to_scene_rotation=np.eye(3))
+    predictor.camera_matrix = CAMERA_MATRIX
+    return predictor
+
+
+def test_imu_axes_map_to_the_tilted_scene_camera():
+    right, forward, up = IMU_TO_SCENE_ROTATION.T
+
+    np.testing.assert_allclose(right, [1, 0, 0], atol=1e-9)
+    # The scene camera looks 12 degrees down, so forward is slightly up in it
+    tilt = np.radians(12)
+    np.testing.assert_allclose(forward, [0, -np.sin(tilt), np.cos(tilt)])
+    np.testing.assert_allclose(up, [0, -np.cos(tilt), -np.sin(tilt)])
+
+
+def test_rotation_integrates_the_gyro_readings():
+    predictor = predictor_in_scene_axes()
+    np.testing.assert_allclose(predictor.rotation(0.0, 1.0), np.eye(3))
+
+    predictor.add_imu(0.0, [0.0, 90.0, 0.0])
+    predictor.add_imu(0.1, [0.0, 90.0, 0.0])
+    predictor.add_imu(0.2, [30.0, 0.0, 0.0])
+
+    np.testing.assert_allclose(
+        predictor.rotation(0.0, 0.1), camera_rotation([0, 90, 0], 0.1), atol=1e-9
+    )
+    # The first reading holds before it, the last one until the end
+    np.testing.assert_allclose(
+        predictor.rotation(-0.1, 0.0), camera_rotation([0, 90, 0], 0.1), atol=1e-9
+    )
+    np.testing.assert_allclose(
+        predictor.rotation(0.2, 0.3), camera_rotation([30, 0, 0], 0.1), atol=1e-9
+    )
+    np.testing.assert_allclose(predictor.rotation(0.2, 0.1), np.eye(3))
+
+
+def test_skipped_readings_are_interpolated_over_their_actual_interval():
+    predictor = predictor_in_scene_axes()
+    # A turn speeding up steadily, read at irregular intervals
+    for t in [0.0, 0.03, 0.05, 0.09]:
+        predictor.add_imu(t, [0.0, 1000.0 * t, 0.0])
+
+    for t0, t1 in [(0.0, 0.09), (0.01, 0.04), (0.035, 0.09)]:
+        angle = 1000.0 * (t1**2 - t0**2) / 2
+        np.testing.assert_allclose(
+            predictor.rotation(t0, t1), camera_rotation([0, angle, 0], 1.0), atol=1e-9
+        )
+
+
+def test_repeated_readings_are_ignored():
+    predictor = predictor_in_scene_axes()
+    predictor.add_imu(0.0, [0.0, 90.0, 0.0])
+    predictor.add_imu(0.0, [0.0, 0.0, 0.0])
+
+    np.testing.assert_allclose(
+        predictor.rotation(0.0, 0.1), camera_rotation([0, 90, 0], 0.1), atol=1e-9
+    )
+
+
+def test_surface_follows_the_rotation_of_the_camera():
+    predictor = predictor_in_scene_axes()
+    predictor.add_imu(0.0, [0.0, 40.0, 10.0])
+    predictor.add_frame(0.0, SURFACE)
+
+    predicted = predictor.predict(0.05)
+    expected = moved_surface(camera_rotation([0, 40, 10], 0.05))
+    np.testing.assert_allclose(predicted, expected, atol=1e-9)
+
+
+def test_nothing_is_predicted_without_a_recent_frame_and_imu():
+    predictor = predictor_in_scene_axes()
+    predictor.add_frame(0.0, SURFACE)
+    assert predictor.predict(0.01) is None
+
+    predictor.add_imu(0.0, [0.0, 40.0, 0.0])
+    assert predictor.predict(0.01) is not None
+    assert predictor.predict(predictor.max_prediction + 0.01) is None
+
+    predictor.enabled = False
+    assert predictor.predict(0.01) is None
+
+
+def feed(predictor, measured_rotation, n_frames=40, interval=1 / 30):
+    """Gyro readings of a camera turning steadily, and one frame per interval.
+
+    The surface is measured where the turn moved it, or where it was before if
+    not `measured_rotation`, e.g. when the IMU axes are wrong.
+    """
+    speed = [0.0, 30.0, 0.0]
+    for i in range(n_frames):
+        t = i * interval
+        predictor.add_imu(t, speed)
+        rotation = camera_rotation(speed, t) if measured_rotation else np.eye(3)
+        predictor.add_frame(t, moved_surface(rotation))
+
+
+def test_predictions_are_kept_while_they_beat_the_last_measured_pose():
+    predictor = predictor_in_scene_axes()
+    feed(predictor, measured_rotation=True)
+
+    assert predictor.prediction_error == pytest.approx(0.0, abs=1e-6)
+    assert predictor.static_error > 1.0
+    assert predictor.prediction_helps
+
+
+def test_predictions_stop_when_they_do_not_match_the_measured_poses():
+    predictor = predictor_in_scene_axes()
+    feed(predictor, measured_rotation=False)
+
+    assert not predictor.prediction_helps
+    np.testing.assert_allclose(predictor.predict(40 / 30), SURFACE)
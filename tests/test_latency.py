@@ -0,0 +1,121 @@
+import math
+import types
+
+import numpy as np
+import pytest
+
+from eye_tracking_provider import STAGES, LatencyMonitor
+from eye_tracking_provider import latency
+from eye_tracking_provider.latency import RollingBuffer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    fake_time = types.SimpleNamespace(
+        perf_counter=lambda: clock.now, time=lambda: clock.now + 1000.0
+    )
+    monkeypatch.setattr(latency, "time", fake_time)
+    return clock
+
+
+def run_sample(monitor, clock, durations, device_age=None):
+    """Passes one sample through the pipeline, each stage taking its duration."""
+    monitor.start_sample()
+    if device_age is not None:
+        monitor.record_device_timestamp(clock.now + 1000.0 - device_age)
+    for stage in STAGES[1:-1]:
+        clock.advance(durations[stage])
+        monitor.mark(stage)
+    clock.advance(durations["paint"])
+    monitor.mark_paint()
+
+
+DURATIONS = {
+    "receive": 0.002,
+    "map": 0.004,
+    "predict": 0.001,
+    "dwell": 0.0005,
+    "dispatch": 0.001,
+    "paint": 0.008,
+}
+
+
+def test_stages_are_timed_from_the_previous_mark(clock):
+    monitor = LatencyMonitor()
+    for _ in range(10):
+        run_sample(monitor, clock, DURATIONS)
+        clock.advance(0.0035)
+
+    summary = monitor.summary()
+    assert summary["percentiles"] == [50, 95, 99]
+    for stage, duration in DURATIONS.items():
+        assert summary["stages"][stage] == pytest.approx([duration * 1000] * 3)
+    assert summary["stages"]["total"] == pytest.approx([16.5] * 3)
+    assert all(math.isnan(v) for v in summary["stages"]["device"])
+    assert summary["rate_hz"] == pytest.approx(50.0)
+
+
+def test_device_stage_is_the_age_of_the_sample(clock):
+    monitor = LatencyMonitor()
+    monitor.start_sample()
+    monitor.record_device_timestamp(clock.now + 1000.0 - 0.03)
+
+    assert monitor.summary()["stages"]["device"] == pytest.approx([30.0] * 3)
+
+
+def test_end_to_end_latency_adds_the_sample_age_to_the_pipeline(clock):
+    monitor = LatencyMonitor()
+    assert math.isnan(monitor.end_to_end())
+
+    for _ in range(5):
+        run_sample(monitor, clock, DURATIONS, device_age=0.02)
+
+    assert monitor.end_to_end() == pytest.approx(0.02 + 0.0165)
+
+
+def test_marks_without_a_received_sample_are_ignored(clock):
+    monitor = LatencyMonitor()
+    monitor.mark("map")
+    monitor.mark_paint()
+
+    monitor.start_sample()
+    clock.advance(0.01)
+    monitor.mark("map")
+    assert monitor.buffers["map"].n_values == 0
+
+
+def test_only_the_first_paint_after_a_dispatch_is_timed(clock):
+    monitor = LatencyMonitor()
+    run_sample(monitor, clock, DURATIONS)
+    clock.advance(0.5)
+    monitor.mark_paint()
+
+    assert monitor.buffers["paint"].n_values == 1
+    assert monitor.total.n_values == 1
+
+
+def test_disabled_monitor_records_nothing(clock):
+    monitor = LatencyMonitor()
+    monitor.enabled = False
+    run_sample(monitor, clock, DURATIONS)
+    assert all(buffer.n_values == 0 for buffer in monitor.buffers.values())
+
+
+def test_rolling_buffer_keeps_the_latest_values():
+    buffer = RollingBuffer(4)
+    assert all(math.isnan(v) for v in buffer.percentiles([50]))
+
+    for value in range(10):
+        buffer.add(value)
+    assert sorted(buffer.filled()) == [6, 7, 8, 9]
+    assert buffer.percentiles([0, 100]) == [6, 9]
+    np.testing.assert_allclose(buffer.percentiles([50]), [7.5])
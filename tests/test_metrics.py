@@ -0,0 +1,104 @@
+import socket
+import urllib.error
+import urllib.request
+
+import pytest
+
+from eye_tracking_provider.metrics import MetricsRegistry
+from metrics_exporter import MetricsExporter
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_exposition_uses_the_prometheus_text_format():
+    registry = MetricsRegistry()
+    registry.counter("frames_total", "Frames received.").inc(3)
+    registry.gauge("connected", "Whether connected.", device='a"b').set(1.5)
+    histogram = registry.histogram("age_seconds", "Sample age.", buckets=[0.1, 1.0])
+    for value in [0.05, 0.1, 0.5, 2.0]:
+        histogram.observe(value)
+
+    assert registry.exposition().splitlines() == [
+        "# HELP age_seconds Sample age.",
+        "# TYPE age_seconds histogram",
+        'age_seconds_bucket{le="0.1"} 2',
+        'age_seconds_bucket{le="1.0"} 3',
+        'age_seconds_bucket{le="+Inf"} 4',
+        "age_seconds_sum 2.65",
+        "age_seconds_count 4",
+        "# HELP connected Whether connected.",
+        "# TYPE connected gauge",
+        'connected{device="a\\"b"} 1.5',
+        "# HELP frames_total Frames received.",
+        "# TYPE frames_total counter",
+        "frames_total 3",
+    ]
+
+
+def test_metrics_are_created_once_per_name_and_labels():
+    registry = MetricsRegistry()
+    counter = registry.counter("events_total", "Events.", kind="click")
+    assert registry.counter("events_total", "Events.", kind="click") is counter
+    assert registry.counter("events_total", "Events.", kind="key") is not counter
+
+    with pytest.raises(ValueError, match="already registered"):
+        registry.gauge("events_total", "Events.")
+
+
+def test_histogram_times_a_block():
+    histogram = MetricsRegistry().histogram("map_seconds", "Mapping.")
+    with histogram.time():
+        pass
+    assert histogram.count == 1
+    assert 0 <= histogram.sum < 0.1
+
+
+def test_written_file_contains_the_exposition(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter("frames_total", "Frames received.").inc()
+    path = tmp_path / "gaze_control.prom"
+    registry.write(str(path))
+
+    assert path.read_text() == registry.exposition()
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_metrics_are_served_on_localhost(qapp):
+    registry = MetricsRegistry()
+    registry.counter("frames_total", "Frames received.").inc(7)
+    exporter = MetricsExporter(registry)
+    exporter.http_port = free_port()
+    exporter.http_enabled = True
+    url = f"http://127.0.0.1:{exporter.http_port}"
+    try:
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert response.read().decode() == registry.exposition()
+
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other")
+    finally:
+        exporter.close()
+
+    assert exporter.server is None
+
+
+def test_the_endpoint_moves_once_the_port_stopped_changing(qapp):
+    exporter = MetricsExporter(MetricsRegistry())
+    exporter.http_port = free_port()
+    exporter.http_enabled = True
+    first_server = exporter.server
+    try:
+        for _ in range(3):
+            exporter.http_port = free_port()
+        assert exporter.server is first_server
+        assert exporter.server_timer.isActive()
+
+        exporter.server_timer.timeout.emit()
+        assert exporter.server.server_address[1] == exporter.http_port
+        assert not exporter.server_timer.isActive()
+    finally:
+        exporter.close()
@@ -0,0 +1,210 @@
+import numpy as np
+import pytest
+
+from eye_tracking_provider import (
+    CalibrationFitter,
+    CorrectionGrid,
+    PolynomialPredictor,
+    ThinPlateSplinePredictor,
+    load_predictor,
+)
+from eye_tracking_provider.calibration_fitting import (
+    polynomial_powers,
+    region_statistics,
+)
+from eye_tracking_provider.predictor import FORMAT_VERSION
+
+SCREEN_SIZE = (1920, 1080)
+POWERS = [[0, 0], [1, 0], [0, 1], [2, 0], [1, 1], [0, 2]]
+CANDIDATES = [
+    ("polynomial", {"degree": 2, "alpha": 1e-6}),
+    ("polynomial", {"degree": 3, "alpha": 1e-6}),
+    ("thin_plate_spline", {"smoothing": 1e-3}),
+]
+
+
+def target_grid(n_cols=8, n_rows=5):
+    width, height = SCREEN_SIZE
+    xs = np.linspace(0.05 * width, 0.95 * width, n_cols)
+    ys = np.linspace(0.05 * height, 0.95 * height, n_rows)
+    grid_x, grid_y = np.meshgrid(xs, ys)
+    return np.stack([grid_x.ravel(), grid_y.ravel()], axis=1)
+
+
+def calibration_data(noise=0.0, samples_per_target=20, seed=0):
+    """Gaze with a smooth error pattern, returns gaze, targets and indices."""
+    rng = np.random.default_rng(seed)
+    width, height = SCREEN_SIZE
+    targets = target_grid()
+    target_indices = np.repeat(np.arange(len(targets)), samples_per_target)
+    points = targets[target_indices]
+
+    u = points[:, 0] / width - 0.5
+    v = points[:, 1] / height - 0.5
+    gaze = np.stack([points[:, 0] + 40 * u + 30, points[:, 1] + 20 * v - 15], axis=1)
+    gaze += rng.normal(0, noise, gaze.shape)
+    return gaze, points, target_indices
+
+
+def fit(**kwargs):
+    fitter = CalibrationFitter(SCREEN_SIZE, CANDIDATES, max_workers=0)
+    gaze, targets, target_indices = calibration_data(**kwargs)
+    return fitter.fit(gaze, targets, target_indices, device_serial="abc123")
+
+
+def test_polynomial_powers_cover_all_terms_up_to_the_degree():
+    assert polynomial_powers(2).tolist() == POWERS
+    assert len(polynomial_powers(4)) == 15
+
+
+def test_fitted_predictor_corrects_gaze_in_pixels():
+    predictor = fit()
+    gaze, targets, _ = calibration_data()
+
+    np.testing.assert_allclose(predictor.predict(gaze), targets, atol=0.5)
+    assert predictor.predict_point(tuple(gaze[0])) == pytest.approx(targets[0], abs=0.5)
+    assert predictor.screen_size == SCREEN_SIZE
+    assert predictor.device_serial == "abc123"
+
+
+def test_fit_stats_describe_the_selected_model():
+    predictor = fit(noise=5.0)
+    stats = predictor.fit_stats
+
+    assert (stats["model"], stats["params"]) in CANDIDATES
+    assert stats["cv_error_px"] == min(c["cv_error_px"] for c in stats["candidates"])
+    assert stats["cv_error_px"] < 10.0
+    assert stats["n_targets"] == len(target_grid())
+    assert set(stats["regions"]) == {
+        f"{row}-{col}"
+        for row in ["top", "middle", "bottom"]
+        for col in ["left", "center", "right"]
+    }
+
+
+def test_fitting_in_worker_processes_gives_the_same_result():
+    gaze, targets, target_indices = calibration_data(noise=5.0)
+    fitter = CalibrationFitter(SCREEN_SIZE, CANDIDATES, max_workers=2)
+    fitter.start()
+    try:
+        assert fitter.n_workers == 2
+        parallel = fitter.fit(gaze, targets, target_indices)
+    finally:
+        fitter.close()
+    serial = fit(noise=5.0)
+
+    assert parallel.fit_stats["candidates"] == serial.fit_stats["candidates"]
+    np.testing.assert_allclose(parallel.predict(gaze), serial.predict(gaze))
+
+
+def test_region_statistics_measure_accuracy_and_precision():
+    targets = np.array([[100.0, 100.0]] * 4 + [[1800.0, 1000.0]] * 4)
+    target_indices = np.repeat([0, 1], 4)
+    offsets = np.array([[3, 4]] * 4 + [[0, 1], [0, -1]] * 2)
+
+    regions = region_statistics(targets + offsets, targets, target_indices, SCREEN_SIZE)
+
+    assert regions["top-left"]["accuracy_px"] == pytest.approx(5.0)
+    assert regions["top-left"]["precision_px"] == pytest.approx(0.0)
+    assert regions["bottom-right"]["accuracy_px"] == pytest.approx(0.0)
+    assert regions["bottom-right"]["precision_px"] == pytest.approx(2.0)
+    assert regions["bottom-right"]["n_samples"] == 4
+
+
+def polynomial_predictor():
+    return PolynomialPredictor(
+        POWERS,
+        [[5.0, 1.01, 0.02, 1e-5, 0.0, 0.0], [-3.0, 0.0, 0.99, 0.0, 2e-5, 0.0]],
+        [1.0, 2.0],
+        screen_size=SCREEN_SIZE,
+        device_serial="abc123",
+        fit_stats={"model": "polynomial"},
+    )
+
+
+def spline_predictor():
+    rng = np.random.default_rng(0)
+    return ThinPlateSplinePredictor(
+        rng.uniform(0, 1, (6, 2)),
+        rng.normal(0, 1e-3, (6, 2)),
+        [[0.01, -0.02], [1.0, 0.0], [0.0, 1.0]],
+        SCREEN_SIZE,
+        screen_size=SCREEN_SIZE,
+    )
+
+
+def test_polynomial_is_evaluated_term_by_term():
+    predictor = polynomial_predictor()
+    x, y = 300.0, 200.0
+
+    expected = [
+        1.0 + 5.0 + 1.01 * x + 0.02 * y + 1e-5 * x**2,
+        2.0 - 3.0 + 0.99 * y + 2e-5 * x * y,
+    ]
+    np.testing.assert_allclose(predictor.predict([x, y])[0], expected)
+    assert predictor.predict_point((x, y)) == pytest.approx(expected)
+    assert predictor.degree == 2
+
+
+@pytest.mark.parametrize("create", [polynomial_predictor, spline_predictor])
+def test_saved_predictors_load_with_the_same_model(tmp_path, create):
+    predictor = create()
+    path = str(tmp_path / "predictor.npz")
+    predictor.save(path)
+    loaded = load_predictor(path)
+
+    points = np.random.default_rng(1).uniform((0, 0), SCREEN_SIZE, (100, 2))
+    assert type(loaded) is type(predictor)
+    np.testing.assert_allclose(loaded.predict(points), predictor.predict(points))
+    assert loaded.screen_size == predictor.screen_size
+    assert loaded.device_serial == predictor.device_serial
+    assert loaded.fit_stats == predictor.fit_stats
+
+
+def test_unknown_screen_size_and_device_are_kept_unknown(tmp_path):
+    path = str(tmp_path / "predictor.npz")
+    PolynomialPredictor(POWERS, np.zeros((2, 6)), [0.0, 0.0]).save(path)
+    loaded = load_predictor(path)
+
+    assert loaded.screen_size is None
+    assert loaded.device_serial is None
+    assert loaded.fit_stats == {}
+
+
+def test_unsupported_predictor_files_are_rejected(tmp_path):
+    path = str(tmp_path / "predictor.npz")
+    predictor = polynomial_predictor()
+    predictor.save(path)
+
+    with np.load(path) as data:
+        arrays = dict(data)
+    np.savez(path, **dict(arrays, model=np.array("neural_network")))
+    with pytest.raises(ValueError, match="unknown model"):
+        load_predictor(path)
+
+    np.savez(path, **dict(arrays, format_version=np.array(FORMAT_VERSION + 1)))
+    with pytest.raises(ValueError, match="format version"):
+        load_predictor(path)
+
+
+@pytest.mark.parametrize("create", [polynomial_predictor, spline_predictor])
+def test_correction_grid_matches_the_predictor(create):
+    predictor = create()
+    grid = CorrectionGrid(predictor, SCREEN_SIZE)
+    points = np.random.default_rng(2).uniform((0, 0), SCREEN_SIZE, (1000, 2))
+
+    errors = np.linalg.norm(grid.predict(points) - predictor.predict(points), axis=1)
+    assert errors.max() < 0.5
+    for point, expected in zip(points[:20].tolist(), grid.predict(points[:20])):
+        assert grid.predict_point(point) == pytest.approx(expected)
+
+
+def test_correction_grid_keeps_the_border_correction_off_screen():
+    predictor = polynomial_predictor()
+    grid = CorrectionGrid(predictor, SCREEN_SIZE, margin=0.1)
+    width, height = SCREEN_SIZE
+
+    border = grid.predict_point((width * 1.1, height * 0.5))
+    beyond = grid.predict_point((width * 2.0, height * 0.5))
+    assert beyond[0] - width * 2.0 == pytest.approx(border[0] - width * 1.1)
+    assert beyond[1] == pytest.approx(border[1])
@@ -0,0 +1,124 @@
+import time
+import types
+
+import cv2
+import numpy as np
+import pytest
+
+from eye_tracking_provider import SessionRecorder, load_recording
+
+FRAME_SIZE = (64, 48)
+
+
+class DetectedMarker:
+    def __init__(self, uid, corners):
+        self.uid = uid
+        self.corners = corners
+
+    def as_dict(self):
+        names = ["tl", "tr", "br", "bl"]
+        return {"uid": self.uid, "vertices": dict(zip(names, self.corners))}
+
+
+def sample(i):
+    """Eye tracking data of sample `i`, markers are seen on every other sample."""
+    pixels = np.full((FRAME_SIZE[1], FRAME_SIZE[0], 3), i * 10 % 256, dtype=np.uint8)
+    markers = [
+        DetectedMarker(uid, [(uid, i), (uid + 1, i), (uid + 1, i + 1), (uid, i + 1)])
+        for uid in range(i % 2 * 2)
+    ]
+    return types.SimpleNamespace(
+        timestamp=1000.0 + i / 30,
+        gaze=(100.0 + i, 200.0) if i % 5 else None,
+        uncorrected_gaze=(90.0 + i, 210.0),
+        raw_gaze=types.SimpleNamespace(x=800.0 + i, y=600.0, worn=True),
+        scene=types.SimpleNamespace(
+            bgr_pixels=pixels, timestamp_unix_seconds=1000.0 + i / 30 - 0.01
+        ),
+        dwell_process=i / 20,
+        surf_to_img_trans=np.eye(3) * (i + 1),
+        markers=markers,
+    )
+
+
+@pytest.fixture
+def recording_dir(tmp_path):
+    recorder = SessionRecorder(chunk_size=8)
+    directory = recorder.start(
+        str(tmp_path / "recording"),
+        metadata={"device_serial": "abc123"},
+        scene_calibration=np.arange(4.0),
+    )
+    recorder.add_event("start")
+    for i in range(20):
+        recorder.add_sample(sample(i))
+        if i == 10:
+            recorder.add_event("click", (512, 384))
+    recorder.stop()
+
+    assert recorder.n_frames == 20
+    assert recorder.n_dropped_frames == 0
+    return directory
+
+
+def test_samples_are_recorded_in_chunks(recording_dir):
+    recording = load_recording(recording_dir)
+
+    np.testing.assert_allclose(recording["timestamp"], 1000.0 + np.arange(20) / 30)
+    np.testing.assert_allclose(recording["raw_gaze"][:, 0], 800.0 + np.arange(20))
+    assert recording["worn"].all()
+    assert np.isnan(recording["gaze"][::5]).all()
+    np.testing.assert_allclose(recording["gaze"][1], (101.0, 200.0))
+    np.testing.assert_allclose(recording["uncorrected_gaze"][3], (93.0, 210.0))
+    np.testing.assert_allclose(recording["dwell_process"], np.arange(20) / 20)
+    np.testing.assert_allclose(recording["homography"][4], np.eye(3) * 5)
+    assert recording["frame_index"].tolist() == list(range(20))
+
+
+def test_markers_are_stored_per_sample(recording_dir):
+    recording = load_recording(recording_dir)
+    offsets = recording["marker_offsets"]
+
+    assert recording["marker_count"].tolist() == [0, 2] * 10
+    assert recording["marker_uid"][offsets[3] : offsets[4]].tolist() == [0, 1]
+    np.testing.assert_allclose(
+        recording["marker_corners"][offsets[3] + 1],
+        [(1, 3), (2, 3), (2, 4), (1, 4)],
+    )
+
+
+def test_events_metadata_and_video_are_kept(recording_dir):
+    recording = load_recording(recording_dir)
+
+    assert recording["events"]["name"].tolist() == ["start", "click"]
+    assert recording["events"]["detail"].tolist() == ["", "(512, 384)"]
+    assert recording["metadata"]["device_serial"] == "abc123"
+    assert "start_time" in recording["metadata"]
+    np.testing.assert_allclose(recording["scene_calibration"], np.arange(4.0))
+
+    video = cv2.VideoCapture(recording["video_path"])
+    try:
+        assert int(video.get(cv2.CAP_PROP_FRAME_COUNT)) == 20
+        ok, frame = video.read()
+        assert ok and frame.shape == (FRAME_SIZE[1], FRAME_SIZE[0], 3)
+    finally:
+        video.release()
+
+
+def test_recordings_without_samples_are_rejected(tmp_path):
+    recorder = SessionRecorder()
+    recorder.start(str(tmp_path / "empty"))
+    recorder.stop()
+
+    with pytest.raises(ValueError, match="no samples"):
+        load_recording(str(tmp_path / "empty"))
+
+
+def test_events_are_timestamped_on_the_sample_clock(recording_dir):
+    events = load_recording(recording_dir)["events"]
+
+    # No sample yet to relate the clocks for the first event
+    assert np.isnan(events["timestamp"][0])
+    assert events["timestamp"][1] == pytest.approx(1000.0 + 10 / 30, abs=0.1)
+    assert events["local_timestamp"][1] >= events["local_timestamp"][0]
+    assert events["local_timestamp"][1] == pytest.approx(time.time(), abs=10.0)
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from eye_tracking_provider import (
+    ReplayDataReceiver,
+    ReplayPacing,
+    SessionRecorder,
+    load_recording,
+)
+from test_recorder import sample
+
+
+@pytest.fixture
+def recording(tmp_path):
+    recorder = SessionRecorder()
+    recorder.start(
+        str(tmp_path / "recording"),
+        metadata={"device_serial": "abc123"},
+        scene_calibration=np.arange(4.0),
+    )
+    for i in range(10):
+        recorder.add_sample(sample(i))
+    recorder.stop()
+    return load_recording(recorder.directory)
+
+
+def replay_all(receiver):
+    samples = []
+    while not receiver.finished:
+        samples.append(receiver.receive())
+    return samples
+
+
+def test_recorded_samples_are_replayed(recording):
+    receiver = ReplayDataReceiver()
+    receiver.open(recording, ReplayPacing.AS_FAST_AS_POSSIBLE)
+    samples = replay_all(receiver)
+
+    assert receiver.connect() == ("replay", 0)
+    assert receiver.device_serial == "abc123"
+    np.testing.assert_allclose(receiver.scene_calibration, np.arange(4.0))
+    assert len(samples) == receiver.n_replayed == 10
+    for i, data in enumerate(samples):
+        expected = sample(i)
+        assert data.timestamp == pytest.approx(expected.timestamp)
+        assert data.raw_gaze.x == pytest.approx(expected.raw_gaze.x)
+        assert data.raw_gaze.worn
+        assert data.scene.timestamp_unix_seconds == pytest.approx(
+            expected.scene.timestamp_unix_seconds
+        )
+        # The video is compressed, so the frames are only close to the recorded
+        assert np.abs(data.scene.bgr_pixels.mean() - i * 10) < 5
+    assert receiver.receive() is None
+
+
+def test_samples_without_a_scene_frame_are_skipped(recording):
+    recording["frame_index"][3] = -1
+    receiver = ReplayDataReceiver()
+    receiver.open(recording, ReplayPacing.AS_FAST_AS_POSSIBLE)
+    samples = replay_all(receiver)
+
+    assert len(samples) == 9
+    assert samples[3].timestamp == pytest.approx(sample(4).timestamp)
+    assert np.abs(samples[3].scene.bgr_pixels.mean() - 40) < 5
+
+
+def test_looping_starts_over_at_the_end(recording):
+    receiver = ReplayDataReceiver()
+    receiver.open(recording, ReplayPacing.AS_FAST_AS_POSSIBLE, loop=True)
+    replay_all(receiver)
+
+    assert receiver.receive().timestamp == pytest.approx(sample(0).timestamp)
+
+
+def test_real_time_pacing_returns_samples_when_they_are_due(recording):
+    receiver = ReplayDataReceiver()
+    receiver.open(recording, ReplayPacing.REAL_TIME)
+
+    assert receiver.receive().timestamp == pytest.approx(sample(0).timestamp)
+    assert receiver.receive() is None
+
+
+def test_recordings_need_a_scene_camera_calibration(recording):
+    recording["scene_calibration"] = None
+    with pytest.raises(ValueError, match="calibration"):
+        ReplayDataReceiver().open(recording)
@@ -0,0 +1,75 @@
+import json
+import time
+
+import pytest
+
+from stall_watchdog import StallWatchdog
+
+
+def blocking_call(seconds):
+    time.sleep(seconds)
+
+
+@pytest.fixture
+def watchdog():
+    watchdog = StallWatchdog(0.02, stall_threshold=0.05)
+    watchdog.check_interval = 0.01
+    watchdog.start()
+    yield watchdog
+    watchdog.stop()
+
+
+def test_stalls_are_recorded_with_the_blocking_stack(watchdog):
+    watchdog.tick()
+    blocking_call(0.3)
+    watchdog.tick()
+
+    assert watchdog.n_stalls == 1
+    stall = watchdog.summary()["last_stall"]
+    assert 0.25 < stall["duration_s"] < 1.0
+    assert "blocking_call" in stall["stack"]
+    assert stall["time"] == pytest.approx(time.time() - stall["duration_s"], abs=0.1)
+
+
+def test_regular_ticks_are_no_stall(watchdog):
+    for _ in range(10):
+        watchdog.tick()
+        time.sleep(0.02)
+
+    summary = watchdog.summary()
+    assert summary["n_stalls"] == 0
+    assert summary["last_stall"] is None
+    assert summary["interval_ms"][0] == pytest.approx(20.0, abs=10.0)
+
+
+def test_dispatch_lag_is_measured_when_events_are_processed(qapp):
+    watchdog = StallWatchdog(0.02)
+    watchdog.tick()
+    watchdog.poll_finished()
+    assert watchdog.dispatch_lags.n_values == 0
+
+    qapp.processEvents()
+    assert watchdog.dispatch_lags.n_values == 1
+
+
+def test_dispatch_lag_leaves_out_the_time_of_the_poll(qapp):
+    watchdog = StallWatchdog(0.02)
+    watchdog.tick()
+    blocking_call(0.1)
+    watchdog.poll_finished()
+    qapp.processEvents()
+
+    assert watchdog.dispatch_lags.percentiles([50])[0] < 0.05
+
+
+def test_dumped_stalls_leave_out_internal_state(watchdog, tmp_path):
+    watchdog.tick()
+    blocking_call(0.2)
+    watchdog.tick()
+    path = tmp_path / "stalls.json"
+    watchdog.dump(str(path))
+
+    report = json.loads(path.read_text())
+    assert report["n_stalls"] == 1
+    assert report["expected_interval_s"] == 0.02
+    assert set(report["events"][0]) == {"time", "duration_s", "stack"}
@@ -0,0 +1,79 @@
+import math
+
+import numpy as np
+import pytest
+
+from eye_tracking_provider import SyntheticDataReceiver, SyntheticGaze
+
+SCREEN_SIZE = (1920, 1080)
+
+
+def generate(generator, n_samples):
+    return np.array([generator.next() for _ in range(n_samples)])
+
+
+def test_the_same_seed_gives_the_same_gaze():
+    first = generate(SyntheticGaze(SCREEN_SIZE, seed=3, block_size=256), 1000)
+    second = generate(SyntheticGaze(SCREEN_SIZE, seed=3, block_size=256), 1000)
+    other = generate(SyntheticGaze(SCREEN_SIZE, seed=4, block_size=256), 1000)
+
+    np.testing.assert_array_equal(first, second)
+    assert not np.array_equal(first, other)
+
+
+def test_samples_come_at_the_rate():
+    samples = generate(SyntheticGaze(SCREEN_SIZE, rate=120, seed=0), 2000)
+    np.testing.assert_allclose(samples[:, 0], np.arange(2000) / 120)
+
+    for rate in [10, 2000]:
+        with pytest.raises(ValueError):
+            SyntheticGaze(SCREEN_SIZE, rate=rate)
+
+
+def test_skipped_samples_are_not_returned():
+    skipping = SyntheticGaze(SCREEN_SIZE, seed=5, block_size=64)
+    skipping.skip(150)
+    reading = SyntheticGaze(SCREEN_SIZE, seed=5, block_size=64)
+    generate(reading, 150)
+
+    assert skipping.next() == reading.next()
+
+
+def test_gaze_has_fixations_saccades_and_blinks():
+    rate = 200.0
+    generator = SyntheticGaze(SCREEN_SIZE, rate=rate, seed=0, noise=0.0)
+    samples = generate(generator, 20000)
+    valid = samples[:, 3].astype(bool)
+    gaze = samples[:, 1:3]
+
+    assert 0.9 < valid.mean() < 1.0
+    both_valid = valid[1:] & valid[:-1]
+    speeds = np.linalg.norm(np.diff(gaze, axis=0), axis=1)[both_valid] * rate
+    # Mostly fixations, which only drift slowly
+    assert np.median(speeds) < 50
+    assert 0.01 < np.mean(speeds > 1000) < 0.2
+
+    on_screen = (gaze[valid] >= 0).all(axis=1) & (gaze[valid] <= SCREEN_SIZE).all(
+        axis=1
+    )
+    assert 0.8 < on_screen.mean() < 1.0
+
+
+def test_receiver_passes_screen_gaze_without_rendering():
+    receiver = SyntheticDataReceiver()
+    assert receiver.receive() is None
+
+    receiver.configure(SCREEN_SIZE, seed=1)
+    assert receiver.connect() == ("synthetic", 0)
+    reference = SyntheticGaze(SCREEN_SIZE, seed=1)
+    for _ in range(300):
+        data = receiver.receive()
+        timestamp, x, y, valid = reference.next()
+        if valid:
+            assert (data.raw_gaze.x, data.raw_gaze.y) == (x, y)
+            assert receiver.screen_gaze == (x, y)
+        else:
+            assert math.isnan(data.raw_gaze.x)
+            assert receiver.screen_gaze is None
+
+    assert receiver.device_serial == "synthetic"